@@ -0,0 +1,91 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+
+from app.logger import logger
+
+
+class MicroBatcher:
+    """
+    Collects concurrent submissions and processes them together.
+
+    The first submission of a batch starts a timer of 'max_delay' seconds; the
+    batch is flushed when the timer fires or when it holds 'max_size' items,
+    whichever comes first. The flush function receives the items in
+    submission order and returns one result per item; a result that is an
+    exception is raised to the submitter of that item only. The flush runs in
+    its own task, so a submitter that is cancelled, e.g. by a route deadline,
+    does not cancel the batch of the others.
+
+    Attributes:
+        flush (Callable): Processes a batch, returning one result or exception per item.
+        max_size (int): Items after which a batch is flushed right away.
+        max_delay (float): Seconds the first item of a batch waits for others.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[list[Any]], Awaitable[list[Any]]],
+        max_size: int,
+        max_delay: float,
+    ) -> None:
+        """
+        Initializes the batcher without pending items.
+
+        Args:
+            flush (Callable): Processes a batch, returning one result or exception per item.
+            max_size (int): Items after which a batch is flushed right away.
+            max_delay (float): Seconds the first item of a batch waits for others.
+        """
+        self.flush = flush
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self._pending: list[tuple[Any, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def submit(self, item: Any) -> Any:
+        """
+        Adds an item to the current batch and returns its result once the batch is flushed.
+
+        Args:
+            item (Any): The item to process.
+
+        Returns:
+            Any: The item's result.
+
+        Raises:
+            Exception: The item's error.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_size:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._start_flush)
+        return await future
+
+    def _start_flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._flush(batch))
+            # Keep a reference, the event loop only holds weak ones.
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self, batch: list[tuple[Any, asyncio.Future]]) -> None:
+        try:
+            results = await self.flush([item for item, _ in batch])
+        except Exception as e:
+            logger.error(f"Batch of {len(batch)} items failed: {e!r}")
+            results = [e] * len(batch)
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -1,22 +1,167 @@
-from fastapi_cache import FastAPICache
-from fastapi_cache.backends.redis import RedisBackend
+from collections import OrderedDict
+from dataclasses import dataclass
+import gzip
+import hashlib
+import time
+
+import orjson
 import redis
 
+from app.config import settings
 
-async def init_redis_cache():
-    """
-    Initializes Redis cache for FastAPI application.
+# Redis client checked by the readiness probe, created by init_redis_client.
+redis_client: redis.asyncio.Redis | None = None
+
+# Store of the route response cache, created by init_response_cache.
+response_store: "ResponseStore | None" = None
 
-    This function sets up FastAPICache with a Redis backend.
 
-    - Connects to a Redis instance running on localhost.
-    - Configures cache encoding and response decoding.
-    - Sets cache prefix to 'fastapi-cache'.
+def init_redis_client() -> None:
+    """
+    Creates the Redis client whose connection the readiness probe checks.
 
-    Usage:
-        await init_redis_cache()
+    The client connects to settings.REDIS_URL on first use. Routes cache
+    their responses in the store created by init_response_cache.
     """
+    global redis_client
     redis_client = redis.asyncio.from_url(
-        "redis://localhost", encoding="utf8", decode_responses=True
+        settings.REDIS_URL, encoding="utf8", decode_responses=True
     )
-    FastAPICache.init(RedisBackend(redis_client), prefix="fastapi-cache")
+
+
+def init_response_cache() -> None:
+    """
+    Creates the store of the route response cache selected by RESPONSE_CACHE_BACKEND.
+    """
+    global response_store
+    if settings.RESPONSE_CACHE_BACKEND == "memory":
+        response_store = MemoryResponseStore(settings.RESPONSE_CACHE_MEMORY_ITEMS)
+    else:
+        response_store = RedisResponseStore(
+            redis.asyncio.from_url(settings.REDIS_URL), prefix="response-cache"
+        )
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    """
+    Final body of a response, stored as it is sent.
+
+    Attributes:
+        body (bytes): Response body, gzip-compressed when 'gzipped' is set.
+        media_type (str): Content type of the body.
+        etag (str): Entity tag of the uncompressed body.
+        gzipped (bool): Whether the body is gzip-compressed.
+    """
+
+    body: bytes
+    media_type: str
+    etag: str
+    gzipped: bool = False
+
+    @classmethod
+    def build(cls, body: bytes, media_type: str) -> "CachedResponse":
+        """
+        Builds the cache entry of a response body.
+
+        Bodies of at least RESPONSE_CACHE_GZIP_MIN_SIZE bytes are compressed.
+
+        Args:
+            body (bytes): Uncompressed response body.
+            media_type (str): Content type of the body.
+
+        Returns:
+            CachedResponse: The cache entry.
+        """
+        etag = f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+        if len(body) >= settings.RESPONSE_CACHE_GZIP_MIN_SIZE:
+            return cls(gzip.compress(body, compresslevel=6), media_type, etag, True)
+        return cls(body, media_type, etag)
+
+    def dumps(self) -> bytes:
+        """
+        Serializes the entry to one bytes value: a JSON header line followed by the body.
+        """
+        header = {
+            "media_type": self.media_type,
+            "etag": self.etag,
+            "gzipped": self.gzipped,
+        }
+        return orjson.dumps(header) + b"\n" + self.body
+
+    @classmethod
+    def loads(cls, value: bytes) -> "CachedResponse":
+        """
+        Restores an entry serialized by 'dumps'.
+        """
+        header, body = value.split(b"\n", 1)
+        return cls(body=body, **orjson.loads(header))
+
+
+class ResponseStore:
+    """
+    Storage of cached responses by key.
+    """
+
+    async def get(self, key: str) -> CachedResponse | None:
+        """
+        Returns the entry stored under a key, None if there is none or it expired.
+        """
+        raise NotImplementedError
+
+    async def set(self, key: str, entry: CachedResponse, ttl: float) -> None:
+        """
+        Stores an entry under a key for 'ttl' seconds.
+        """
+        raise NotImplementedError
+
+
+class RedisResponseStore(ResponseStore):
+    """
+    Response store in Redis, shared by all workers.
+
+    Attributes:
+        client (redis.asyncio.Redis): Redis client returning bytes.
+        prefix (str): Prefix of the Redis keys.
+    """
+
+    def __init__(self, client: redis.asyncio.Redis, prefix: str) -> None:
+        self.client = client
+        self.prefix = prefix
+
+    async def get(self, key: str) -> CachedResponse | None:
+        value = await self.client.get(f"{self.prefix}:{key}")
+        return CachedResponse.loads(value) if value is not None else None
+
+    async def set(self, key: str, entry: CachedResponse, ttl: float) -> None:
+        await self.client.set(f"{self.prefix}:{key}", entry.dumps(), px=int(ttl * 1000))
+
+
+class MemoryResponseStore(ResponseStore):
+    """
+    Response store in the memory of this worker, evicting the least recently used entries.
+
+    Attributes:
+        max_items (int): Number of entries kept.
+    """
+
+    def __init__(self, max_items: int) -> None:
+        self.max_items = max_items
+        self._entries: OrderedDict[str, tuple[float, CachedResponse]] = OrderedDict()
+
+    async def get(self, key: str) -> CachedResponse | None:
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        expires_at, entry = item
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    async def set(self, key: str, entry: CachedResponse, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, entry)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_items:
+            self._entries.popitem(last=False)
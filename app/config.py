@@ -13,6 +13,57 @@ class Settings(BaseSettings):
         DB_USER (str): Database username.
         DB_PASS (str): Database password.
         DB_HOST (str): Database host address.
+        DB_REPLICA_HOST (str | None): Read replica host address. Reads use the primary when not set.
+        DB_REPLICA_PORT (str | None): Read replica port. Defaults to DB_PORT.
+        DB_READ_ROUTING (bool): Route GET/HEAD requests to read-only transactions on the read engine.
+        OLTP_POOL_SIZE (int): Pool size of the "oltp" workload class (short queries, writes).
+        OLTP_MAX_OVERFLOW (int): Connections allowed beyond the pool size for "oltp".
+        OLTP_POOL_TIMEOUT (float): Seconds to wait for an "oltp" connection before answering 503.
+        OLTP_STATEMENT_TIMEOUT (int): Server-side statement timeout of "oltp" queries, in milliseconds.
+        OLTP_POOL_PREWARM (int): Connections opened at startup in each "oltp" pool.
+        ANALYTICS_POOL_SIZE (int): Pool size of the "analytics" workload class (reports, long scans).
+        ANALYTICS_MAX_OVERFLOW (int): Connections allowed beyond the pool size for "analytics".
+        ANALYTICS_POOL_TIMEOUT (float): Seconds to wait for an "analytics" connection before answering 503.
+        ANALYTICS_STATEMENT_TIMEOUT (int): Server-side statement timeout of "analytics" queries, in milliseconds.
+        ANALYTICS_POOL_PREWARM (int): Connections opened at startup in each "analytics" pool.
+        DB_CONNECTION_BUDGET (int | None): Connections all workers together may open to one database server.
+            When set, per-worker pool limits are derived from it.
+        WEB_CONCURRENCY (int): Number of worker processes sharing the connection budget.
+        DB_POOL_MAX_WAITERS (int | None): Requests allowed to wait for a connection per pool before
+            new ones are rejected right away. None waits without limit, up to the pool timeout.
+        DB_RETRY_AFTER (int): Seconds sent in Retry-After when a request is rejected for lack of connections.
+        DB_PGBOUNCER (bool): Whether the database is reached through PgBouncer in transaction pooling mode.
+        DB_STATEMENT_CACHE_SIZE (int | None): Prepared statements cached per connection. Defaults to 100,
+            or to 0 with DB_PGBOUNCER; behind PgBouncer 1.21+ with max_prepared_statements it can be raised.
+        ORDER_LINES_AS_ARRAYS (bool): Fetch the products of an order as typed arrays instead of JSON.
+        ORDER_BATCHING (bool): Write concurrent POST /orders requests of a worker together, in one transaction.
+        ORDER_BATCH_MAX_SIZE (int): Orders after which a batch is written right away.
+        ORDER_BATCH_MAX_DELAY (float): Seconds the first order of a batch waits for others.
+        ORDER_QUEUE (bool): Queue POST /orders requests sent with "Prefer: respond-async" and answer 202
+            with a ticket; a background writer of each worker creates the queued orders.
+        ORDER_QUEUE_BACKEND (str): Queue of accepted orders: "redis", a stream shared by the workers,
+            or "log", an append-only file for a single worker.
+        ORDER_QUEUE_LOG_PATH (str): File of the "log" order queue.
+        ORDER_QUEUE_MAX_DEPTH (int): Orders waiting in the queue after which new ones are rejected with 503.
+        ORDER_QUEUE_RETRY_AFTER (int): Seconds sent in Retry-After when the order queue is full.
+        ORDER_QUEUE_BATCH_SIZE (int): Queued orders the writer creates per batch.
+        ORDER_TICKET_TTL (int): Seconds the status of a ticket is kept by the queue.
+        BATCH_DELETE_CHUNK_SIZE (int): Records deleted per statement by batch deletes; when a batch has more,
+            each chunk is committed in a transaction of its own.
+        IMPORT_BATCH_SIZE (int): Rows of a bulk import copied and committed at a time.
+        IMPORT_MAX_ERRORS (int): Rejected rows listed in the report of a bulk import.
+        REDIS_URL (str): Redis connection URL.
+        READINESS_CACHE_TTL (float): Seconds a readiness probe result is reused by /ready.
+        READINESS_TIMEOUT (float): Seconds each dependency check of the readiness probe may take.
+        RESPONSE_CACHE_BACKEND (str): Store of cached route responses: "redis", shared by the workers,
+            or "memory", per worker.
+        RESPONSE_CACHE_GZIP_MIN_SIZE (int): Cached response bodies of at least this many bytes are stored gzipped.
+        RESPONSE_CACHE_MEMORY_ITEMS (int): Responses kept by the "memory" response cache store.
+        IDEMPOTENCY_BACKEND (str): Store of idempotency keys: "redis", shared by the workers,
+            or "memory", per worker.
+        IDEMPOTENCY_TTL (int): Seconds the response of a request with an Idempotency-Key is replayed.
+        IDEMPOTENCY_LOCK_TTL (float): Seconds a running request holds its key; afterwards a retry runs again.
+        IDEMPOTENCY_WAIT_TIMEOUT (float): Seconds a repeated request waits for the running one before 409.
     """
 
     DB_PORT: str
@@ -20,6 +71,49 @@ class Settings(BaseSettings):
     DB_USER: str
     DB_PASS: str
     DB_HOST: str
+    DB_REPLICA_HOST: str | None = None
+    DB_REPLICA_PORT: str | None = None
+    DB_READ_ROUTING: bool = True
+    OLTP_POOL_SIZE: int = 20
+    OLTP_MAX_OVERFLOW: int = 10
+    OLTP_POOL_TIMEOUT: float = 3
+    OLTP_STATEMENT_TIMEOUT: int = 30_000
+    OLTP_POOL_PREWARM: int = 5
+    ANALYTICS_POOL_SIZE: int = 5
+    ANALYTICS_MAX_OVERFLOW: int = 5
+    ANALYTICS_POOL_TIMEOUT: float = 10
+    ANALYTICS_STATEMENT_TIMEOUT: int = 300_000
+    ANALYTICS_POOL_PREWARM: int = 0
+    DB_CONNECTION_BUDGET: int | None = None
+    WEB_CONCURRENCY: int = 1
+    DB_POOL_MAX_WAITERS: int | None = 50
+    DB_RETRY_AFTER: int = 1
+    DB_PGBOUNCER: bool = False
+    DB_STATEMENT_CACHE_SIZE: int | None = None
+    ORDER_LINES_AS_ARRAYS: bool = True
+    ORDER_BATCHING: bool = False
+    ORDER_BATCH_MAX_SIZE: int = 100
+    ORDER_BATCH_MAX_DELAY: float = 0.002
+    ORDER_QUEUE: bool = False
+    ORDER_QUEUE_BACKEND: str = "redis"
+    ORDER_QUEUE_LOG_PATH: str = "order-queue.log"
+    ORDER_QUEUE_MAX_DEPTH: int = 100_000
+    ORDER_QUEUE_RETRY_AFTER: int = 5
+    ORDER_QUEUE_BATCH_SIZE: int = 500
+    ORDER_TICKET_TTL: int = 24 * 60 * 60
+    BATCH_DELETE_CHUNK_SIZE: int = 1000
+    IMPORT_BATCH_SIZE: int = 10_000
+    IMPORT_MAX_ERRORS: int = 100
+    REDIS_URL: str = "redis://localhost"
+    READINESS_CACHE_TTL: float = 2
+    READINESS_TIMEOUT: float = 1
+    RESPONSE_CACHE_BACKEND: str = "redis"
+    RESPONSE_CACHE_GZIP_MIN_SIZE: int = 1024
+    RESPONSE_CACHE_MEMORY_ITEMS: int = 1024
+    IDEMPOTENCY_BACKEND: str = "redis"
+    IDEMPOTENCY_TTL: int = 24 * 60 * 60
+    IDEMPOTENCY_LOCK_TTL: float = 60
+    IDEMPOTENCY_WAIT_TIMEOUT: float = 10
 
     @property
     def DATABASE_URL(self) -> str:
@@ -31,6 +125,57 @@ class Settings(BaseSettings):
         """
         return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASS}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
 
+    @property
+    def REPLICA_DATABASE_URL(self) -> str:
+        """
+        Builds the read replica connection URL, falling back to the primary database.
+
+        Returns:
+            str: The PostgreSQL read replica connection URL for asyncpg.
+        """
+        if not self.DB_REPLICA_HOST:
+            return self.DATABASE_URL
+        port = self.DB_REPLICA_PORT or self.DB_PORT
+        return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASS}@{self.DB_REPLICA_HOST}:{port}/{self.DB_NAME}"
+
+    @property
+    def STATEMENT_CACHE_SIZE(self) -> int:
+        """
+        Returns the number of prepared statements cached per connection.
+
+        Returns:
+            int: DB_STATEMENT_CACHE_SIZE, or its default for the connection mode.
+        """
+        if self.DB_STATEMENT_CACHE_SIZE is not None:
+            return self.DB_STATEMENT_CACHE_SIZE
+        return 0 if self.DB_PGBOUNCER else 100
+
+    @property
+    def WORKLOADS(self) -> dict[str, dict]:
+        """
+        Groups the connection pool settings by workload class.
+
+        Returns:
+            dict[str, dict]: Pool size, overflow, pool timeout, statement timeout and
+                connections to open at startup per workload class.
+        """
+        return {
+            "oltp": {
+                "pool_size": self.OLTP_POOL_SIZE,
+                "max_overflow": self.OLTP_MAX_OVERFLOW,
+                "pool_timeout": self.OLTP_POOL_TIMEOUT,
+                "statement_timeout": self.OLTP_STATEMENT_TIMEOUT,
+                "prewarm": self.OLTP_POOL_PREWARM,
+            },
+            "analytics": {
+                "pool_size": self.ANALYTICS_POOL_SIZE,
+                "max_overflow": self.ANALYTICS_MAX_OVERFLOW,
+                "pool_timeout": self.ANALYTICS_POOL_TIMEOUT,
+                "statement_timeout": self.ANALYTICS_STATEMENT_TIMEOUT,
+                "prewarm": self.ANALYTICS_POOL_PREWARM,
+            },
+        }
+
     class Config:
         """
         Pydantic configuration class for environment file loading.
@@ -1,18 +1,62 @@
-from typing import Generic, TypeVar
+import asyncio
+from functools import cached_property
+import time
+from typing import Generic, Literal, TypeVar
 
+from pydantic import TypeAdapter
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    UniqueConstraint,
+    and_,
+    any_,
+    bindparam,
+    case,
+    cast,
+    exists,
+    or_,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.sql import delete, func, insert, update
+from sqlalchemy.sql import delete, expression, func, insert, text, update
+
+from app.config import settings
+from app.db import DEFAULT_WORKLOAD, get_session_maker, set_statement_timeout
+from app.logger import logger
+from app.models.row_counts import RowCount
+from app.schemas.base import BaseCursorPaginatedResponse, BasePaginatedResponse
 
 M = TypeVar("M")
 S = TypeVar("S")
 
+# Where a total number of records comes from:
+# "estimate" - planner statistics in pg_class (cheap, approximate),
+# "counter" - the trigger-maintained row_counts table (cheap, exact),
+# "count" - a full SELECT count(*) (expensive, exact).
+TotalSource = Literal["estimate", "counter", "count"]
+
 
 class CrudBase(Generic[M, S]):
     """
     Base CRUD class with common operations for database models.
+
+    Subclasses setting 'fast_read' read lists and single records through a Core
+    select of the schema's columns and validate the plain rows into schemas at
+    once, without creating ORM instances or tracking them in the session.
+
+    Subclasses listing foreign key columns in 'cascade_deletes' delete the
+    child rows referencing a record in the same statement as the record.
+
+    Bulk imports write rows with COPY, either straight into the table or
+    through a temporary staging table that filters out invalid rows. Their
+    transactions set 'app.importing', which the stock trigger of order lines
+    checks to leave stock alone.
     """
 
+    fast_read: bool = False
+    cascade_deletes: tuple[Column, ...] = ()
+
     def __init__(self, model: M, schema: S):
         """
         Initialize with model and schema.
@@ -20,6 +64,66 @@ class CrudBase(Generic[M, S]):
         self.model = model
         self.schema = schema
 
+    @cached_property
+    def read_columns(self) -> list[Column]:
+        """
+        Table columns selected by the fast read path: those with a field in the schema.
+        """
+        table_columns = self.model.__table__.c
+        return [
+            table_columns[name]
+            for name in self.schema.model_fields
+            if name in table_columns
+        ]
+
+    @cached_property
+    def items_adapter(self) -> TypeAdapter:
+        """
+        Validator of a list of schemas, built once per CRUD instance.
+        """
+        return TypeAdapter(list[self.schema])
+
+    def select_items(self):
+        """
+        Select statement of records: ORM entities, or the schema's columns with 'fast_read'.
+        """
+        if self.fast_read:
+            return select(*self.read_columns)
+        return select(self.model)
+
+    def fetch_items(self, result) -> list:
+        """
+        Fetch all records of a result of 'select_items', as ORM entities or rows.
+        """
+        return result.all() if self.fast_read else result.scalars().all()
+
+    def build_items(self, objs: list) -> list[S]:
+        """
+        Build schemas from records fetched by 'fetch_items'.
+        """
+        if self.fast_read:
+            names = [column.name for column in self.read_columns]
+            return self.items_adapter.validate_python(
+                [dict(zip(names, row)) for row in objs]
+            )
+        return [self.schema.model_validate(obj) for obj in objs]
+
+    @cached_property
+    def delete_by_ids(self):
+        """
+        Delete statement of the records in the "ids" array parameter, and of their child rows.
+
+        Child rows are deleted by data-modifying CTEs of the same statement; the
+        statement returns the IDs of the deleted records.
+        """
+        table = self.model.__table__
+        ids = any_(bindparam("ids", type_=ARRAY(BigInteger)))
+        stmt = delete(table).where(table.c.id == ids).returning(table.c.id)
+        for column in self.cascade_deletes:
+            children = delete(column.table).where(column == ids)
+            stmt = stmt.add_cte(children.cte(f"deleted_{column.table.name}"))
+        return stmt
+
     async def execute_get_one(self, session: AsyncSession, stmt) -> M:
         """
         Execute a statement and return a single result or None.
@@ -28,32 +132,169 @@ class CrudBase(Generic[M, S]):
         return result.scalar_one_or_none()
 
     async def get_paginated(
-        self, session: AsyncSession, page: int = 1, page_size: int = 2
-    ) -> list[S]:
+        self,
+        session: AsyncSession,
+        page: int = 1,
+        page_size: int = 2,
+        after_id: int | None = None,
+        before_id: int | None = None,
+        total_source: TotalSource = "estimate",
+        workload: str = DEFAULT_WORKLOAD,
+        deadline: float | None = None,
+    ) -> BasePaginatedResponse | BaseCursorPaginatedResponse:
         """
         Retrieve a paginated list of objects.
+
+        Uses OFFSET pagination by default and returns the page together with the
+        total number of records taken from 'total_source'; the total is fetched
+        concurrently with the page, see get_total. When 'after_id' or
+        'before_id' is given, switches to keyset pagination on the primary key,
+        whose cost does not grow with the page depth.
         """
+        if after_id is not None or before_id is not None:
+            return await self.get_keyset_paginated(
+                session, page_size, after_id, before_id
+            )
         offset = (page - 1) * page_size
-        result = await session.execute(
-            select(self.model).offset(offset).limit(page_size)
+        # One extra row tells whether a next page exists, even with an estimated total.
+        stmt = (
+            self.select_items()
+            .order_by(self.model.id)
+            .offset(offset)
+            .limit(page_size + 1)
+        )
+        result, total_items = await asyncio.gather(
+            session.execute(stmt), self.get_total(total_source, workload, deadline)
+        )
+        objs = self.fetch_items(result)
+        has_more = len(objs) > page_size
+        items = self.build_items(objs[:page_size])
+
+        # An estimate may lag behind; never report fewer items than were seen.
+        total_items = max(total_items, offset + len(items) + int(has_more))
+        total_pages = -(-total_items // page_size) if page_size > 0 else 0
+        return BasePaginatedResponse(
+            items=items,
+            total_items=total_items,
+            total_pages=total_pages,
+            page=page,
+            page_size=page_size,
+            prev_page=page - 1 if page > 1 else None,
+            next_page=page + 1 if has_more else None,
+        )
+
+    async def get_keyset_paginated(
+        self,
+        session: AsyncSession,
+        page_size: int = 2,
+        after_id: int | None = None,
+        before_id: int | None = None,
+    ) -> BaseCursorPaginatedResponse:
+        """
+        Retrieve a page of objects positioned by primary key instead of an offset.
+
+        Args:
+            session: The async database session.
+            page_size: Number of items per page.
+            after_id: Return items with an ID greater than this one (forward paging).
+            before_id: Return items with an ID lower than this one (backward paging).
+
+        Returns:
+            A page of items together with the cursors of the neighbouring pages.
+        """
+        stmt = self.select_items()
+        if before_id is not None:
+            stmt = stmt.where(self.model.id < before_id).order_by(self.model.id.desc())
+        else:
+            stmt = stmt.where(self.model.id > after_id).order_by(self.model.id)
+
+        # One extra row tells whether another page exists in the paging direction.
+        result = await session.execute(stmt.limit(page_size + 1))
+        objs = self.fetch_items(result)
+        has_more = len(objs) > page_size
+        objs = objs[:page_size]
+        if before_id is not None:
+            objs.reverse()
+
+        items = self.build_items(objs)
+        first_id, last_id = (items[0].id, items[-1].id) if items else (None, None)
+        if before_id is not None:
+            next_cursor, prev_cursor = last_id, first_id if has_more else None
+        else:
+            next_cursor = last_id if has_more else None
+            prev_cursor = first_id if after_id else None
+        return BaseCursorPaginatedResponse(
+            items=items,
+            page_size=page_size,
+            next_cursor=next_cursor,
+            prev_cursor=prev_cursor,
         )
-        objs = result.scalars().all()
-        return [self.schema.model_validate(obj) for obj in objs]
 
-    async def get_count(self, session: AsyncSession) -> int:
+    async def get_count(
+        self, session: AsyncSession, total_source: TotalSource = "count"
+    ) -> int:
         """
         Get the total count of records in the model.
+
+        Args:
+            session: The async database session.
+            total_source: Where the count comes from, see TotalSource.
         """
-        result = await session.execute(select(func.count()).select_from(self.model))
+        table_name = self.model.__tablename__
+        if total_source == "estimate":
+            result = await session.execute(
+                text(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)"
+                ),
+                {"table": table_name},
+            )
+            estimate = result.scalar()
+            if estimate is not None and estimate >= 0:
+                return estimate
+            # The table has never been analyzed, so there is no estimate yet.
+            total_source = "counter"
+
+        if total_source == "counter":
+            # SUM of bigint is numeric; cast back so callers get an int, not a Decimal.
+            total = cast(func.coalesce(func.sum(RowCount.row_count), 0), BigInteger)
+            stmt = select(total).where(RowCount.table_name == table_name)
+        else:
+            stmt = select(func.count()).select_from(self.model)
+        result = await session.execute(stmt)
         return result.scalar_one()
 
+    async def get_total(
+        self,
+        total_source: TotalSource = "estimate",
+        workload: str = DEFAULT_WORKLOAD,
+        deadline: float | None = None,
+    ) -> int:
+        """
+        Get the total count of records on a session of its own, so that it can
+        run concurrently with a query on the request session.
+
+        The session is made like the session of a read request: on the pool of
+        the route's workload class, read-only with read routing, and with the
+        route's deadline as its statement timeout.
+
+        Args:
+            total_source: Where the count comes from, see TotalSource.
+            workload: Workload class of the route.
+            deadline: Seconds the route may run, None for no limit.
+        """
+        session_maker = get_session_maker(workload, settings.DB_READ_ROUTING)
+        async with session_maker() as session:
+            if deadline is not None:
+                set_statement_timeout(session, deadline)
+            return await self.get_count(session, total_source)
+
     async def get_by_id(self, session: AsyncSession, id: int) -> S | None:
         """
         Retrieve a record by its ID.
         """
-        result = await session.execute(select(self.model).where(self.model.id == id))
-        obj = result.scalar_one_or_none()
-        return self.schema.model_validate(obj) if obj else None
+        result = await session.execute(self.select_items().where(self.model.id == id))
+        objs = self.fetch_items(result)
+        return self.build_items(objs)[0] if objs else None
 
     async def create(self, session: AsyncSession, create_obj: S) -> S | None:
         """
@@ -68,6 +309,9 @@ class CrudBase(Generic[M, S]):
         Delete a record by its ID and return it.
         """
         stmt = delete(self.model).where(self.model.id == id).returning(self.model)
+        for column in self.cascade_deletes:
+            children = delete(column.table).where(column == id)
+            stmt = stmt.add_cte(children.cte(f"deleted_{column.table.name}"))
         result = await self.execute_get_one(session, stmt)
         return self.schema.model_validate(result) if result else None
 
@@ -93,10 +337,168 @@ class CrudBase(Generic[M, S]):
         await session.execute(stmt)
         return None
 
-    async def batch_delete(self, session: AsyncSession, ids: list[int]):
+    async def batch_delete(
+        self, session: AsyncSession, ids: list[int], deadline: float | None = None
+    ) -> list[int]:
+        """
+        Delete multiple records, and their child rows, by their IDs.
+
+        IDs are deleted in chunks of settings.BATCH_DELETE_CHUNK_SIZE, one
+        statement per chunk, all in the given session. A single chunk is
+        deleted in the session's transaction; with more chunks, each one is
+        committed on its own, so locks are only held for a chunk, and chunks
+        deleted before a failing one stay deleted.
+
+        With a deadline, no chunk is started that would end after it, judged
+        by the slowest chunk so far; the IDs deleted until then are returned.
+        IDs missing from the result were not deleted or did not exist, and
+        deleting them again is safe.
+
+        Returns the IDs of the deleted records.
         """
-        Delete multiple records by their IDs.
+        chunk_size = settings.BATCH_DELETE_CHUNK_SIZE
+        if len(ids) <= chunk_size:
+            return await self.delete_chunk(session, ids)
+
+        deleted = []
+        started = time.monotonic()
+        slowest = 0.0
+        for start in range(0, len(ids), chunk_size):
+            chunk_started = time.monotonic()
+            if deadline is not None and chunk_started + slowest > started + deadline:
+                logger.warning(
+                    f"Batch delete from {self.model.__tablename__} stopped before its deadline: "
+                    f"{len(deleted)} of {len(ids)} IDs deleted"
+                )
+                break
+            end = start + chunk_size
+            deleted.extend(await self.delete_chunk(session, ids[start:end]))
+            await session.commit()
+            slowest = max(slowest, time.monotonic() - chunk_started)
+        return deleted
+
+    async def delete_chunk(self, session: AsyncSession, ids: list[int]) -> list[int]:
         """
-        stmt = delete(self.model).where(self.model.id.in_(ids)).returning(True)
-        result = await session.execute(stmt)
-        return result.scalars().all() if result else None
+        Delete records, and their child rows, with one statement and return the deleted IDs.
+        """
+        result = await session.execute(self.delete_by_ids, {"ids": ids})
+        return list(result.scalars().all())
+
+    async def copy_rows(
+        self, session: AsyncSession, columns: list[str], records: list[tuple]
+    ) -> None:
+        """
+        Write records into the table with COPY, in the session's transaction.
+
+        Args:
+            session: The async database session.
+            columns: Names of the columns, in the order of the values of a record.
+            records: Values of the rows to write.
+        """
+        await self.mark_import(session)
+        connection = await session.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            self.model.__tablename__, records=records, columns=columns
+        )
+
+    async def copy_rows_through_staging(
+        self, session: AsyncSession, columns: list[str], records: list[tuple]
+    ) -> dict[int, str]:
+        """
+        Write records into the table through a staging table and return the rejected ones.
+
+        The records are copied into a temporary table dropped at commit, which
+        is private to the transaction and not written to the WAL. Rows breaking
+        a NOT NULL, foreign key or unique constraint of the table are then left
+        out of a single INSERT ... SELECT, instead of failing the whole batch.
+
+        Args:
+            session: The async database session.
+            columns: Names of the columns, in the order of the values following the line.
+            records: Values of the rows to write, each preceded by its line number.
+
+        Returns:
+            Error of each rejected row, by line number.
+        """
+        model_table = self.model.__table__
+        await self.mark_import(session)
+        await session.execute(
+            text(
+                f"CREATE TEMPORARY TABLE staged_rows ON COMMIT DROP AS "
+                f"SELECT 0::bigint AS line, {', '.join(columns)} "
+                f"FROM {model_table.name} WITH NO DATA"
+            )
+        )
+        connection = await session.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            "staged_rows", records=records, columns=["line", *columns]
+        )
+
+        staged = expression.table(
+            "staged_rows", *map(expression.column, ["line", *columns])
+        )
+        checks = self.staging_checks(staged, columns)
+        stmt = select(*(staged.c[name] for name in columns)).order_by(staged.c.line)
+        errors = {}
+        if checks:
+            rejected = or_(*(condition for condition, _ in checks))
+            result = await session.execute(
+                select(staged.c.line, case(*checks)).where(rejected)
+            )
+            errors = dict(result.tuples().all())
+            stmt = stmt.where(~rejected)
+        await session.execute(insert(model_table).from_select(columns, stmt))
+        return errors
+
+    async def mark_import(self, session: AsyncSession) -> None:
+        """
+        Set 'app.importing' for the rest of the session's transaction.
+
+        Imported order lines record orders placed elsewhere, so the stock
+        trigger of orders_products reserves nothing for them.
+        """
+        await session.execute(text("SELECT set_config('app.importing', 'on', true)"))
+
+    def staging_checks(self, staged, columns: list[str]) -> list[tuple]:
+        """
+        Conditions rejecting staged rows that would break a constraint of the table.
+
+        Args:
+            staged: Staging table of 'copy_rows_through_staging'.
+            columns: Names of the staged columns.
+
+        Returns:
+            Pairs of a condition on a staged row and the error of the rows matching it.
+        """
+        model_table = self.model.__table__
+        checks = []
+        for name in columns:
+            if not model_table.c[name].nullable:
+                checks.append((staged.c[name].is_(None), f"{name}: must not be null"))
+            for foreign_key in model_table.c[name].foreign_keys:
+                referenced = foreign_key.column
+                missing = ~exists().where(referenced == staged.c[name])
+                checks.append(
+                    (
+                        and_(staged.c[name].is_not(None), missing),
+                        f"{name}: no {referenced.table.name} row with this ID",
+                    )
+                )
+        earlier = staged.alias("earlier")
+        for constraint in model_table.constraints:
+            if not isinstance(constraint, UniqueConstraint):
+                continue
+            names = [unique_column.name for unique_column in constraint.columns]
+            if not set(names) <= set(columns):
+                continue
+            stored = exists().where(*(model_table.c[n] == staged.c[n] for n in names))
+            repeated = exists().where(
+                earlier.c.line < staged.c.line,
+                *(earlier.c[n] == staged.c[n] for n in names),
+            )
+            checks.append(
+                (or_(stored, repeated), f"{', '.join(names)}: already exists")
+            )
+        return checks
@@ -1,57 +1,197 @@
 from datetime import datetime
+import uuid
 
-from sqlalchemy import func, select, text
+from sqlalchemy import Float, bindparam, cast, func, select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.batching import MicroBatcher
+from app.config import settings
 from app.crud.base import CrudBase, S
-from app.models import Order, OrdersProducts, Product
+from app.db import get_session_maker
+from app.logger import logger
+from app.models import Order, OrdersProducts, OrderTicket, Product
 from app.schemas.order import OrderReturnSchema
 
+# Columns of an order line, keyed by their name in the response. Price and
+# cost are those of the product when the line was created.
+LINE_COLUMNS = {
+    "product_id": Product.id,
+    "product_name": Product.product_name,
+    "amount": OrdersProducts.amount,
+    # Numbers, as json_agg returns them, rather than Decimals.
+    "price": cast(OrdersProducts.unit_price, Float),
+    "cost": cast(OrdersProducts.unit_cost, Float),
+}
+
+
+def select_order_with_lines(*line_aggregates):
+    """
+    Builds the query of one order, identified by the "id" parameter, with its aggregated lines.
+
+    Args:
+        *line_aggregates: Aggregate expressions over the order lines.
+
+    Returns:
+        Select: The query, built once and reused for every order.
+    """
+    return (
+        select(
+            Order.id.label("order_id"),
+            Order.created_at.label("order_created_at"),
+            *line_aggregates,
+        )
+        .join(OrdersProducts, Order.id == OrdersProducts.order_id)
+        .join(Product, OrdersProducts.product_id == Product.id)
+        .filter(Order.id == bindparam("id"))
+        .group_by(Order.id, Order.created_at)
+    )
+
+
+# Lines as a JSON array of objects.
+ORDER_WITH_JSON_LINES = select_order_with_lines(
+    func.json_agg(
+        func.jsonb_build_object(
+            "product_id",
+            Product.id,
+            "product_name",
+            Product.product_name,
+            "amount",
+            OrdersProducts.amount,
+            "price",
+            OrdersProducts.unit_price,
+            "cost",
+            OrdersProducts.unit_cost,
+        )
+    ).label("products")
+)
+
+# Lines as one typed array per column. All arrays aggregate the rows of the
+# group in the same order, so their elements line up.
+ORDER_WITH_LINE_ARRAYS = select_order_with_lines(
+    *(func.array_agg(column).label(name) for name, column in LINE_COLUMNS.items())
+)
+
+# Creates a batch of orders from the flattened lines of all orders.
+CREATE_ORDERS = text(
+    "SELECT create_orders_with_products("
+    ":order_count, :order_numbers, :product_ids, :amounts, :order_created_at)"
+)
+
+# Replaces the lines of an order, returns its creation time or NULL if there is no such order.
+REPLACE_ORDER_PRODUCTS = text(
+    "SELECT replace_order_products(:order_id, :product_ids, :amounts)"
+)
+
+# Records the queue tickets of new orders, the arrays line up.
+INSERT_ORDER_TICKETS = text(
+    "INSERT INTO order_tickets (ticket, order_id) "
+    "SELECT * FROM unnest(CAST(:tickets AS uuid[]), CAST(:order_ids AS bigint[]))"
+)
+
 
 class CrudOrder(CrudBase):
     """
     CRUD operations specific to Order entity.
+
+    Order lists are read through the ORM-free fast read path of CrudBase, and
+    deleting orders deletes their lines with them.
     """
 
+    fast_read = True
+    cascade_deletes = (OrdersProducts.order_id,)
+
     async def get_by_id(self, session: AsyncSession, id: int) -> S | None:
         """
         Retrieves an order by its ID along with the associated products.
 
+        With settings.ORDER_LINES_AS_ARRAYS the order lines are fetched as one
+        typed array per column, which asyncpg decodes natively, and zipped
+        into dictionaries here; otherwise they are built as JSON in Postgres.
+
         Args:
             session: The async database session.
             id: The ID of the order.
 
         Returns:
-            A dictionary containing order details and associated products, or an empty dictionary if not found.
+            A dictionary containing order details and associated products, or None if not found.
         """
-        query = (
-            select(
-                Order.id.label("order_id"),
-                Order.created_at.label("order_created_at"),
-                func.json_agg(
-                    func.jsonb_build_object(
-                        "product_id",
-                        Product.id,
-                        "product_name",
-                        Product.product_name,
-                        "amount",
-                        OrdersProducts.amount,
-                        "price",
-                        Product.price,
-                        "cost",
-                        Product.cost,
-                    )
-                ).label("products"),
-            )
-            .join(OrdersProducts, Order.id == OrdersProducts.order_id)
-            .join(Product, OrdersProducts.product_id == Product.id)
-            .filter(Order.id == id)
-            .group_by(Order.id, Order.created_at)
-        )
+        if settings.ORDER_LINES_AS_ARRAYS:
+            return await self.get_by_id_with_line_arrays(session, id)
 
-        result = await session.execute(query)
+        result = await session.execute(ORDER_WITH_JSON_LINES, {"id": id})
         return result.mappings().first() if result else {}
 
+    async def get_by_id_with_line_arrays(
+        self, session: AsyncSession, id: int
+    ) -> dict | None:
+        """
+        Retrieves an order by its ID with its products aggregated into typed arrays.
+
+        Args:
+            session: The async database session.
+            id: The ID of the order.
+
+        Returns:
+            A dictionary containing order details and associated products, or None if not found.
+        """
+        result = await session.execute(ORDER_WITH_LINE_ARRAYS, {"id": id})
+        row = result.mappings().first()
+        if row is None:
+            return None
+        names = tuple(LINE_COLUMNS)
+        return {
+            "order_id": row["order_id"],
+            "order_created_at": row["order_created_at"],
+            "products": [
+                dict(zip(names, line)) for line in zip(*(row[name] for name in names))
+            ],
+        }
+
+    async def update(self, session: AsyncSession, id: int, update_obj) -> dict | None:
+        """
+        Replaces the products of an order and returns the order with its new lines.
+
+        The replace_order_products database function diffs the requested lines
+        against the current ones and deletes, updates and inserts lines with
+        one statement; stock moves only by the difference of each product's
+        amount. Kept lines keep their price snapshot, new lines take the
+        current price of their product.
+
+        Args:
+            session: The async database session.
+            id: The ID of the order.
+            update_obj: Object containing the product_ids and amounts the order should have.
+
+        Returns:
+            A dictionary containing order details and associated products, or None if not found.
+
+        Raises:
+            ValueError: If the lengths of product_ids and amounts do not match.
+        """
+        if len(update_obj.product_ids) != len(update_obj.amounts):
+            raise ValueError("The lengths of product_ids and amounts must match.")
+
+        result = await session.execute(
+            REPLACE_ORDER_PRODUCTS,
+            {
+                "order_id": id,
+                "product_ids": update_obj.product_ids,
+                "amounts": update_obj.amounts,
+            },
+        )
+        order_created_at = result.scalar()
+        if order_created_at is None:
+            return None
+        order = await self.get_by_id(session, id)
+        if order is None:
+            # The order has no lines left.
+            return {
+                "order_id": id,
+                "order_created_at": order_created_at,
+                "products": [],
+            }
+        return order
+
     async def create_order(self, session: AsyncSession, create_obj) -> int:
         """
         Creates an order and associated order products in the database.
@@ -91,6 +231,130 @@ class CrudOrder(CrudBase):
         order_id = result.scalar()
         return order_id
 
+    async def create_orders(
+        self,
+        session: AsyncSession,
+        create_objs: list,
+        tickets: list[uuid.UUID] | None = None,
+    ) -> list[int]:
+        """
+        Creates many orders and their order products with one database call.
+
+        The lines of all orders are sent as flat arrays to the
+        create_orders_with_products database function, which inserts all
+        orders with one statement and all lines with another.
+
+        Args:
+            session: The async database session.
+            create_objs: Objects containing product_ids and amounts, one per order.
+            tickets: Queue tickets of the orders, recorded in order_tickets in the same transaction.
+
+        Returns:
+            The IDs of the new orders, in the order of 'create_objs'.
+
+        Raises:
+            ValueError: If the lengths of product_ids and amounts of an order do not match.
+        """
+        order_numbers, product_ids, amounts = [], [], []
+        for number, create_obj in enumerate(create_objs, start=1):
+            if len(create_obj.product_ids) != len(create_obj.amounts):
+                raise ValueError("The lengths of product_ids and amounts must match.")
+            order_numbers.extend([number] * len(create_obj.product_ids))
+            product_ids.extend(create_obj.product_ids)
+            amounts.extend(create_obj.amounts)
+
+        result = await session.execute(
+            CREATE_ORDERS,
+            {
+                "order_count": len(create_objs),
+                "order_numbers": order_numbers,
+                "product_ids": product_ids,
+                "amounts": amounts,
+                "order_created_at": datetime.now(),
+            },
+        )
+        order_ids = result.scalar()
+        if tickets is not None:
+            await session.execute(
+                INSERT_ORDER_TICKETS, {"tickets": tickets, "order_ids": order_ids}
+            )
+        return order_ids
+
+    async def get_ticket_orders(
+        self, session: AsyncSession, tickets: list[uuid.UUID]
+    ) -> dict[uuid.UUID, int]:
+        """
+        Retrieves the orders written for queue tickets.
+
+        Args:
+            session: The async database session.
+            tickets: Queue tickets to look up.
+
+        Returns:
+            The order ID of each ticket whose order exists.
+        """
+        result = await session.execute(
+            select(OrderTicket.ticket, OrderTicket.order_id).filter(
+                OrderTicket.ticket.in_(tickets)
+            )
+        )
+        return dict(result.tuples().all())
+
+    async def create_orders_separately(
+        self,
+        create_objs: list,
+        tickets: list[uuid.UUID] | None = None,
+        errors: tuple[type[Exception], ...] = (Exception,),
+    ) -> list[int | Exception]:
+        """
+        Creates orders of unrelated requests, writing them together when possible.
+
+        All orders are first created in one transaction with create_orders. If
+        that fails, each order is retried in a transaction of its own, so an
+        invalid order only fails its own request.
+
+        Args:
+            create_objs: Objects containing product_ids and amounts, one per order.
+            tickets: Queue tickets of the orders, recorded with them.
+            errors: Exceptions that fail a single order; any other exception is raised.
+
+        Returns:
+            The ID of each new order, or the exception that prevented creating it.
+        """
+        session_maker = get_session_maker()
+        try:
+            async with session_maker() as session, session.begin():
+                return await self.create_orders(session, create_objs, tickets)
+        except errors as e:
+            if len(create_objs) == 1:
+                return [e]
+            logger.error(
+                f"Batch of {len(create_objs)} orders failed, retrying each: {e!r}"
+            )
+
+        results: list[int | Exception] = []
+        for number, create_obj in enumerate(create_objs):
+            order_tickets = None if tickets is None else [tickets[number]]
+            try:
+                async with session_maker() as session, session.begin():
+                    if order_tickets is None:
+                        order_id = await self.create_order(session, create_obj)
+                    else:
+                        (order_id,) = await self.create_orders(
+                            session, [create_obj], order_tickets
+                        )
+                    results.append(order_id)
+            except errors as e:
+                results.append(e)
+        return results
+
 
 # Instance of CrudOrder to interact with the Order entity using its schema
 order_crud: CrudOrder = CrudOrder(Order, OrderReturnSchema)
+
+# Collects concurrent order creations of this worker when ORDER_BATCHING is enabled.
+order_batcher = MicroBatcher(
+    order_crud.create_orders_separately,
+    max_size=settings.ORDER_BATCH_MAX_SIZE,
+    max_delay=settings.ORDER_BATCH_MAX_DELAY,
+)
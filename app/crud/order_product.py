@@ -7,11 +7,11 @@ class CrudOrderProduct(CrudBase):
     """
     CRUD operations for the OrdersProducts entity.
 
-    This class currently inherits base CRUD functionality from CrudBase
-    without adding any custom methods.
+    Inherits base CRUD functionality from CrudBase and reads through its
+    ORM-free fast read path.
     """
 
-    pass
+    fast_read = True
 
 
 # Instance of CrudOrderProduct to interact with the OrdersProducts entity using its schema
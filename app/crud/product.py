@@ -7,11 +7,11 @@ class CrudProduct(CrudBase):
     """
     CRUD operations for the Product entity.
 
-    This class currently inherits base CRUD functionality from CrudBase
-    without adding any custom methods.
+    Inherits base CRUD functionality from CrudBase and reads through its
+    ORM-free fast read path.
     """
 
-    pass
+    fast_read = True
 
 
 # Instance of CrudProduct to interact with the Product entity using its schema
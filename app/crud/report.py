@@ -10,6 +10,15 @@ T = TypeVar("T")
 
 
 class CrudReport(CrudBase):
+    """
+    Report queries over orders.
+
+    Revenue and profit come from the price and cost stored on each order line
+    when it was created, so they do not change when a product's price is
+    edited. Reports read the per-order totals that triggers on orders_products
+    keep on orders, one row per order.
+    """
+
     async def get_report(self, session: AsyncSession, start_date: str, end_date: str):
         start_date, end_date = datetime.strptime(
             start_date, "%Y-%m-%d"
@@ -17,36 +26,12 @@ class CrudReport(CrudBase):
         stmt = text(
             """
             SELECT
-                COALESCE((
-                    SELECT SUM(op.amount * p.price)
-                    FROM orders_products op
-                    JOIN orders o ON op.order_id = o.id
-                    JOIN products p ON op.product_id = p.id
-                    WHERE o.created_at BETWEEN :start_date AND :end_date
-                ), 0) AS total_revenue,
-                COALESCE((
-                    SELECT SUM(op.amount * (p.price - p.cost))
-                    FROM orders_products op
-                    JOIN orders o ON op.order_id = o.id
-                    JOIN products p ON op.product_id = p.id
-                    WHERE o.created_at BETWEEN :start_date AND :end_date
-                ), 0) AS total_profit,
-                COALESCE((
-                    SELECT SUM(op.amount)
-                    FROM orders_products op
-                    JOIN orders o ON op.order_id = o.id
-                    WHERE o.created_at BETWEEN :start_date AND :end_date
-                ), 0) AS total_units_sold,
-                COALESCE((
-                    SELECT COUNT(*)
-                    FROM orders o
-                    WHERE o.created_at BETWEEN :start_date AND :end_date
-                      AND o.id IN (
-                          SELECT op.order_id
-                          FROM orders_products op
-                          WHERE op.amount < 0
-                      )
-                ), 0) AS total_returns
+                COALESCE(SUM(o.total_revenue), 0) AS total_revenue,
+                COALESCE(SUM(o.total_revenue - o.total_cost), 0) AS total_profit,
+                COALESCE(SUM(o.total_units), 0) AS total_units_sold,
+                COUNT(*) FILTER (WHERE o.has_return) AS total_returns
+            FROM orders o
+            WHERE o.created_at BETWEEN :start_date AND :end_date
             """
         )
         result = await session.execute(
@@ -1,9 +1,20 @@
-from sqlalchemy import MetaData
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+import asyncio
+from uuid import uuid4
+
+import orjson
+from sqlalchemy import MetaData, event, text
+from sqlalchemy.ext.asyncio import (
+    AsyncConnection,
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.orm import declarative_base
-from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from app.config import settings
+from app.logger import logger
+from app.pool import GovernedQueuePool, pool_limits
 
 # Metadata object for table definitions.
 metadata = MetaData()
@@ -11,18 +22,232 @@ metadata = MetaData()
 # Declarative base class for SQLAlchemy models.
 Base = declarative_base(metadata=metadata)
 
-# Create an asynchronous database engine with connection pooling.
-engine = create_async_engine(
-    settings.DATABASE_URL,
-    poolclass=AsyncAdaptedQueuePool,
-    pool_size=200,
-    max_overflow=100,
-    pool_timeout=300,
-)
+# Workload class used by routes that do not declare one.
+DEFAULT_WORKLOAD = "oltp"
 
-# Session factory for creating asynchronous database sessions.
-async_session_maker = async_sessionmaker(
-    engine,
-    class_=AsyncSession,
-    expire_on_commit=False,  # Prevent objects from expiring after commit, useful for long-lived objects.
-)
+
+def create_workload_engine(workload: str, read_only: bool = False) -> AsyncEngine:
+    """
+    Creates an asynchronous database engine with its own connection pool for a workload class.
+
+    Each workload class gets its own pool size, overflow, pool timeout and
+    server-side statement timeout, so that e.g. a burst of reports cannot take
+    the connections of order creation. Pool limits are derived from the global
+    connection budget when one is set, see pool_limits. Read-only engines point
+    at the read replica when one is configured and start every transaction READ ONLY.
+
+    With DB_PGBOUNCER the engine is safe behind a transaction pooler, which may
+    run every transaction on a different server connection: prepared statements
+    get unique names and are only cached when DB_STATEMENT_CACHE_SIZE allows it,
+    and the statement timeout is set per transaction instead of per connection.
+
+    json and jsonb values are encoded and decoded with orjson by the codecs
+    that the asyncpg dialect registers on every new connection.
+
+    Args:
+        workload (str): Name of the workload class, a key of settings.WORKLOADS.
+        read_only (bool): Whether to create the read-only engine of the class.
+
+    Returns:
+        AsyncEngine: The configured engine.
+    """
+    options = settings.WORKLOADS[workload]
+    pool_size, max_overflow = pool_limits(workload, read_only)
+    server_settings = {"application_name": f"backend-{workload}"}
+    connect_args = {
+        "server_settings": server_settings,
+        "prepared_statement_cache_size": settings.STATEMENT_CACHE_SIZE,
+    }
+    if settings.DB_PGBOUNCER:
+        # asyncpg's own statement cache would reuse statements on other server connections.
+        connect_args["statement_cache_size"] = 0
+        connect_args["prepared_statement_name_func"] = prepared_statement_name
+    else:
+        server_settings["statement_timeout"] = str(options["statement_timeout"])
+
+    engine = create_async_engine(
+        settings.REPLICA_DATABASE_URL if read_only else settings.DATABASE_URL,
+        poolclass=GovernedQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=options["pool_timeout"],
+        connect_args=connect_args,
+        json_serializer=json_serializer,
+        json_deserializer=orjson.loads,
+        execution_options={"postgresql_readonly": True} if read_only else {},
+    )
+    if settings.DB_PGBOUNCER:
+        set_transaction_statement_timeout(engine, options["statement_timeout"])
+    return engine
+
+
+def json_serializer(value) -> str:
+    """
+    Serializes a value for a json or jsonb parameter with orjson.
+    """
+    return orjson.dumps(value).decode()
+
+
+def prepared_statement_name() -> str:
+    """
+    Returns a prepared statement name that is unique across all clients of a pooler.
+    """
+    return f"__asyncpg_{uuid4()}__"
+
+
+def set_transaction_statement_timeout(engine: AsyncEngine, timeout_ms: int) -> None:
+    """
+    Sets the statement timeout with SET LOCAL at the start of every transaction of the engine.
+
+    Args:
+        engine (AsyncEngine): The engine.
+        timeout_ms (int): Statement timeout in milliseconds.
+    """
+
+    @event.listens_for(engine.sync_engine, "begin")
+    def set_local_statement_timeout(connection) -> None:
+        # Through the DBAPI cursor: it opens the transaction the SET LOCAL belongs to.
+        cursor = connection.connection.cursor()
+        cursor.execute(f"SET LOCAL statement_timeout = {timeout_ms}")
+        cursor.close()
+
+
+class LazyEngineSessionMaker(async_sessionmaker):
+    """
+    Session factory that creates the engines when the first session is made.
+
+    The application creates and warms the engines in its lifespan; scripts and
+    tests that never run the lifespan still get working sessions.
+    """
+
+    def __call__(self, **local_kw) -> AsyncSession:
+        init_engines()
+        return super().__call__(**local_kw)
+
+
+# Engines and session factories per (workload class, read-only) pair. Engines are
+# created by init_engines, the session factories are bound to them at that point.
+engines: dict[tuple[str, bool], AsyncEngine] = {}
+session_makers: dict[tuple[str, bool], async_sessionmaker] = {
+    (workload, read_only): LazyEngineSessionMaker(
+        class_=AsyncSession,
+        expire_on_commit=False,  # Prevent objects from expiring after commit, useful for long-lived objects.
+    )
+    for workload in settings.WORKLOADS
+    for read_only in (False, True)
+}
+
+
+def init_engines() -> dict[tuple[str, bool], AsyncEngine]:
+    """
+    Creates the engines of all workload classes, unless they already exist.
+
+    Returns:
+        dict[tuple[str, bool], AsyncEngine]: Engines per (workload class, read-only) pair.
+    """
+    if not engines:
+        for key, session_maker in session_makers.items():
+            engines[key] = create_workload_engine(*key)
+            session_maker.configure(bind=engines[key])
+    return engines
+
+
+async def warm_engines() -> None:
+    """
+    Opens the configured number of connections of every pool ahead of the first request.
+
+    Every connection runs one query, so connecting, authentication and asyncpg's
+    type introspection are paid at startup. The connections are opened
+    concurrently and all held until the last one is up, so the pools keep
+    that many. Failures are logged, the pools then fill on demand.
+    """
+
+    async def open_connection(engine: AsyncEngine) -> AsyncConnection:
+        connection = await engine.connect()
+        try:
+            await connection.execute(text("SELECT 1"))
+        except Exception:
+            await connection.close()
+            raise
+        return connection
+
+    results = await asyncio.gather(
+        *(
+            open_connection(engine)
+            for (workload, _), engine in init_engines().items()
+            for _ in range(
+                min(settings.WORKLOADS[workload]["prewarm"], engine.pool.size())
+            )
+        ),
+        return_exceptions=True,
+    )
+    connections = [item for item in results if isinstance(item, AsyncConnection)]
+    await asyncio.gather(*(connection.close() for connection in connections))
+    errors = [item for item in results if isinstance(item, Exception)]
+    if errors:
+        logger.error(
+            f"Connection pool warm-up failed: {len(errors)} of {len(results)} connections, {errors[0]}"
+        )
+
+
+async def dispose_engines() -> None:
+    """
+    Closes all pooled connections and drops the engines.
+    """
+    await asyncio.gather(*(engine.dispose() for engine in engines.values()))
+    engines.clear()
+
+
+def get_engine(
+    workload: str = DEFAULT_WORKLOAD, read_only: bool = False
+) -> AsyncEngine:
+    """
+    Returns the engine of a workload class, creating the engines if needed.
+
+    Args:
+        workload (str): Name of the workload class.
+        read_only (bool): Whether to return the read-only engine.
+
+    Returns:
+        AsyncEngine: The engine.
+    """
+    return init_engines()[(workload, read_only)]
+
+
+def get_session_maker(
+    workload: str = DEFAULT_WORKLOAD, read_only: bool = False
+) -> async_sessionmaker:
+    """
+    Returns the session factory of a workload class.
+
+    Args:
+        workload (str): Name of the workload class.
+        read_only (bool): Whether sessions should use the read-only engine.
+
+    Returns:
+        async_sessionmaker: Session factory bound to the matching engine.
+    """
+    return session_makers[(workload, read_only)]
+
+
+def set_statement_timeout(session: AsyncSession, seconds: float) -> None:
+    """
+    Limits every statement of the session's transactions to the given duration.
+
+    The limit is applied with SET LOCAL when a transaction begins, so it ends
+    with the transaction and never leaks to the next user of the connection.
+
+    Args:
+        session (AsyncSession): The session to limit.
+        seconds (float): Maximum duration of a statement.
+    """
+    timeout_ms = max(int(seconds * 1000), 1)
+
+    @event.listens_for(session.sync_session, "after_begin")
+    def set_local_statement_timeout(sync_session, transaction, connection) -> None:
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {timeout_ms}")
+
+
+# Default session factories, used outside of workload-aware code.
+async_session_maker = get_session_maker(DEFAULT_WORKLOAD)
+async_read_session_maker = get_session_maker(DEFAULT_WORKLOAD, read_only=True)
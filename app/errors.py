@@ -0,0 +1,38 @@
+from fastapi import status
+from sqlalchemy.exc import DBAPIError
+
+# Statuses of database errors caused by a request's data, by SQLSTATE or by
+# SQLSTATE class (its first two characters).
+REQUEST_SQLSTATES = {
+    "23502": status.HTTP_422_UNPROCESSABLE_ENTITY,  # not_null_violation
+    "23503": status.HTTP_422_UNPROCESSABLE_ENTITY,  # foreign_key_violation, e.g. an unknown product
+    "23": status.HTTP_409_CONFLICT,  # other integrity violations, e.g. short stock or a duplicate line
+    "22": status.HTTP_422_UNPROCESSABLE_ENTITY,  # data_exception, e.g. a value out of range
+}
+
+
+def request_error_status(exc: Exception) -> int | None:
+    """
+    Returns the status of a database error caused by the request's data.
+
+    Args:
+        exc (Exception): The exception, a SQLAlchemy error wrapping an asyncpg one or an asyncpg error.
+
+    Returns:
+        int | None: 409 or 422, None if the exception is no such error.
+    """
+    sqlstate = getattr(getattr(exc, "orig", None), "sqlstate", None) or getattr(
+        exc, "sqlstate", None
+    )
+    if not isinstance(sqlstate, str):
+        return None
+    return REQUEST_SQLSTATES.get(sqlstate) or REQUEST_SQLSTATES.get(sqlstate[:2])
+
+
+def error_message(error: Exception) -> str:
+    """
+    Returns the message of an error, without the SQL of database errors.
+    """
+    if isinstance(error, DBAPIError) and error.orig is not None:
+        error = error.orig.__cause__ or error.orig
+    return str(error)
@@ -0,0 +1,114 @@
+import asyncio
+from dataclasses import dataclass, field
+import time
+
+from sqlalchemy import text
+
+from app import cahce
+from app.config import settings
+from app.db import get_engine
+from app.logger import logger
+
+
+@dataclass
+class Readiness:
+    """
+    Result of a readiness probe.
+
+    Attributes:
+        database (bool): Whether the database answered a query.
+        redis (bool): Whether Redis answered a ping.
+        checked_at (float): time.monotonic() of the probe.
+    """
+
+    database: bool
+    redis: bool
+    checked_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def ready(self) -> bool:
+        """
+        Whether all dependencies are available.
+        """
+        return self.database and self.redis
+
+    @property
+    def age(self) -> float:
+        """
+        Seconds since the probe.
+        """
+        return time.monotonic() - self.checked_at
+
+
+class ReadinessProbe:
+    """
+    Checks the database and Redis and reuses the result for a short time.
+
+    Load balancers poll readiness often; caching the result keeps the probe
+    from taking pool connections away from requests. The probe reports not
+    ready until the application marks its connection pools as warm.
+
+    Attributes:
+        ttl (float): Seconds a result is reused.
+        timeout (float): Seconds each dependency check may take.
+        warm (bool): Whether the connection pools have been warmed up.
+    """
+
+    def __init__(self, ttl: float, timeout: float) -> None:
+        """
+        Initializes the probe without a cached result.
+
+        Args:
+            ttl (float): Seconds a result is reused.
+            timeout (float): Seconds each dependency check may take.
+        """
+        self.ttl = ttl
+        self.timeout = timeout
+        self.warm = False
+        self._result: Readiness | None = None
+
+    async def check(self) -> Readiness:
+        """
+        Returns the cached result, probing the dependencies when it is too old.
+
+        Returns:
+            Readiness: Availability of the database and Redis.
+        """
+        if self._result is None or self._result.age > self.ttl:
+            database, redis = await asyncio.gather(
+                self._probe("database", self._check_database()),
+                self._probe("redis", self._check_redis()),
+            )
+            self._result = Readiness(database=database, redis=redis)
+        return self._result
+
+    def reset(self) -> None:
+        """
+        Drops the cached result and marks the pools as cold, e.g. on shutdown.
+        """
+        self.warm = False
+        self._result = None
+
+    async def _probe(self, name: str, check) -> bool:
+        try:
+            await asyncio.wait_for(check, timeout=self.timeout)
+            return True
+        except Exception as e:
+            logger.error(f"Readiness check of {name} failed: {e!r}")
+            return False
+
+    @staticmethod
+    async def _check_database() -> None:
+        async with get_engine().connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    @staticmethod
+    async def _check_redis() -> None:
+        if cahce.redis_client is None:
+            raise RuntimeError("Redis client is not initialized")
+        await cahce.redis_client.ping()
+
+
+readiness_probe = ReadinessProbe(
+    settings.READINESS_CACHE_TTL, settings.READINESS_TIMEOUT
+)
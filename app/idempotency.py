@@ -0,0 +1,229 @@
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import time
+
+import orjson
+import redis
+
+from app.config import settings
+
+# Store of idempotency keys, created by init_idempotency_store.
+idempotency_store: "IdempotencyStore | None" = None
+
+
+def init_idempotency_store() -> None:
+    """
+    Creates the store of idempotency keys selected by IDEMPOTENCY_BACKEND.
+    """
+    global idempotency_store
+    if settings.IDEMPOTENCY_BACKEND == "memory":
+        idempotency_store = MemoryIdempotencyStore()
+    else:
+        idempotency_store = RedisIdempotencyStore(
+            redis.asyncio.from_url(settings.REDIS_URL), prefix="idempotency"
+        )
+
+
+@dataclass(frozen=True)
+class IdempotencyRecord:
+    """
+    State of an idempotency key: claimed by a running request, or holding its response.
+
+    Attributes:
+        fingerprint (str): Hash of the body of the request that claimed the key.
+        token (str): Random ID of the claim, which only its request may complete or release.
+        status_code (int | None): Status code of the response, None while the request runs.
+        headers (dict[str, str]): Headers of the response.
+        body (bytes): Body of the response.
+    """
+
+    fingerprint: str
+    token: str = ""
+    status_code: int | None = None
+    headers: dict[str, str] = field(default_factory=dict)
+    body: bytes = b""
+
+    @property
+    def completed(self) -> bool:
+        """
+        Whether the record holds the response of its request.
+        """
+        return self.status_code is not None
+
+    def dumps(self) -> bytes:
+        """
+        Serializes the record to one bytes value: a JSON header line followed by the body.
+        """
+        header = {
+            "fingerprint": self.fingerprint,
+            "token": self.token,
+            "status_code": self.status_code,
+            "headers": self.headers,
+        }
+        return orjson.dumps(header) + b"\n" + self.body
+
+    @classmethod
+    def loads(cls, value: bytes) -> "IdempotencyRecord":
+        """
+        Restores a record serialized by 'dumps'.
+        """
+        header, body = value.split(b"\n", 1)
+        return cls(body=body, **orjson.loads(header))
+
+
+class IdempotencyStore:
+    """
+    Storage of idempotency records by key.
+    """
+
+    async def claim(self, key: str, record: IdempotencyRecord, ttl: float) -> bool:
+        """
+        Stores a record under a key for 'ttl' seconds, unless the key already has one.
+
+        Returns whether the record was stored.
+        """
+        raise NotImplementedError
+
+    async def get(self, key: str) -> IdempotencyRecord | None:
+        """
+        Returns the record stored under a key, None if there is none or it expired.
+        """
+        raise NotImplementedError
+
+    async def complete(
+        self, key: str, token: str, record: IdempotencyRecord, ttl: float
+    ) -> bool:
+        """
+        Replaces the claim of a key by a record for 'ttl' seconds, if the claim still has the token.
+
+        Returns whether the record was stored.
+        """
+        raise NotImplementedError
+
+    async def release(self, key: str, token: str) -> bool:
+        """
+        Removes the claim of a key, if it still has the token.
+
+        Returns whether the claim was removed.
+        """
+        raise NotImplementedError
+
+
+# Compares the token of the record under KEYS[1] with ARGV[1] and, if they
+# match, replaces the record by ARGV[2] for ARGV[3] milliseconds, or removes
+# it without them. The header line of a record is its JSON before the body.
+IF_CLAIMED_SCRIPT = """
+local value = redis.call('GET', KEYS[1])
+if not value then
+    return 0
+end
+local header = string.sub(value, 1, string.find(value, '\\n', 1, true) - 1)
+if cjson.decode(header)['token'] ~= ARGV[1] then
+    return 0
+end
+if ARGV[2] then
+    redis.call('SET', KEYS[1], ARGV[2], 'PX', ARGV[3])
+else
+    redis.call('DEL', KEYS[1])
+end
+return 1
+"""
+
+
+class RedisIdempotencyStore(IdempotencyStore):
+    """
+    Idempotency store in Redis, shared by all workers.
+
+    Attributes:
+        client (redis.asyncio.Redis): Redis client returning bytes.
+        prefix (str): Prefix of the Redis keys.
+    """
+
+    def __init__(self, client: redis.asyncio.Redis, prefix: str) -> None:
+        self.client = client
+        self.prefix = prefix
+        self._if_claimed = client.register_script(IF_CLAIMED_SCRIPT)
+
+    async def claim(self, key: str, record: IdempotencyRecord, ttl: float) -> bool:
+        stored = await self.client.set(
+            f"{self.prefix}:{key}", record.dumps(), px=int(ttl * 1000), nx=True
+        )
+        return bool(stored)
+
+    async def get(self, key: str) -> IdempotencyRecord | None:
+        value = await self.client.get(f"{self.prefix}:{key}")
+        return IdempotencyRecord.loads(value) if value is not None else None
+
+    async def complete(
+        self, key: str, token: str, record: IdempotencyRecord, ttl: float
+    ) -> bool:
+        stored = await self._if_claimed(
+            keys=[f"{self.prefix}:{key}"],
+            args=[token, record.dumps(), int(ttl * 1000)],
+        )
+        return bool(stored)
+
+    async def release(self, key: str, token: str) -> bool:
+        removed = await self._if_claimed(keys=[f"{self.prefix}:{key}"], args=[token])
+        return bool(removed)
+
+
+class MemoryIdempotencyStore(IdempotencyStore):
+    """
+    Idempotency store in the memory of this worker, for tests and single-worker deployments.
+
+    The least recently stored records are evicted beyond 'max_items'.
+
+    Attributes:
+        max_items (int): Number of records kept.
+    """
+
+    def __init__(self, max_items: int = 10_000) -> None:
+        self.max_items = max_items
+        self._records: OrderedDict[str, tuple[float, IdempotencyRecord]] = OrderedDict()
+        self._lock = asyncio.Lock()
+
+    async def claim(self, key: str, record: IdempotencyRecord, ttl: float) -> bool:
+        async with self._lock:
+            if self._get(key) is not None:
+                return False
+            self._put(key, record, ttl)
+            return True
+
+    async def get(self, key: str) -> IdempotencyRecord | None:
+        return self._get(key)
+
+    async def complete(
+        self, key: str, token: str, record: IdempotencyRecord, ttl: float
+    ) -> bool:
+        async with self._lock:
+            claim = self._get(key)
+            if claim is None or claim.token != token:
+                return False
+            self._put(key, record, ttl)
+            return True
+
+    async def release(self, key: str, token: str) -> bool:
+        async with self._lock:
+            claim = self._get(key)
+            if claim is None or claim.token != token:
+                return False
+            del self._records[key]
+            return True
+
+    def _get(self, key: str) -> IdempotencyRecord | None:
+        item = self._records.get(key)
+        if item is None:
+            return None
+        expires_at, record = item
+        if expires_at <= time.monotonic():
+            del self._records[key]
+            return None
+        return record
+
+    def _put(self, key: str, record: IdempotencyRecord, ttl: float) -> None:
+        self._records[key] = (time.monotonic() + ttl, record)
+        self._records.move_to_end(key)
+        while len(self._records) > self.max_items:
+            self._records.popitem(last=False)
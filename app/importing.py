@@ -0,0 +1,273 @@
+import codecs
+import csv
+from datetime import datetime
+from typing import AsyncIterator
+
+from asyncpg.exceptions import DataError as CopyDataError
+from asyncpg.exceptions import IntegrityConstraintViolationError
+from fastapi import HTTPException, Request, status
+import orjson
+from pydantic import BaseModel, ValidationError
+from sqlalchemy.exc import DataError, IntegrityError
+
+from app.config import settings
+from app.crud.base import CrudBase
+from app.db import get_session_maker
+from app.errors import error_message
+from app.logger import logger
+from app.schemas.base import ImportErrorSchema, ImportReportSchema
+
+# Errors that reject a batch of imported rows. COPY runs on the asyncpg
+# connection itself, so its errors are not wrapped by SQLAlchemy.
+IMPORT_ERRORS = (
+    IntegrityError,
+    DataError,
+    IntegrityConstraintViolationError,
+    CopyDataError,
+)
+
+CSV_CONTENT_TYPE = "text/csv"
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/jsonl")
+
+# Request body of the import routes, for the OpenAPI schema.
+IMPORT_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            CSV_CONTENT_TYPE: {"schema": {"type": "string"}},
+            NDJSON_CONTENT_TYPES[0]: {"schema": {"type": "string"}},
+        },
+    }
+}
+
+# A chunk of parsed rows: line of each row, with its values or the error that rejected it.
+ParsedRows = list[tuple[int, dict | str]]
+
+
+async def read_lines(request: Request) -> AsyncIterator[list[tuple[int, str]]]:
+    """
+    Reads the lines of a request body as it arrives.
+
+    Args:
+        request (Request): HTTP request with a UTF-8 body.
+
+    Yields:
+        list[tuple[int, str]]: Complete lines received so far, numbered from 1, without line endings.
+
+    Raises:
+        HTTPException: 400 if the body is not valid UTF-8.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending, line = "", 0
+    try:
+        async for chunk in request.stream():
+            *lines, pending = (pending + decoder.decode(chunk)).split("\n")
+            if lines:
+                yield [(line := line + 1, text.rstrip("\r")) for text in lines]
+        pending += decoder.decode(b"", final=True)
+    except UnicodeDecodeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=f"Body is not UTF-8: {e}"
+        )
+    if pending:
+        yield [(line + 1, pending.rstrip("\r"))]
+
+
+async def parse_csv(
+    lines: AsyncIterator[list[tuple[int, str]]], fields: set[str]
+) -> AsyncIterator[ParsedRows]:
+    """
+    Parses CSV lines whose first record names the columns; empty values are null.
+
+    Quoted values may span lines, a record is numbered by its first line.
+
+    Args:
+        lines (AsyncIterator): Chunks of numbered lines, see read_lines.
+        fields (set[str]): Columns the header may name.
+
+    Yields:
+        ParsedRows: Rows of the records completed by each chunk of lines.
+
+    Raises:
+        HTTPException: 400 if the header names an unknown column.
+    """
+    header = None
+    record: list[str] = []
+    start = 0
+    async for chunk in lines:
+        numbers, records = [], []
+        for line, text in chunk:
+            if not record:
+                start = line
+            record.append(text)
+            # Quotes are escaped by doubling them, an odd count leaves a value open.
+            if sum(part.count('"') for part in record) % 2 == 0:
+                numbers.append(start)
+                records.append("\n".join(record))
+                record = []
+
+        rows = []
+        for line, values in zip(numbers, csv.reader(records)):
+            if not values:
+                continue
+            if header is None:
+                header = values
+                unknown = set(header) - fields
+                if unknown:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail=f"Unknown columns: {', '.join(sorted(unknown))}",
+                    )
+            elif len(values) != len(header):
+                rows.append((line, f"expected {len(header)} values, got {len(values)}"))
+            else:
+                rows.append((line, {k: v or None for k, v in zip(header, values)}))
+        yield rows
+
+    if record:
+        yield [(start, "unterminated quoted value")]
+
+
+async def parse_ndjson(
+    lines: AsyncIterator[list[tuple[int, str]]],
+) -> AsyncIterator[ParsedRows]:
+    """
+    Parses lines holding one JSON object each; blank lines are skipped.
+
+    Args:
+        lines (AsyncIterator): Chunks of numbered lines, see read_lines.
+
+    Yields:
+        ParsedRows: Rows of each chunk of lines.
+    """
+    async for chunk in lines:
+        rows = []
+        for line, text in chunk:
+            if not text.strip():
+                continue
+            try:
+                row = orjson.loads(text)
+            except orjson.JSONDecodeError as e:
+                rows.append((line, f"invalid JSON: {e}"))
+                continue
+            rows.append(
+                (line, row if isinstance(row, dict) else "expected a JSON object")
+            )
+        yield rows
+
+
+def parse_rows(request: Request, fields: set[str]) -> AsyncIterator[ParsedRows]:
+    """
+    Parses the rows of a request body in the format given by its Content-Type.
+
+    Args:
+        request (Request): HTTP request with a CSV or NDJSON body.
+        fields (set[str]): Columns the rows may have.
+
+    Returns:
+        AsyncIterator[ParsedRows]: Chunks of parsed rows, as the body arrives.
+
+    Raises:
+        HTTPException: 415 if the body is neither CSV nor NDJSON.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type == CSV_CONTENT_TYPE:
+        return parse_csv(read_lines(request), fields)
+    if content_type in NDJSON_CONTENT_TYPES:
+        return parse_ndjson(read_lines(request))
+    raise HTTPException(
+        status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+        detail=f"Expected {CSV_CONTENT_TYPE} or {NDJSON_CONTENT_TYPES[0]}",
+    )
+
+
+def validation_message(error: ValidationError) -> str:
+    """
+    Returns the errors of a row validation on one line.
+    """
+    return "; ".join(
+        f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in error.errors()
+    )
+
+
+async def import_rows(
+    crud: CrudBase,
+    schema: type[BaseModel],
+    request: Request,
+    workload: str,
+    staging: bool = False,
+) -> ImportReportSchema:
+    """
+    Imports the rows of a streamed CSV or NDJSON request body into the table of a CRUD.
+
+    Rows are validated with 'schema' as they are parsed and written with COPY
+    in batches of settings.IMPORT_BATCH_SIZE, each in a transaction of its
+    own, so memory stays flat however large the body is and batches written
+    before a failing one stay written. A batch breaking a constraint is
+    rejected as a whole; with 'staging' it goes through a staging table and
+    only its invalid rows are rejected, see CrudBase.copy_rows_through_staging.
+
+    Args:
+        crud (CrudBase): CRUD of the table to import into.
+        schema (type[BaseModel]): Schema validating a row.
+        request (Request): HTTP request with a CSV or NDJSON body.
+        workload (str): Workload class whose connection pool writes the batches.
+        staging (bool): Whether to write through a staging table.
+
+    Returns:
+        ImportReportSchema: Numbers of rows read, imported and rejected, with the first errors.
+    """
+    table_columns = crud.model.__table__.c
+    columns = [name for name in schema.model_fields if name in table_columns]
+    # COPY does not apply the ORM's default of created_at.
+    stamped = "created_at" in table_columns and "created_at" not in columns
+    report = ImportReportSchema()
+    session_maker = get_session_maker(workload)
+
+    def reject(line: int, error: str) -> None:
+        report.failed += 1
+        if len(report.errors) < settings.IMPORT_MAX_ERRORS:
+            report.errors.append(ImportErrorSchema(line=line, error=error))
+
+    async def write(batch: list[tuple]) -> None:
+        names = [*columns, "created_at"] if stamped else columns
+        if stamped:
+            now = datetime.now()
+            batch = [(*record, now) for record in batch]
+        try:
+            async with session_maker() as session, session.begin():
+                if staging:
+                    errors = await crud.copy_rows_through_staging(session, names, batch)
+                else:
+                    await crud.copy_rows(session, names, [r[1:] for r in batch])
+                    errors = {}
+        except IMPORT_ERRORS as e:
+            errors = dict.fromkeys((record[0] for record in batch), error_message(e))
+        for line, error in sorted(errors.items()):
+            reject(line, error)
+        report.imported += len(batch) - len(errors)
+        report.batches += 1
+        logger.info(
+            f"Import into {crud.model.__tablename__}: {report.rows} rows read, "
+            f"{report.imported} imported, {report.failed} rejected"
+        )
+
+    batch = []
+    async for rows in parse_rows(request, set(schema.model_fields)):
+        for line, row in rows:
+            report.rows += 1
+            if isinstance(row, str):
+                reject(line, row)
+                continue
+            try:
+                obj = schema.model_validate(row)
+            except ValidationError as e:
+                reject(line, validation_message(e))
+                continue
+            batch.append((line, *(getattr(obj, name) for name in columns)))
+            if len(batch) >= settings.IMPORT_BATCH_SIZE:
+                await write(batch)
+                batch = []
+    if batch:
+        await write(batch)
+    return report
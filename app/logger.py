@@ -39,4 +39,9 @@ def setup_logger(name, log_level=logging.INFO, log_file=None):
     return logger
 
 
-logger = setup_logger("my_logger", log_level=logging.DEBUG, log_file="app.log")
+# Test runs log to the console only, so they leave the log files alone.
+logger = setup_logger(
+    "my_logger",
+    log_level=logging.DEBUG,
+    log_file=None if "pytest" in sys.modules else "app.log",
+)
@@ -3,13 +3,19 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.cahce import init_redis_cache
+from app.cahce import init_redis_client, init_response_cache
+from app.config import settings
+from app.db import dispose_engines, init_engines, warm_engines
+from app.health import readiness_probe
+from app.idempotency import init_idempotency_store
 from app.midlewares import DBSessionMiddleware, setup_error_middleware
+from app.order_queue import start_order_queue, stop_order_queue
 from app.routers import (
     order_product_router,
     order_router,
     product_router,
     report_router,
+    system_router,
 )
 
 
@@ -17,10 +23,22 @@ from app.routers import (
 async def lifespan(app: FastAPI):
     """
     Application lifespan context manager.
-    Initializes Redis cache on application startup.
+    Creates the Redis client, the response cache and the idempotency store, creates the database
+    engines and opens their pre-warmed connections on application startup, then starts the order
+    queue writer when ORDER_QUEUE is enabled; stops the writer and closes the engines on shutdown.
     """
-    await init_redis_cache()
+    init_redis_client()
+    init_response_cache()
+    init_idempotency_store()
+    init_engines()
+    await warm_engines()
+    if settings.ORDER_QUEUE:
+        await start_order_queue()
+    readiness_probe.warm = True
     yield
+    readiness_probe.reset()
+    await stop_order_queue()
+    await dispose_engines()
 
 
 # Create FastAPI application instance with lifespan context.
@@ -40,6 +58,7 @@ app.include_router(order_router, tags=["Orders"])
 app.include_router(order_product_router, tags=["OrdersProducts"])
 app.include_router(product_router, tags=["Products"])
 app.include_router(report_router, tags=["Reports"])
+app.include_router(system_router, tags=["System"])
 
 # Setup custom error handling middleware.
 setup_error_middleware(app)
@@ -1,2 +1,2 @@
-from .db import DBSessionMiddleware
+from .db import DBSessionMiddleware, LazySession
 from .exception import setup_error_middleware
@@ -1,42 +1,170 @@
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
+from typing import Callable
 
-from app.db import async_session_maker
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+from app.db import (
+    DEFAULT_WORKLOAD,
+    async_session_maker,
+    get_session_maker,
+    set_statement_timeout,
+)
 from app.logger import logger
+from app.midlewares.exception import ErrorHandlingMiddleware
+
+# Methods whose requests only read and can run in a read-only transaction.
+READ_ONLY_METHODS = frozenset({"GET", "HEAD"})
 
 
-class DBSessionMiddleware(BaseHTTPMiddleware):
+class LazySession:
     """
-    Middleware for handling database sessions in FastAPI requests.
+    Stand-in for an AsyncSession that creates the real session on first use.
 
-    This middleware ensures that a database session is created at the beginning
-    of a request and closed at the end. It commits the session if the request
-    is successful, or rolls back in case of an exception.
+    Any attribute access other than commit/rollback/close (e.g. 'execute') creates
+    the underlying session, so requests that never touch the database never create
+    one and never check out a connection. Commit and rollback are skipped when no
+    transaction was started, i.e. when no SQL ran.
 
     Attributes:
-        async_session_maker: SQLAlchemy async session factory.
+        session_factory: Callable creating the underlying session, e.g. an async_sessionmaker.
     """
 
-    async def dispatch(self, request: Request, call_next):
+    def __init__(
+        self, session_factory: Callable[[], AsyncSession] = async_session_maker
+    ):
         """
-        Handles the lifecycle of a database session for each request.
+        Initializes the lazy session without creating the real one.
 
         Args:
-            request (Request): The incoming FastAPI request.
-            call_next: The next middleware or endpoint handler.
+            session_factory (Callable[[], AsyncSession]): Factory for the underlying session.
+        """
+        self.session_factory = session_factory
+        self._session: AsyncSession | None = None
+
+    @property
+    def started(self) -> bool:
+        """
+        Whether the underlying session has been created.
+        """
+        return self._session is not None
+
+    @property
+    def session(self) -> AsyncSession:
+        """
+        Returns the underlying session, creating it on first access.
+        """
+        if self._session is None:
+            self._session = self.session_factory()
+        return self._session
+
+    def __getattr__(self, name: str):
+        return getattr(self.session, name)
 
-        Returns:
-            Response: The response from the downstream middleware or route handler.
+    async def commit(self) -> None:
+        """
+        Commits the current transaction, if any SQL ran.
+        """
+        if self._session is not None and self._session.in_transaction():
+            await self._session.commit()
+
+    async def rollback(self) -> None:
+        """
+        Rolls back the current transaction, if any SQL ran.
+        """
+        if self._session is not None and self._session.in_transaction():
+            await self._session.rollback()
+
+    async def close(self) -> None:
+        """
+        Closes the underlying session, if it was created.
+        """
+        if self._session is not None:
+            await self._session.close()
+
+
+class DBSessionMiddleware:
+    """
+    Pure ASGI middleware for handling database sessions in FastAPI requests.
+
+    This middleware attaches a lazy database session to every request; the real
+    session is only created when a handler first uses it. The session is
+    committed right before the response starts. A failed commit is rolled back
+    and its error response, built by ErrorHandlingMiddleware, is sent instead
+    of the response. The session is rolled back when an exception escapes the
+    application.
+
+    The session is created on the engine of the workload class declared by the
+    matched route ("oltp" by default). With read routing enabled, GET and HEAD
+    requests use the read-only engine of that class, whose transactions are
+    READ ONLY and may run on a read replica. Routes with a deadline limit every
+    statement of the session to that deadline.
+
+    Attributes:
+        app (ASGIApp): The wrapped ASGI application.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        """
+        Initializes the middleware with the wrapped ASGI application.
+
+        Args:
+            app (ASGIApp): The wrapped ASGI application.
+        """
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """
+        Handles the lifecycle of a database session for each request.
+
+        Args:
+            scope (Scope): The ASGI connection scope.
+            receive (Receive): The ASGI receive channel.
+            send (Send): The ASGI send channel.
 
         Raises:
             Exception: Re-raises any exception that occurs during request processing.
         """
-        session = async_session_maker()
-        request.state.session = session
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        read_only = settings.DB_READ_ROUTING and scope["method"] in READ_ONLY_METHODS
+
+        def session_factory() -> AsyncSession:
+            # Called on first use, when routing has already put the route in the scope.
+            route = scope.get("route")
+            workload = getattr(route, "workload", DEFAULT_WORKLOAD)
+            session = get_session_maker(workload, read_only)()
+            deadline = getattr(route, "deadline", None)
+            if deadline is not None:
+                set_statement_timeout(session, deadline)
+            return session
+
+        session = LazySession(session_factory)
+        scope.setdefault("state", {})["session"] = session
+
+        # Set once a failed commit replaced the response, whose messages are then dropped.
+        commit_failed = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal commit_failed
+            if commit_failed:
+                return
+            if message["type"] == "http.response.start":
+                try:
+                    await session.commit()
+                except Exception as e:
+                    logger.error(f"Commit failed: {str(e)[:450]}")
+                    commit_failed = True
+                    await session.rollback()
+                    response = ErrorHandlingMiddleware.error_response(e)
+                    await response(scope, receive, send)
+                    return
+            await send(message)
+
         try:
-            response = await call_next(request)
-            await session.commit()
-            return response
+            await self.app(scope, receive, send_wrapper)
         except Exception as e:
             logger.error(f"Rollback session: {str(e)[:450]}")
             await session.rollback()
@@ -1,67 +1,127 @@
-from typing import Any, Union
-
-from fastapi import FastAPI, Request, status
+from fastapi import FastAPI, status
 from fastapi.exceptions import HTTPException
 from fastapi.responses import JSONResponse
 from pydantic import ValidationError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
+from app.config import settings
+from app.errors import error_message, request_error_status
 from app.logger import logger
+from app.order_queue import OrderQueueFullError
 
 
 class ErrorHandlingMiddleware:
     """
-    Middleware for handling errors and exceptions in FastAPI requests.
+    Pure ASGI middleware for handling errors and exceptions in FastAPI requests.
 
-    Catches HTTPException, ValidationError, and other unexpected exceptions,
-    logging the error and returning a proper JSONResponse with a status code.
+    Catches HTTPException, ValidationError, database errors caused by the
+    request's data, database pool timeouts, a full order queue and other
+    unexpected exceptions, logging the error and returning a
+    proper JSONResponse with a status code.
+    Exceptions raised after the response has started are re-raised, since the
+    status line has already been sent.
     """
 
-    def __init__(self, app: FastAPI) -> None:
+    def __init__(self, app: ASGIApp) -> None:
         """
-        Initializes the middleware with the FastAPI app instance.
+        Initializes the middleware with the wrapped ASGI application.
 
         Args:
-            app (FastAPI): The FastAPI application instance.
+            app (ASGIApp): The wrapped ASGI application.
         """
         self.app = app
 
-    async def __call__(self, request: Request, call_next) -> Union[JSONResponse, Any]:
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         """
         Handles exceptions during request processing.
 
         Args:
-            request (Request): The incoming FastAPI request.
-            call_next: The next middleware or endpoint handler.
+            scope (Scope): The ASGI connection scope.
+            receive (Receive): The ASGI receive channel.
+            send (Send): The ASGI send channel.
+        """
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        response_started = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as exc:
+            if response_started:
+                raise
+            response = self.error_response(exc)
+            await response(scope, receive, send)
+
+    @staticmethod
+    def error_response(exc: Exception) -> JSONResponse:
+        """
+        Builds the JSON error response for an exception.
+
+        Args:
+            exc (Exception): The exception raised while handling the request.
 
         Returns:
-            Union[JSONResponse, Any]: JSONResponse in case of errors, or the result of the next handler.
+            JSONResponse: Error response with the matching status code.
 
         Handles:
             - HTTPException: Returns the appropriate HTTP error response.
             - ValidationError: Returns 400 Bad Request with validation errors.
+            - Database errors caused by the request's data: Returns 422 Unprocessable Entity
+              for invalid or unknown values, 409 Conflict for other constraint violations,
+              see app.errors.REQUEST_SQLSTATES.
+            - sqlalchemy.exc.TimeoutError: Returns 503 Service Unavailable with Retry-After
+              when no database connection could be checked out in time.
+            - OrderQueueFullError: Returns 503 Service Unavailable with Retry-After
+              when the order queue is full.
             - Exception: Returns 500 Internal Server Error for unexpected issues.
         """
-        try:
-            return await call_next(request)
-        except HTTPException as exc:
+        if isinstance(exc, HTTPException):
             logger.error(f"Http error occurred: {exc}")
             return JSONResponse(
                 status_code=exc.status_code, content={"detail": exc.detail}
             )
-        except ValidationError as exc:
+        if isinstance(exc, ValidationError):
             logger.error(f"Validation error occurred: {exc}")
             return JSONResponse(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 content={"detail": exc.errors()},
             )
-        except Exception as exc:
-            logger.error(f"Unexpected error occurred: {exc}")
+        status_code = request_error_status(exc)
+        if status_code is not None:
+            logger.error(f"Request rejected by the database: {exc}")
+            return JSONResponse(
+                status_code=status_code, content={"detail": error_message(exc)}
+            )
+        if isinstance(exc, PoolTimeoutError):
+            logger.error(f"Database pool exhausted: {exc}")
+            return JSONResponse(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                content={"detail": "Service is overloaded. Please retry later."},
+                headers={"Retry-After": str(settings.DB_RETRY_AFTER)},
+            )
+        if isinstance(exc, OrderQueueFullError):
+            logger.error(f"Order queue full: {exc}")
             return JSONResponse(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                content={
-                    "detail": "Internal server error occurred. Please try again later."
-                },
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                content={"detail": "Too many orders are waiting. Please retry later."},
+                headers={"Retry-After": str(settings.ORDER_QUEUE_RETRY_AFTER)},
             )
+        logger.error(f"Unexpected error occurred: {exc}")
+        return JSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            content={
+                "detail": "Internal server error occurred. Please try again later."
+            },
+        )
 
 
 def setup_error_middleware(app: FastAPI) -> None:
@@ -71,4 +131,4 @@ def setup_error_middleware(app: FastAPI) -> None:
     Args:
         app (FastAPI): The FastAPI application instance.
     """
-    app.middleware("http")(ErrorHandlingMiddleware(app))
+    app.add_middleware(ErrorHandlingMiddleware)
@@ -1,4 +1,6 @@
 from ..db import Base
+from .order_tickets import OrderTicket
 from .orders import Order
 from .orders_products import OrdersProducts
 from .products import Product
+from .row_counts import RowCount
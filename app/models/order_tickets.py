@@ -0,0 +1,34 @@
+import datetime
+import uuid
+
+from sqlalchemy import BigInteger, DateTime, ForeignKey, Index, Uuid, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db import Base
+
+
+class OrderTicket(Base):
+    """
+    Represents the 'order_tickets' table in the database.
+    Records which queued order, identified by its ticket, became which order.
+
+    The row is inserted in the transaction that creates the order, so a ticket
+    is present exactly when its order exists.
+
+    Attributes:
+        ticket (uuid.UUID): Ticket returned when the order was queued.
+        order_id (int): Foreign key referencing the 'orders' table.
+        created_at (datetime): Timestamp indicating when the order was written.
+    """
+
+    __tablename__ = "order_tickets"
+
+    ticket: Mapped[uuid.UUID] = mapped_column(Uuid, primary_key=True)
+    order_id: Mapped[int] = mapped_column(
+        BigInteger, ForeignKey("orders.id", ondelete="CASCADE"), nullable=False
+    )
+    created_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime, nullable=False, server_default=func.now()
+    )
+
+    __table_args__ = (Index("idx_order_tickets_order_id", "order_id"),)
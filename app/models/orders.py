@@ -1,6 +1,16 @@
 import datetime
 
-from sqlalchemy import BigInteger, DateTime, func
+from sqlalchemy import (
+    DECIMAL,
+    BigInteger,
+    Boolean,
+    DateTime,
+    Index,
+    Integer,
+    false,
+    func,
+    text,
+)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db import Base
@@ -13,6 +23,11 @@ class Order(Base):
     Attributes:
         id (int): The unique identifier for the order.
         created_at (datetime): Timestamp indicating when the order was created.
+        total_revenue (Decimal): Sum of amount * unit_price over the order's lines.
+        total_cost (Decimal): Sum of amount * unit_cost over the order's lines.
+        total_units (int): Sum of the amounts of the order's lines.
+        line_count (int): Number of lines of the order.
+        has_return (bool): Whether a line of the order has a negative amount.
         orders_products: Relationship to the OrdersProducts table (one-to-many).
     """
 
@@ -22,4 +37,24 @@ class Order(Base):
     created_at: Mapped[datetime] = mapped_column(
         DateTime, nullable=False, server_default=func.now()
     )
+    # Maintained by triggers on orders_products.
+    total_revenue: Mapped[float] = mapped_column(
+        DECIMAL(20, 2), nullable=False, server_default="0"
+    )
+    total_cost: Mapped[float] = mapped_column(
+        DECIMAL(20, 2), nullable=False, server_default="0"
+    )
+    total_units: Mapped[int] = mapped_column(
+        BigInteger, nullable=False, server_default="0"
+    )
+    line_count: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
+    has_return: Mapped[bool] = mapped_column(
+        Boolean, nullable=False, server_default=false()
+    )
     orders_products = relationship("OrdersProducts", back_populates="orders")
+
+    __table_args__ = (
+        Index("idx_orders_created_at", "created_at"),
+        # Orders with returns, by date, for the returns count of reports.
+        Index("idx_orders_returns", "created_at", postgresql_where=text("has_return")),
+    )
@@ -1,4 +1,5 @@
 from sqlalchemy import (
+    DECIMAL,
     TIMESTAMP,
     BigInteger,
     ForeignKey,
@@ -23,6 +24,8 @@ class OrdersProducts(Base):
         order_id (int): Foreign key referencing the 'orders' table.
         product_id (int): Foreign key referencing the 'products' table.
         amount (int): Quantity of the product in the order.
+        unit_price (Decimal): Price of the product when the line was created.
+        unit_cost (Decimal): Cost of the product when the line was created.
 
     Relationships:
         orders: Relationship to the 'Order' model.
@@ -42,6 +45,8 @@ class OrdersProducts(Base):
         BigInteger, ForeignKey("products.id"), nullable=False
     )
     amount: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    unit_price: Mapped[float | None] = mapped_column(DECIMAL(15, 2), nullable=True)
+    unit_cost: Mapped[float | None] = mapped_column(DECIMAL(15, 2), nullable=True)
 
     orders = relationship("Order", back_populates="orders_products")
     products = relationship("Product", back_populates="orders_products")
@@ -0,0 +1,25 @@
+from sqlalchemy import BigInteger, SmallInteger, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db import Base
+
+
+class RowCount(Base):
+    """
+    Represents the 'row_counts' table in the database.
+    Holds exact row counts of other tables, maintained by triggers on write.
+
+    Each table's count is spread over several slots so that concurrent writers
+    do not queue on a single counter row; the count of a table is the sum of its slots.
+
+    Attributes:
+        table_name (str): Name of the counted table.
+        slot (int): Counter slot, chosen from the backend PID of the writer.
+        row_count (int): Number of rows accounted to this slot.
+    """
+
+    __tablename__ = "row_counts"
+
+    table_name: Mapped[str] = mapped_column(String(63), primary_key=True)
+    slot: Mapped[int] = mapped_column(SmallInteger, primary_key=True)
+    row_count: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
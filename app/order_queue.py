@@ -0,0 +1,519 @@
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import suppress
+from dataclasses import dataclass
+from itertools import islice
+import os
+import socket
+import time
+import uuid
+
+import orjson
+from pydantic import ValidationError
+import redis
+from sqlalchemy.exc import DataError, IntegrityError
+
+from app.config import settings
+from app.crud.order import order_crud
+from app.db import get_session_maker
+from app.errors import error_message
+from app.logger import logger
+from app.schemas.order import OrderSchemaCreate
+
+# Errors that make a queued order invalid. Any other error, e.g. a lost
+# database connection, leaves the order in the queue to be written later.
+ORDER_ERRORS = (ValueError, IntegrityError, DataError)
+
+# Queue of accepted orders and its writer, created by start_order_queue.
+queue: "OrderQueue | None" = None
+writer: "OrderQueueWriter | None" = None
+
+
+class OrderQueueFullError(Exception):
+    """
+    Raised instead of queueing an order when ORDER_QUEUE_MAX_DEPTH orders already wait.
+    """
+
+
+@dataclass(frozen=True)
+class QueuedOrder:
+    """
+    Order read from the queue.
+
+    Attributes:
+        entry_id (str): Position of the order in the queue, used to acknowledge it.
+        ticket (uuid.UUID): Ticket returned when the order was queued.
+        order (dict): The order as accepted by POST /orders.
+    """
+
+    entry_id: str
+    ticket: uuid.UUID
+    order: dict
+
+
+class OrderQueue:
+    """
+    Durable queue of accepted orders, with the status of their tickets.
+
+    An order stays in the queue until it is acknowledged. 'read' returns the
+    orders delivered before but not acknowledged first, so the orders of a
+    failed batch, or of a writer that stopped, are delivered again.
+
+    A ticket status is a dictionary with "status" ("queued", "created" or
+    "failed") and, once known, "order_id" or "error".
+
+    Attributes:
+        max_depth (int): Waiting orders after which 'put' is rejected.
+        ticket_ttl (int): Seconds the status of a ticket is kept.
+    """
+
+    def __init__(self, max_depth: int, ticket_ttl: int) -> None:
+        self.max_depth = max_depth
+        self.ticket_ttl = ticket_ttl
+
+    async def put(self, order: dict) -> uuid.UUID:
+        """
+        Queues an order.
+
+        Args:
+            order (dict): The order, as accepted by POST /orders.
+
+        Returns:
+            uuid.UUID: Ticket of the order.
+
+        Raises:
+            OrderQueueFullError: If 'max_depth' orders already wait.
+        """
+        if await self.depth() >= self.max_depth:
+            raise OrderQueueFullError(
+                f"{self.max_depth} orders already wait in the queue"
+            )
+        ticket = uuid.uuid4()
+        await self.append(ticket, order)
+        return ticket
+
+    async def append(self, ticket: uuid.UUID, order: dict) -> None:
+        """
+        Adds an order to the queue and sets its ticket status to "queued".
+        """
+        raise NotImplementedError
+
+    async def read(self, count: int, timeout: float) -> list[QueuedOrder]:
+        """
+        Returns up to 'count' unacknowledged orders, waiting at most 'timeout' seconds for one.
+        """
+        raise NotImplementedError
+
+    async def ack(self, orders: list[QueuedOrder]) -> None:
+        """
+        Removes orders that were handled from the queue.
+        """
+        raise NotImplementedError
+
+    async def depth(self) -> int:
+        """
+        Returns the number of orders in the queue.
+        """
+        raise NotImplementedError
+
+    async def set_statuses(self, statuses: dict[uuid.UUID, dict]) -> None:
+        """
+        Stores the status of tickets for 'ticket_ttl' seconds.
+        """
+        raise NotImplementedError
+
+    async def get_status(self, ticket: uuid.UUID) -> dict | None:
+        """
+        Returns the status of a ticket, None if it is unknown or expired.
+        """
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        """
+        Releases the resources of the queue.
+        """
+
+
+class RedisOrderQueue(OrderQueue):
+    """
+    Order queue in a Redis stream, shared by all workers.
+
+    The writers of all workers read the stream as one consumer group, so each
+    order is delivered to one writer. Orders left unacknowledged by a writer
+    for 'claim_idle' milliseconds are claimed by another one.
+
+    Attributes:
+        client (redis.asyncio.Redis): Redis client returning bytes.
+        prefix (str): Prefix of the Redis keys.
+        consumer (str): Name of this worker's writer in the consumer group.
+    """
+
+    group = "writers"
+    claim_idle = 60_000
+
+    def __init__(
+        self, client: redis.asyncio.Redis, prefix: str, max_depth: int, ticket_ttl: int
+    ) -> None:
+        super().__init__(max_depth, ticket_ttl)
+        self.client = client
+        self.prefix = prefix
+        self.stream = f"{prefix}:orders"
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self._group_created = False
+
+    def _status_key(self, ticket: uuid.UUID) -> str:
+        return f"{self.prefix}:ticket:{ticket}"
+
+    async def append(self, ticket: uuid.UUID, order: dict) -> None:
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.set(
+                self._status_key(ticket),
+                orjson.dumps({"status": "queued"}),
+                ex=self.ticket_ttl,
+            )
+            pipe.xadd(
+                self.stream, {"ticket": str(ticket), "order": orjson.dumps(order)}
+            )
+            await pipe.execute()
+
+    async def read(self, count: int, timeout: float) -> list[QueuedOrder]:
+        if not self._group_created:
+            with suppress(redis.ResponseError):  # BUSYGROUP, created by another worker
+                await self.client.xgroup_create(
+                    self.stream, self.group, id="0", mkstream=True
+                )
+            self._group_created = True
+
+        # Orders delivered to this writer before, then orders of stopped writers, then new ones.
+        response = await self.client.xreadgroup(
+            self.group, self.consumer, {self.stream: "0"}, count=count
+        )
+        entries = response[0][1] if response else []
+        if not entries:
+            _, entries, *_ = await self.client.xautoclaim(
+                self.stream, self.group, self.consumer, self.claim_idle, count=count
+            )
+        if not entries:
+            response = await self.client.xreadgroup(
+                self.group,
+                self.consumer,
+                {self.stream: ">"},
+                count=count,
+                block=int(timeout * 1000),
+            )
+            entries = response[0][1] if response else []
+        return [
+            QueuedOrder(
+                entry_id=entry_id.decode(),
+                ticket=uuid.UUID(fields[b"ticket"].decode()),
+                order=orjson.loads(fields[b"order"]),
+            )
+            for entry_id, fields in entries
+            if fields
+        ]
+
+    async def ack(self, orders: list[QueuedOrder]) -> None:
+        entry_ids = [order.entry_id for order in orders]
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.xack(self.stream, self.group, *entry_ids)
+            pipe.xdel(self.stream, *entry_ids)
+            await pipe.execute()
+
+    async def depth(self) -> int:
+        return await self.client.xlen(self.stream)
+
+    async def set_statuses(self, statuses: dict[uuid.UUID, dict]) -> None:
+        async with self.client.pipeline(transaction=False) as pipe:
+            for ticket, status in statuses.items():
+                pipe.set(
+                    self._status_key(ticket), orjson.dumps(status), ex=self.ticket_ttl
+                )
+            await pipe.execute()
+
+    async def get_status(self, ticket: uuid.UUID) -> dict | None:
+        value = await self.client.get(self._status_key(ticket))
+        return orjson.loads(value) if value is not None else None
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+class LogOrderQueue(OrderQueue):
+    """
+    Order queue in an append-only file, a stand-in for the Redis stream on a single worker.
+
+    Each order is appended as one JSON line and synced to disk with fsync
+    before 'put' returns, so an accepted order survives a crash of the host.
+    The fsync runs in a thread and covers every order appended before it. The
+    offset up to which orders are acknowledged is kept in "<path>.offset",
+    written to a synced temporary file that replaces it, so orders not
+    acknowledged before a restart are read again; the file is emptied once all
+    its orders are acknowledged. Ticket statuses are kept in
+    memory, the least recently set dropped beyond 'max_statuses'.
+
+    Attributes:
+        path (str): Path of the log file.
+    """
+
+    max_statuses = 100_000
+
+    def __init__(self, path: str, max_depth: int, ticket_ttl: int) -> None:
+        super().__init__(max_depth, ticket_ttl)
+        self.path = path
+        self._offset_path = f"{path}.offset"
+        self._pending: deque[QueuedOrder] = deque()
+        self._statuses: OrderedDict[uuid.UUID, tuple[float, dict]] = OrderedDict()
+        self._appended = asyncio.Event()
+        self._load()
+        self._file = open(path, "ab")
+
+    def _load(self) -> None:
+        acked = 0
+        with suppress(FileNotFoundError), open(self._offset_path, "rb") as file:
+            acked = int(file.read() or 0)
+        with suppress(FileNotFoundError), open(self.path, "r+b") as file:
+            file.seek(acked)
+            offset = acked
+            for line in file:
+                if not line.endswith(b"\n"):
+                    # Torn write of a crash: the order was never acknowledged to its client.
+                    file.truncate(offset)
+                    break
+                offset += len(line)
+                entry = orjson.loads(line)
+                ticket = uuid.UUID(entry["ticket"])
+                self._pending.append(QueuedOrder(str(offset), ticket, entry["order"]))
+                self._set_status(ticket, {"status": "queued"})
+
+    def _save_offset(self, offset: int) -> None:
+        temporary_path = f"{self._offset_path}.tmp"
+        with open(temporary_path, "wb") as file:
+            file.write(str(offset).encode())
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, self._offset_path)
+        # The rename is durable once the directory entry is synced too.
+        directory = os.open(os.path.dirname(self._offset_path) or ".", os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+
+    def _set_status(self, ticket: uuid.UUID, status: dict) -> None:
+        self._statuses[ticket] = (time.monotonic() + self.ticket_ttl, status)
+        self._statuses.move_to_end(ticket)
+        while len(self._statuses) > self.max_statuses:
+            self._statuses.popitem(last=False)
+
+    async def append(self, ticket: uuid.UUID, order: dict) -> None:
+        self._file.write(orjson.dumps({"ticket": str(ticket), "order": order}) + b"\n")
+        self._file.flush()
+        # Queued in file order before the sync, which other appends may share.
+        self._pending.append(QueuedOrder(str(self._file.tell()), ticket, order))
+        self._set_status(ticket, {"status": "queued"})
+        self._appended.set()
+        await asyncio.to_thread(os.fsync, self._file.fileno())
+
+    async def read(self, count: int, timeout: float) -> list[QueuedOrder]:
+        if not self._pending:
+            self._appended.clear()
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._appended.wait(), timeout)
+        return list(islice(self._pending, count))
+
+    async def ack(self, orders: list[QueuedOrder]) -> None:
+        # Orders are handled in queue order, so they are the head of the queue.
+        entry_ids = {order.entry_id for order in orders}
+        offset = None
+        while self._pending and self._pending[0].entry_id in entry_ids:
+            offset = int(self._pending.popleft().entry_id)
+        if offset is None:
+            return
+        if self._pending:
+            await asyncio.to_thread(self._save_offset, offset)
+        else:
+            # Saved first: a crash in between redelivers acknowledged orders
+            # rather than skipping new ones.
+            await asyncio.to_thread(self._save_offset, 0)
+            if not self._pending:
+                self._file.truncate(0)
+
+    async def depth(self) -> int:
+        return len(self._pending)
+
+    async def set_statuses(self, statuses: dict[uuid.UUID, dict]) -> None:
+        for ticket, status in statuses.items():
+            self._set_status(ticket, status)
+
+    async def get_status(self, ticket: uuid.UUID) -> dict | None:
+        item = self._statuses.get(ticket)
+        if item is None or item[0] <= time.monotonic():
+            return None
+        return item[1]
+
+    async def close(self) -> None:
+        self._file.close()
+
+
+class OrderQueueWriter:
+    """
+    Background task creating queued orders in batches.
+
+    Each batch is written with create_orders_separately, which inserts the
+    ticket of every order into order_tickets in the transaction of the order.
+    Orders whose ticket is already there were written by an earlier delivery
+    that was not acknowledged and are only acknowledged now, so each queued
+    order is applied exactly once, however often it is delivered. Invalid
+    orders fail their ticket; any other error, e.g. the database being down,
+    leaves the batch in the queue and is retried after 'retry_delay' seconds.
+
+    Attributes:
+        queue (OrderQueue): Queue to drain.
+        batch_size (int): Orders read and written at a time.
+        retry_delay (float): Seconds to wait after a failed batch.
+    """
+
+    def __init__(
+        self, queue: OrderQueue, batch_size: int, retry_delay: float = 1
+    ) -> None:
+        self.queue = queue
+        self.batch_size = batch_size
+        self.retry_delay = retry_delay
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+        self._writing = False
+
+    def start(self) -> None:
+        """
+        Starts writing queued orders in the background.
+        """
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """
+        Stops the writer, letting a batch being written finish.
+        """
+        self._stopping = True
+        if self._task is None:
+            return
+        if not self._writing:
+            self._task.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._task
+
+    async def run(self) -> None:
+        """
+        Reads and writes batches of queued orders until stopped.
+        """
+        while not self._stopping:
+            try:
+                orders = await self.queue.read(self.batch_size, timeout=1)
+                if orders:
+                    self._writing = True
+                    try:
+                        await self.write(orders)
+                    finally:
+                        self._writing = False
+            except Exception as e:
+                logger.error(f"Writing queued orders failed, retrying: {e!r}")
+                await asyncio.sleep(self.retry_delay)
+
+    async def write(self, orders: list[QueuedOrder]) -> None:
+        """
+        Creates the orders of a batch that were not created yet and acknowledges the batch.
+
+        Args:
+            orders (list[QueuedOrder]): Orders read from the queue.
+        """
+        created = await self.created_orders([order.ticket for order in orders])
+        failed: dict[uuid.UUID, str] = {}
+        new_orders, create_objs = [], []
+        for order in orders:
+            if order.ticket in created:
+                continue
+            try:
+                create_objs.append(OrderSchemaCreate.model_validate(order.order))
+            except ValidationError as e:
+                failed[order.ticket] = str(e)
+                continue
+            new_orders.append(order)
+
+        if new_orders:
+            results = await order_crud.create_orders_separately(
+                create_objs, [order.ticket for order in new_orders], ORDER_ERRORS
+            )
+            for order, result in zip(new_orders, results):
+                if isinstance(result, Exception):
+                    failed[order.ticket] = error_message(result)
+                else:
+                    created[order.ticket] = result
+            if failed:
+                # A writer that claimed the same orders may have created them meanwhile.
+                created.update(await self.created_orders(list(failed)))
+
+        statuses = {
+            ticket: {"status": "failed", "error": error}
+            for ticket, error in failed.items()
+            if ticket not in created
+        }
+        for ticket, order_id in created.items():
+            statuses[ticket] = {"status": "created", "order_id": order_id}
+        await self.queue.set_statuses(statuses)
+        await self.queue.ack(orders)
+
+    @staticmethod
+    async def created_orders(tickets: list[uuid.UUID]) -> dict[uuid.UUID, int]:
+        """
+        Returns the orders already created for tickets.
+
+        Args:
+            tickets (list[uuid.UUID]): Tickets to look up.
+
+        Returns:
+            dict[uuid.UUID, int]: Order ID per ticket whose order exists.
+        """
+        async with get_session_maker()() as session:
+            return await order_crud.get_ticket_orders(session, tickets)
+
+
+def create_order_queue() -> OrderQueue:
+    """
+    Creates the order queue selected by ORDER_QUEUE_BACKEND.
+
+    Returns:
+        OrderQueue: The new queue.
+    """
+    if settings.ORDER_QUEUE_BACKEND == "log":
+        return LogOrderQueue(
+            settings.ORDER_QUEUE_LOG_PATH,
+            max_depth=settings.ORDER_QUEUE_MAX_DEPTH,
+            ticket_ttl=settings.ORDER_TICKET_TTL,
+        )
+    return RedisOrderQueue(
+        redis.asyncio.from_url(settings.REDIS_URL),
+        prefix="order-queue",
+        max_depth=settings.ORDER_QUEUE_MAX_DEPTH,
+        ticket_ttl=settings.ORDER_TICKET_TTL,
+    )
+
+
+async def start_order_queue() -> None:
+    """
+    Creates the order queue and starts its writer.
+    """
+    global queue, writer
+    queue = create_order_queue()
+    writer = OrderQueueWriter(queue, settings.ORDER_QUEUE_BATCH_SIZE)
+    writer.start()
+
+
+async def stop_order_queue() -> None:
+    """
+    Stops the writer and closes the order queue, if they were started.
+    """
+    global queue, writer
+    if writer is not None:
+        await writer.stop()
+    if queue is not None:
+        await queue.close()
+    queue = writer = None
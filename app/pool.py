@@ -0,0 +1,150 @@
+from dataclasses import dataclass
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.config import settings
+
+
+class PoolBackpressureError(exc.TimeoutError):
+    """
+    Raised instead of queueing for a connection when too many requests already wait.
+    """
+
+
+@dataclass
+class PoolStats:
+    """
+    Checkout statistics of a connection pool.
+
+    Attributes:
+        checkouts (int): Number of connection checkouts.
+        waits (int): Number of checkouts that had to wait for a free connection.
+        wait_seconds_total (float): Total time spent waiting for connections.
+        wait_seconds_max (float): Longest time spent waiting for a connection.
+        timeouts (int): Number of checkouts that gave up after the pool timeout.
+        rejected (int): Number of checkouts rejected because of too many waiters.
+    """
+
+    checkouts: int = 0
+    waits: int = 0
+    wait_seconds_total: float = 0.0
+    wait_seconds_max: float = 0.0
+    timeouts: int = 0
+    rejected: int = 0
+
+
+class GovernedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Connection pool that measures checkout waits and sheds load when saturated.
+
+    A checkout that finds the pool exhausted waits at most the pool timeout and
+    fails with sqlalchemy.exc.TimeoutError afterwards; when DB_POOL_MAX_WAITERS
+    checkouts are already waiting, it fails right away with PoolBackpressureError.
+    Both are answered with 503 and Retry-After by the error middleware, so requests
+    only queue while they can still be served in useful time.
+
+    Attributes:
+        stats (PoolStats): Checkout statistics.
+        waiting (int): Number of checkouts currently waiting for a connection.
+        max_waiters (int | None): Waiting checkouts allowed before new ones are rejected.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+        self.waiting = 0
+        self.max_waiters = settings.DB_POOL_MAX_WAITERS
+
+    def _do_get(self):
+        # Same condition under which QueuePool blocks on its queue instead of connecting.
+        overflow_exhausted = -1 < self._max_overflow <= self._overflow
+        saturated = self._pool.qsize() == 0 and overflow_exhausted
+        if saturated and self.max_waiters is not None:
+            if self.waiting >= self.max_waiters:
+                self.stats.rejected += 1
+                raise PoolBackpressureError(
+                    f"{self.waiting} requests already wait for a database connection"
+                )
+
+        started = time.perf_counter()
+        self.waiting += saturated
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.timeouts += 1
+            raise
+        finally:
+            self.waiting -= saturated
+            waited = time.perf_counter() - started if saturated else 0.0
+            self.stats.waits += saturated
+            self.stats.wait_seconds_total += waited
+            self.stats.wait_seconds_max = max(self.stats.wait_seconds_max, waited)
+        self.stats.checkouts += 1
+        return record
+
+    def recreate(self) -> "GovernedQueuePool":
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def gauges(self) -> dict:
+        """
+        Returns the current pool gauges together with the checkout statistics.
+
+        Returns:
+            dict: Pool size, connections in use, overflow, waiters and checkout statistics.
+        """
+        return {
+            "pool_size": self.size(),
+            "max_overflow": max(self._max_overflow, 0),
+            "checked_out": self.checkedout(),
+            "overflow": max(self.overflow(), 0),
+            "waiting": self.waiting,
+            "checkouts": self.stats.checkouts,
+            "waits": self.stats.waits,
+            "wait_ms_avg": (
+                self.stats.wait_seconds_total / self.stats.waits * 1000
+                if self.stats.waits
+                else 0.0
+            ),
+            "wait_ms_max": self.stats.wait_seconds_max * 1000,
+            "timeouts": self.stats.timeouts,
+            "rejected": self.stats.rejected,
+        }
+
+
+def pool_limits(workload: str, read_only: bool = False) -> tuple[int, int]:
+    """
+    Returns the pool size and overflow of an engine in this worker.
+
+    Without DB_CONNECTION_BUDGET the configured sizes of the workload class are
+    used. With it, the budget is divided by the number of workers and shared by
+    the engines that connect to the same server, in proportion to their
+    configured size plus overflow.
+
+    Args:
+        workload (str): Name of the workload class.
+        read_only (bool): Whether the engine is the read-only engine of the class.
+
+    Returns:
+        tuple[int, int]: Pool size and max overflow.
+    """
+    options = settings.WORKLOADS[workload]
+    pool_size, max_overflow = options["pool_size"], options["max_overflow"]
+    if settings.DB_CONNECTION_BUDGET is None:
+        return pool_size, max_overflow
+
+    # Read-only engines only share the server with the write engines when there is no replica.
+    roles = (False, True) if not settings.DB_REPLICA_HOST else (read_only,)
+    weights = [
+        other["pool_size"] + other["max_overflow"]
+        for other in settings.WORKLOADS.values()
+        for _ in roles
+    ]
+    worker_budget = settings.DB_CONNECTION_BUDGET // max(settings.WEB_CONCURRENCY, 1)
+    share = worker_budget * (pool_size + max_overflow) // max(sum(weights), 1)
+
+    limited_size = max(1, share * pool_size // max(pool_size + max_overflow, 1))
+    return limited_size, max(0, share - limited_size)
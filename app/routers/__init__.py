@@ -2,3 +2,4 @@ from .order import order_router
 from .order_product import order_product_router
 from .product import product_router
 from .report import report_router
+from .system import system_router
@@ -1,11 +1,162 @@
-from typing import TypeVar
+import asyncio
+from typing import Any, Callable, Coroutine, TypeVar
+
+from fastapi import APIRouter, HTTPException, Request, status
+from fastapi.dependencies.utils import get_typed_return_annotation
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+from starlette.responses import JSONResponse, Response
+
+from app import importing
+from app.crud.base import CrudBase, TotalSource
+from app.db import DEFAULT_WORKLOAD
+from app.logger import logger
+from app.schemas.base import (
+    BaseCursorPaginatedResponse,
+    BasePaginatedResponse,
+    ImportReportSchema,
+)
+
+from .responses import (
+    JSONBytesResponse,
+    cache_responses,
+    idempotent_responses,
+    serialize_responses,
+)
 
-from fastapi import APIRouter, Request
-from starlette.responses import JSONResponse
+T = TypeVar("T")
 
-from app.crud.base import CrudBase
 
-T = TypeVar("T")
+class BaseRoute(APIRoute):
+    """
+    API route carrying the options its router declared for it.
+
+    The matched route is available to middlewares as scope["route"]. FastAPI
+    re-creates routes when a router is included and only keeps their class, so
+    the options of a route live on a subclass made by 'with_options'.
+
+    Routes with a deadline are cancelled, together with their running query,
+    once the deadline passes (504) or the client disconnects (499); the
+    deadline also limits every statement of the request's session.
+
+    Routes with a streamed body (streaming_body) read it in the handler as it
+    arrives. A deadline leaves such a body unread and does not watch for the
+    disconnect, which the handler's stream reports as ClientDisconnect.
+
+    Routes with a cache TTL serve repeated GET requests from the response
+    cache, see cache_responses.
+
+    Idempotent routes run requests repeating an Idempotency-Key header only
+    once and replay the first response, see idempotent_responses.
+
+    Attributes:
+        workload (str): Workload class whose connection pool serves the route.
+        deadline (float | None): Seconds the route may run, None for no limit.
+        cache_ttl (float | None): Seconds successful GET responses are cached, None for no caching.
+        idempotent (bool): Whether the route honours the Idempotency-Key header.
+        streaming_body (bool): Whether the handler streams the request body instead of reading it whole.
+    """
+
+    workload: str = DEFAULT_WORKLOAD
+    deadline: float | None = None
+    cache_ttl: float | None = None
+    idempotent: bool = False
+    streaming_body: bool = False
+
+    @classmethod
+    def with_options(cls, **options) -> type["BaseRoute"]:
+        """
+        Creates a route class with the given options.
+
+        Args:
+            **options: Route options overriding the class attributes.
+
+        Returns:
+            type[BaseRoute]: Route class to pass as 'route_class_override'.
+        """
+        return type(cls.__name__, (cls,), options)
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        handler = super().get_route_handler()
+        if self.deadline is not None:
+            route_handler = handler
+
+            async def handler(request: Request) -> Response:
+                return await self.run_with_deadline(route_handler, request)
+
+        if self.idempotent:
+            handler = idempotent_responses(handler)
+        if self.cache_ttl is not None:
+            handler = cache_responses(handler, self.cache_ttl)
+        return handler
+
+    async def run_with_deadline(
+        self,
+        handler: Callable[[Request], Coroutine[Any, Any, Response]],
+        request: Request,
+    ) -> Response:
+        """
+        Runs the route handler until it finishes, the deadline passes or the client disconnects.
+
+        Cancelling the handler cancels the query it is awaiting: asyncpg sends a
+        cancel request to Postgres, so the server stops working on it too. The
+        request's transaction is rolled back before the error response is sent.
+
+        Args:
+            handler (Callable): The route handler.
+            request (Request): HTTP request object.
+
+        Returns:
+            Response: Response of the handler, or 499 when the client disconnected.
+
+        Raises:
+            HTTPException: 504 if the deadline passed.
+        """
+        if self.streaming_body:
+            # The handler receives the body as it arrives, a watcher would take its chunks.
+            disconnect_task = asyncio.ensure_future(asyncio.Event().wait())
+        else:
+            # Read the body first, afterwards the only message left to receive is the disconnect.
+            await request.body()
+            disconnect_task = asyncio.ensure_future(self.wait_for_disconnect(request))
+        handler_task = asyncio.ensure_future(handler(request))
+        try:
+            done, _ = await asyncio.wait(
+                {handler_task, disconnect_task},
+                timeout=self.deadline,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+        finally:
+            for task in (handler_task, disconnect_task):
+                task.cancel()
+            await asyncio.gather(handler_task, disconnect_task, return_exceptions=True)
+
+        if handler_task in done:
+            return handler_task.result()
+
+        session = getattr(request.state, "session", None)
+        if session is not None:
+            await session.rollback()
+        if disconnect_task in done:
+            logger.info(f"Client disconnected, cancelled {request.url.path}")
+            # Non-standard "Client Closed Request" status, nobody receives it.
+            return Response(status_code=499)
+        logger.error(f"Deadline of {self.deadline}s exceeded: {request.url.path}")
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Request deadline exceeded",
+        )
+
+    @staticmethod
+    async def wait_for_disconnect(request: Request) -> None:
+        """
+        Returns once the client has disconnected.
+
+        Args:
+            request (Request): HTTP request object whose body was already read.
+        """
+        while (await request.receive())["type"] != "http.disconnect":
+            pass
 
 
 class BaseRouter:
@@ -16,8 +167,15 @@ class BaseRouter:
         model_crud (CrudBase | None): CRUD operations handler.
         prefix (str): URL prefix for the router.
         router (APIRouter): FastAPI router instance.
+        workload (str): Default workload class of the router's routes.
+        deadline (float | None): Default deadline of the router's routes, in seconds.
+        cache_ttl (float | None): Default response cache TTL of the router's routes, in seconds.
     """
 
+    workload: str = DEFAULT_WORKLOAD
+    deadline: float | None = None
+    cache_ttl: float | None = None
+
     def __init__(self, model_crud: CrudBase | None, prefix: str) -> None:
         """
         Initializes the base router with a CRUD instance and a route prefix.
@@ -26,7 +184,7 @@ class BaseRouter:
             model_crud (CrudBase | None): CRUD operations handler.
             prefix (str): URL prefix for the router.
         """
-        self.router = APIRouter()
+        self.router = APIRouter(route_class=BaseRoute)
         self.model_crud = model_crud
         self.prefix = prefix
         self.setup_routes()
@@ -38,35 +196,104 @@ class BaseRouter:
         """
         raise NotImplementedError
 
+    def add_api_route(
+        self,
+        path: str,
+        endpoint: Callable,
+        *,
+        workload: str | None = None,
+        deadline: float | None = None,
+        cache_ttl: float | None = None,
+        idempotent: bool = False,
+        streaming_body: bool = False,
+        **kwargs,
+    ) -> None:
+        """
+        Registers a route on the router together with its route options.
+
+        Unless the endpoint is annotated to return a Response, its result is
+        serialized straight to JSON bytes according to its return annotation,
+        see serialize_responses.
+
+        Args:
+            path (str): URL path of the route.
+            endpoint (Callable): Route handler.
+            workload (str | None): Workload class of the route, defaults to the router's one.
+            deadline (float | None): Seconds the route may run, defaults to the router's deadline.
+            cache_ttl (float | None): Seconds GET responses are cached, defaults to the router's cache TTL.
+            idempotent (bool): Whether the route honours the Idempotency-Key header.
+            streaming_body (bool): Whether the handler streams the request body instead of reading it whole.
+            **kwargs: Other arguments of APIRouter.add_api_route.
+        """
+        route_class = BaseRoute.with_options(
+            workload=workload or self.workload,
+            deadline=deadline if deadline is not None else self.deadline,
+            cache_ttl=cache_ttl if cache_ttl is not None else self.cache_ttl,
+            idempotent=idempotent,
+            streaming_body=streaming_body,
+        )
+        annotation = get_typed_return_annotation(endpoint)
+        if not (isinstance(annotation, type) and issubclass(annotation, Response)):
+            endpoint = serialize_responses(
+                endpoint, annotation, kwargs.get("status_code") or status.HTTP_200_OK
+            )
+            kwargs.setdefault("response_class", JSONBytesResponse)
+        self.router.add_api_route(
+            path, endpoint, route_class_override=route_class, **kwargs
+        )
+
     async def get_paginated(
-        self, request: Request, page: int = 1, page_size: int = 2
-    ) -> list[T]:
+        self,
+        request: Request,
+        page: int = 1,
+        page_size: int = 2,
+        after_id: int | None = None,
+        before_id: int | None = None,
+        total_source: TotalSource = "estimate",
+    ) -> BasePaginatedResponse[T] | BaseCursorPaginatedResponse[T]:
         """
-        Retrieves a paginated list of items.
+        Retrieves a paginated list of items together with the total number of items.
+
+        Passing 'after_id' (use 0 for the first page) or 'before_id' switches to
+        keyset pagination and returns the items together with the page cursors.
 
         Args:
             request (Request): HTTP request object.
             page (int): Page number.
             page_size (int): Number of items per page.
+            after_id (int | None): Cursor of the page to continue after.
+            before_id (int | None): Cursor of the page to continue before.
+            total_source (TotalSource): Source of the total number of items.
 
         Returns:
-            list[T]: List of retrieved items.
+            BasePaginatedResponse[T] | BaseCursorPaginatedResponse[T]: Page of retrieved items, or a cursor page.
         """
+        route = request.scope["route"]
         return await self.model_crud.get_paginated(
-            request.state.session, page, page_size
+            request.state.session,
+            page,
+            page_size,
+            after_id,
+            before_id,
+            total_source,
+            route.workload,
+            route.deadline,
         )
 
-    async def get_count(self, request: Request) -> int:
+    async def get_count(
+        self, request: Request, total_source: TotalSource = "count"
+    ) -> int:
         """
         Returns the total number of records.
 
         Args:
             request (Request): HTTP request object.
+            total_source (TotalSource): Source of the count.
 
         Returns:
             int: Number of records.
         """
-        return await self.model_crud.get_count(request.state.session)
+        return await self.model_crud.get_count(request.state.session, total_source)
 
     async def get_by_id(self, request: Request, id: int) -> T:
         """
@@ -154,4 +381,24 @@ class BaseRouter:
         Returns:
             list[int]: IDs of successfully deleted items.
         """
-        return await self.model_crud.batch_delete(request.state.session, ids)
+        return await self.model_crud.batch_delete(
+            request.state.session, ids, request.scope["route"].deadline
+        )
+
+    async def import_rows(
+        self, request: Request, schema: type[BaseModel], staging: bool = False
+    ) -> ImportReportSchema:
+        """
+        Imports the rows of a streamed CSV or NDJSON body, see importing.import_rows.
+
+        Args:
+            request (Request): HTTP request object.
+            schema (type[BaseModel]): Schema validating a row.
+            staging (bool): Whether to write through a staging table, rejecting only invalid rows.
+
+        Returns:
+            ImportReportSchema: Report of the import.
+        """
+        return await importing.import_rows(
+            self.model_crud, schema, request, request.scope["route"].workload, staging
+        )
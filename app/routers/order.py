@@ -1,9 +1,23 @@
-from fastapi import Request
+from typing import Union
+import uuid
 
+from fastapi import HTTPException, Request, status
+from starlette.responses import JSONResponse, Response
+
+from app import order_queue
+from app.config import settings
 from app.crud import order_crud
-from app.schemas.order import OrderReturnSchema, OrderSchema, OrderSchemaCreate
+from app.crud.base import TotalSource
+from app.crud.order import order_batcher
+from app.schemas.base import BaseCursorPaginatedResponse, BasePaginatedResponse
+from app.schemas.order import (
+    OrderReturnSchema,
+    OrderSchemaCreate,
+    OrderTicketSchema,
+)
 
 from .base import BaseRouter
+from .responses import JSONBytesResponse
 
 
 class OrderRouter(BaseRouter):
@@ -26,37 +40,68 @@ class OrderRouter(BaseRouter):
         """
         Sets up API routes specific to orders.
         """
-        self.router.add_api_route(
+        self.add_api_route(
             f"{self.prefix}-list", self.get_paginated, methods=["GET"], status_code=200
         )
-        self.router.add_api_route(
+        self.add_api_route(
             f"{self.prefix}-count", self.get_count, methods=["GET"], status_code=200
         )
-        self.router.add_api_route(
+        self.add_api_route(
             f"{self.prefix}/{{id}}", self.get_by_id, methods=["GET"], status_code=200
         )
-        self.router.add_api_route(
-            f"{self.prefix}", self.create, methods=["POST"], status_code=201
+        self.add_api_route(
+            f"{self.prefix}",
+            self.create,
+            methods=["POST"],
+            status_code=201,
+            idempotent=True,
+            responses={
+                202: {
+                    "model": OrderTicketSchema,
+                    "description": 'Order queued, with "Prefer: respond-async" and ORDER_QUEUE',
+                }
+            },
+        )
+        self.add_api_route(
+            f"{self.prefix}-tickets/{{ticket}}",
+            self.get_ticket,
+            methods=["GET"],
+            status_code=200,
         )
-        self.router.add_api_route(
+        self.add_api_route(
             f"{self.prefix}/{{id}}", self.delete, methods=["DELETE"], status_code=202
         )
-        self.router.add_api_route(
+        self.add_api_route(
             f"{self.prefix}/{{id}}", self.update, methods=["PUT"], status_code=200
         )
-        self.router.add_api_route(
-            f"{self.prefix}-batch", self.batch_create, methods=["POST"], status_code=201
+        self.add_api_route(
+            f"{self.prefix}-batch",
+            self.batch_create,
+            methods=["POST"],
+            status_code=201,
+            idempotent=True,
         )
-        self.router.add_api_route(
+        self.add_api_route(
             f"{self.prefix}-batch",
             self.batch_delete,
             methods=["DELETE"],
             status_code=202,
+            deadline=30,
+            idempotent=True,
         )
 
     async def get_paginated(
-        self, request: Request, page: int = 1, page_size: int = 2
-    ) -> list[OrderReturnSchema]:
+        self,
+        request: Request,
+        page: int = 1,
+        page_size: int = 2,
+        after_id: int | None = None,
+        before_id: int | None = None,
+        total_source: TotalSource = "estimate",
+    ) -> Union[
+        BasePaginatedResponse[OrderReturnSchema],
+        BaseCursorPaginatedResponse[OrderReturnSchema],
+    ]:
         """
         Retrieves paginated list of orders.
 
@@ -64,23 +109,32 @@ class OrderRouter(BaseRouter):
             request (Request): HTTP request object.
             page (int): Page number.
             page_size (int): Number of orders per page.
+            after_id (int | None): Cursor of the page to continue after.
+            before_id (int | None): Cursor of the page to continue before.
+            total_source (TotalSource): Source of the total number of items.
 
         Returns:
-            list[OrderReturnSchema]: List of paginated orders.
+            BasePaginatedResponse[OrderReturnSchema] | BaseCursorPaginatedResponse[OrderReturnSchema]:
+                Page of paginated orders, or a cursor page.
         """
-        return await super().get_paginated(request, page, page_size)
+        return await super().get_paginated(
+            request, page, page_size, after_id, before_id, total_source
+        )
 
-    async def get_count(self, request: Request) -> int:
+    async def get_count(
+        self, request: Request, total_source: TotalSource = "count"
+    ) -> int:
         """
         Retrieves the total count of orders.
 
         Args:
             request (Request): HTTP request object.
+            total_source (TotalSource): Source of the count.
 
         Returns:
             int: Number of orders.
         """
-        return await super().get_count(request)
+        return await super().get_count(request, total_source)
 
     async def get_by_id(self, request: Request, id: int) -> dict:
         """
@@ -99,6 +153,21 @@ class OrderRouter(BaseRouter):
         """
         Creates a new order with products.
 
+        With ORDER_BATCHING, the order is written together with the orders of
+        concurrent requests, in a transaction of its own committed before
+        the response is sent. Batched or not, the route has no deadline and
+        its commit outlives a client that gives up on the response; such a
+        client retries safely with an Idempotency-Key.
+
+        With ORDER_QUEUE, a request sent with "Prefer: respond-async" only puts
+        the order into the order queue and is answered with 202 and a ticket,
+        whose status is at "{prefix}-tickets/{ticket}"; the queue's writer
+        creates the order in the background.
+
+        A request repeating the Idempotency-Key header of an earlier one gets
+        that request's response, order ID or error, without creating the order
+        again, see idempotent_responses.
+
         Args:
             request (Request): HTTP request object.
             create_obj (OrderSchemaCreate): Data for creating a new order.
@@ -106,11 +175,73 @@ class OrderRouter(BaseRouter):
         Returns:
             int: ID of the newly created order.
         """
+        if settings.ORDER_QUEUE and "respond-async" in request.headers.get(
+            "prefer", ""
+        ):
+            return await self.enqueue(create_obj)
+        if settings.ORDER_BATCHING:
+            return await order_batcher.submit(create_obj)
         return await self.model_crud.create_order(request.state.session, create_obj)
 
+    async def enqueue(self, create_obj: OrderSchemaCreate) -> Response:
+        """
+        Puts an order into the order queue.
+
+        Args:
+            create_obj (OrderSchemaCreate): Data for creating a new order.
+
+        Returns:
+            Response: 202 with the ticket of the order.
+        """
+        ticket = await order_queue.queue.put(create_obj.model_dump())
+        body = OrderTicketSchema(ticket=ticket, status="queued")
+        return JSONBytesResponse(
+            body.model_dump_json(exclude_none=True).encode(),
+            status_code=status.HTTP_202_ACCEPTED,
+            headers={
+                "Location": f"{self.prefix}-tickets/{ticket}",
+                "Preference-Applied": "respond-async",
+            },
+        )
+
+    async def get_ticket(
+        self, request: Request, ticket: uuid.UUID
+    ) -> OrderTicketSchema:
+        """
+        Retrieves the status of an order queued by POST with "Prefer: respond-async".
+
+        The status is kept by the order queue for ORDER_TICKET_TTL seconds;
+        afterwards created orders are still found through their ticket in the
+        database.
+
+        Args:
+            request (Request): HTTP request object.
+            ticket (uuid.UUID): Ticket returned when the order was queued.
+
+        Returns:
+            OrderTicketSchema: Status of the ticket.
+
+        Raises:
+            HTTPException: 404 if the ticket is unknown.
+        """
+        if order_queue.queue is not None:
+            ticket_status = await order_queue.queue.get_status(ticket)
+            if ticket_status is not None:
+                return OrderTicketSchema(ticket=ticket, **ticket_status)
+        created = await self.model_crud.get_ticket_orders(
+            request.state.session, [ticket]
+        )
+        if ticket not in created:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Ticket not found."
+            )
+        return OrderTicketSchema(
+            ticket=ticket, status="created", order_id=created[ticket]
+        )
+
     async def delete(self, request: Request, id: int) -> int:
         """
-        Deletes an order by its ID.
+        Deletes an order, and its products, by its ID.
 
         Args:
             request (Request): HTTP request object.
@@ -119,42 +250,51 @@ class OrderRouter(BaseRouter):
         Returns:
             int: ID of the deleted order.
         """
-        return await self.model_crud.delete(request.state.session, id)
+        item = await self.model_crud.delete(request.state.session, id)
+        if item is None:
+            return JSONResponse(status_code=404, content="Item not found")
+        return item.id
 
     async def update(
-        self, request: Request, id: int, update_obj: OrderSchema
-    ) -> OrderSchema:
+        self, request: Request, id: int, update_obj: OrderSchemaCreate
+    ) -> dict:
         """
-        Updates an existing order.
+        Replaces the products of an existing order.
+
+        The requested lines are diffed against the current ones in the
+        database, and the differences applied with one statement.
 
         Args:
             request (Request): HTTP request object.
             id (int): ID of the order.
-            update_obj (OrderSchema): Data to update the order.
+            update_obj (OrderSchemaCreate): Products and amounts the order should have.
 
         Returns:
-            OrderSchema: Updated order data.
+            dict: Order details with its new products.
         """
         return await super().update(request, id, update_obj)
 
     async def batch_create(
         self, request: Request, create_objs: list[OrderSchemaCreate]
-    ) -> list[OrderSchema]:
+    ) -> list[int]:
         """
-        Creates multiple orders in a batch.
+        Creates multiple orders with their products in one transaction.
 
         Args:
             request (Request): HTTP request object.
             create_objs (list[OrderSchemaCreate]): List of orders to create.
 
         Returns:
-            list[OrderSchema]: List of created orders.
+            list[int]: IDs of the created orders, in the order of 'create_objs'.
         """
-        return await super().batch_create(request, create_objs)
+        return await self.model_crud.create_orders(request.state.session, create_objs)
 
     async def batch_delete(self, request: Request, ids: list[int]) -> list[int]:
         """
-        Deletes multiple orders in a batch.
+        Deletes multiple orders, and their products, in a batch.
+
+        Orders are deleted in chunks of settings.BATCH_DELETE_CHUNK_SIZE, each
+        committed on its own when there is more than one.
 
         Args:
             request (Request): HTTP request object.
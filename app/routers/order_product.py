@@ -1,7 +1,20 @@
+from typing import Union
+
 from fastapi import Request
 
 from app.crud import orders_products_crud
-from app.schemas.order_product import OrderProductsSchema, OrderProductsSchemaCreate
+from app.crud.base import TotalSource
+from app.importing import IMPORT_REQUEST_BODY
+from app.schemas.base import (
+    BaseCursorPaginatedResponse,
+    BasePaginatedResponse,
+    ImportReportSchema,
+)
+from app.schemas.order_product import (
+    OrderProductsSchema,
+    OrderProductsSchemaCreate,
+    OrderProductsSchemaUpdate,
+)
 
 from .base import BaseRouter
 
@@ -26,34 +39,61 @@ class OrderProductRouter(BaseRouter):
         """
         Sets up API routes specific to order-product operations.
         """
-        self.router.add_api_route(
+        self.add_api_route(
+            f"{self.prefix}-list", self.get_paginated, methods=["GET"], status_code=200
+        )
+        self.add_api_route(
             f"{self.prefix}-count", self.get_count, methods=["GET"], status_code=200
         )
-        self.router.add_api_route(
+        self.add_api_route(
             f"{self.prefix}-{{id}}", self.get_by_id, methods=["GET"], status_code=200
         )
-        self.router.add_api_route(
+        self.add_api_route(
             f"{self.prefix}", self.create, methods=["POST"], status_code=201
         )
-        self.router.add_api_route(
+        self.add_api_route(
             f"{self.prefix}/{{id}}", self.delete, methods=["DELETE"], status_code=202
         )
-        self.router.add_api_route(
+        self.add_api_route(
             f"{self.prefix}/{{id}}", self.update, methods=["PUT"], status_code=200
         )
-        self.router.add_api_route(
-            f"{self.prefix}-batch", self.batch_create, methods=["POST"], status_code=201
+        self.add_api_route(
+            f"{self.prefix}-batch",
+            self.batch_create,
+            methods=["POST"],
+            status_code=201,
+            idempotent=True,
         )
-        self.router.add_api_route(
+        self.add_api_route(
             f"{self.prefix}-batch",
             self.batch_delete,
             methods=["DELETE"],
             status_code=202,
+            deadline=30,
+            idempotent=True,
+        )
+        self.add_api_route(
+            f"{self.prefix}-import",
+            self.import_rows,
+            methods=["POST"],
+            status_code=200,
+            workload="analytics",
+            streaming_body=True,
+            openapi_extra=IMPORT_REQUEST_BODY,
         )
 
     async def get_paginated(
-        self, request: Request, page: int = 1, page_size: int = 2
-    ) -> list[OrderProductsSchema]:
+        self,
+        request: Request,
+        page: int = 1,
+        page_size: int = 2,
+        after_id: int | None = None,
+        before_id: int | None = None,
+        total_source: TotalSource = "estimate",
+    ) -> Union[
+        BasePaginatedResponse[OrderProductsSchema],
+        BaseCursorPaginatedResponse[OrderProductsSchema],
+    ]:
         """
         Retrieves a paginated list of order-product records.
 
@@ -61,23 +101,32 @@ class OrderProductRouter(BaseRouter):
             request (Request): HTTP request object.
             page (int): Page number.
             page_size (int): Number of items per page.
+            after_id (int | None): Cursor of the page to continue after.
+            before_id (int | None): Cursor of the page to continue before.
+            total_source (TotalSource): Source of the total number of items.
 
         Returns:
-            list[OrderProductsSchema]: List of paginated order-product records.
+            BasePaginatedResponse[OrderProductsSchema] | BaseCursorPaginatedResponse[OrderProductsSchema]:
+                Page of paginated order-product records, or a cursor page.
         """
-        return await super().get_paginated(request, page, page_size)
+        return await super().get_paginated(
+            request, page, page_size, after_id, before_id, total_source
+        )
 
-    async def get_count(self, request: Request) -> int:
+    async def get_count(
+        self, request: Request, total_source: TotalSource = "count"
+    ) -> int:
         """
         Retrieves the total count of order-product records.
 
         Args:
             request (Request): HTTP request object.
+            total_source (TotalSource): Source of the count.
 
         Returns:
             int: Number of order-product records.
         """
-        return await super().get_count(request)
+        return await super().get_count(request, total_source)
 
     async def get_by_id(self, request: Request, id: int) -> OrderProductsSchema:
         """
@@ -121,7 +170,7 @@ class OrderProductRouter(BaseRouter):
         return await self.model_crud.delete(request.state.session, id)
 
     async def update(
-        self, request: Request, id: int, update_obj: OrderProductsSchema
+        self, request: Request, id: int, update_obj: OrderProductsSchemaUpdate
     ) -> OrderProductsSchema:
         """
         Updates an existing order-product record.
@@ -129,7 +178,7 @@ class OrderProductRouter(BaseRouter):
         Args:
             request (Request): HTTP request object.
             id (int): ID of the order-product record.
-            update_obj (OrderProductsSchema): Data to update the order-product record.
+            update_obj (OrderProductsSchemaUpdate): Data to update the order-product record.
 
         Returns:
             OrderProductsSchema: Updated order-product record.
@@ -164,6 +213,21 @@ class OrderProductRouter(BaseRouter):
         """
         return await super().batch_delete(request, ids)
 
+    async def import_rows(
+        self, request: Request, staging: bool = False
+    ) -> ImportReportSchema:
+        """
+        Imports order-product records from a streamed CSV or NDJSON body, written with COPY.
+
+        Args:
+            request (Request): HTTP request object.
+            staging (bool): Whether to write through a staging table, rejecting only invalid rows.
+
+        Returns:
+            ImportReportSchema: Report of the import.
+        """
+        return await super().import_rows(request, OrderProductsSchemaCreate, staging)
+
 
 order_product_router = OrderProductRouter(
     orders_products_crud, "/orders_products"
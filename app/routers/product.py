@@ -1,8 +1,15 @@
-from typing import List
+from typing import List, Union
 
 from fastapi import Request
 
 from app.crud import product_crud
+from app.crud.base import TotalSource
+from app.importing import IMPORT_REQUEST_BODY
+from app.schemas.base import (
+    BaseCursorPaginatedResponse,
+    BasePaginatedResponse,
+    ImportReportSchema,
+)
 from app.schemas.product import ProductSchema, ProductSchemaCreate
 
 from .base import BaseRouter
@@ -28,37 +35,60 @@ class ProductRouter(BaseRouter):
         """
         Sets up API routes specific to product operations.
         """
-        self.router.add_api_route(
+        self.add_api_route(
             f"{self.prefix}", self.get_paginated, methods=["GET"], status_code=200
         )
-        self.router.add_api_route(
+        self.add_api_route(
             f"{self.prefix}-count", self.get_count, methods=["GET"], status_code=200
         )
-        self.router.add_api_route(
+        self.add_api_route(
             f"{self.prefix}/{{id}}", self.get_by_id, methods=["GET"], status_code=200
         )
-        self.router.add_api_route(
+        self.add_api_route(
             f"{self.prefix}", self.create, methods=["POST"], status_code=201
         )
-        self.router.add_api_route(
+        self.add_api_route(
             f"{self.prefix}/{{id}}", self.delete, methods=["DELETE"], status_code=202
         )
-        self.router.add_api_route(
+        self.add_api_route(
             f"{self.prefix}/{{id}}", self.update, methods=["PUT"], status_code=200
         )
-        self.router.add_api_route(
-            f"{self.prefix}-batch", self.batch_create, methods=["POST"], status_code=201
+        self.add_api_route(
+            f"{self.prefix}-batch",
+            self.batch_create,
+            methods=["POST"],
+            status_code=201,
+            idempotent=True,
         )
-        self.router.add_api_route(
+        self.add_api_route(
             f"{self.prefix}-batch",
             self.batch_delete,
             methods=["DELETE"],
             status_code=202,
+            deadline=30,
+            idempotent=True,
+        )
+        self.add_api_route(
+            f"{self.prefix}-import",
+            self.import_rows,
+            methods=["POST"],
+            status_code=200,
+            workload="analytics",
+            streaming_body=True,
+            openapi_extra=IMPORT_REQUEST_BODY,
         )
 
     async def get_paginated(
-        self, request: Request, page: int = 1, page_size: int = 2
-    ) -> list[ProductSchema]:
+        self,
+        request: Request,
+        page: int = 1,
+        page_size: int = 2,
+        after_id: int | None = None,
+        before_id: int | None = None,
+        total_source: TotalSource = "estimate",
+    ) -> Union[
+        BasePaginatedResponse[ProductSchema], BaseCursorPaginatedResponse[ProductSchema]
+    ]:
         """
         Retrieves a paginated list of products.
 
@@ -66,23 +96,32 @@ class ProductRouter(BaseRouter):
             request (Request): HTTP request object.
             page (int): Page number.
             page_size (int): Number of items per page.
+            after_id (int | None): Cursor of the page to continue after.
+            before_id (int | None): Cursor of the page to continue before.
+            total_source (TotalSource): Source of the total number of items.
 
         Returns:
-            list[ProductSchema]: List of paginated product records.
+            BasePaginatedResponse[ProductSchema] | BaseCursorPaginatedResponse[ProductSchema]:
+                Page of paginated product records, or a cursor page.
         """
-        return await super().get_paginated(request, page, page_size)
+        return await super().get_paginated(
+            request, page, page_size, after_id, before_id, total_source
+        )
 
-    async def get_count(self, request: Request) -> int:
+    async def get_count(
+        self, request: Request, total_source: TotalSource = "count"
+    ) -> int:
         """
         Retrieves the total count of products.
 
         Args:
             request (Request): HTTP request object.
+            total_source (TotalSource): Source of the count.
 
         Returns:
             int: Number of product records.
         """
-        return await super().get_count(request)
+        return await super().get_count(request, total_source)
 
     async def get_by_id(self, request: Request, id: int) -> ProductSchemaCreate:
         """
@@ -169,5 +208,20 @@ class ProductRouter(BaseRouter):
         """
         return await super().batch_delete(request, ids)
 
+    async def import_rows(
+        self, request: Request, staging: bool = False
+    ) -> ImportReportSchema:
+        """
+        Imports products from a streamed CSV or NDJSON body, written with COPY.
+
+        Args:
+            request (Request): HTTP request object.
+            staging (bool): Whether to write through a staging table, rejecting only invalid rows.
+
+        Returns:
+            ImportReportSchema: Report of the import.
+        """
+        return await super().import_rows(request, ProductSchemaCreate, staging)
+
 
 product_router = ProductRouter(product_crud, "/products").router
@@ -1,5 +1,4 @@
 from fastapi import Request
-from fastapi_cache.decorator import cache
 
 from app.crud import report_crud
 from app.schemas import ReportSchema
@@ -8,19 +7,22 @@ from .base import BaseRouter
 
 
 class ReportRouter(BaseRouter):
+    workload = "analytics"
+
     def __init__(self, model_crud, prefix) -> None:
         super().__init__(model_crud, prefix)
 
     def setup_routes(self) -> None:
-        self.router.add_api_route(
+        self.add_api_route(
             f"{self.prefix}-all",
             self.report,
             methods=["GET"],
             status_code=200,
+            deadline=60,
+            cache_ttl=60 * 30,
             description="date in format: 2023-12-31",
         )
 
-    @cache(expire=60 * 30)
     async def report(
         self, request: Request, start_date: str, end_date: str
     ) -> ReportSchema:
@@ -0,0 +1,414 @@
+import asyncio
+from functools import wraps
+import gzip
+import hashlib
+import inspect
+import time
+from typing import Any, Callable, Coroutine
+import uuid
+
+from fastapi import HTTPException, Request, status
+from fastapi.exceptions import ResponseValidationError
+from pydantic import TypeAdapter, ValidationError
+from pydantic_core import PydanticSerializationError
+from starlette.responses import JSONResponse, Response
+
+from app import cahce, idempotency
+from app.cahce import CachedResponse
+from app.config import settings
+from app.errors import request_error_status
+from app.idempotency import IdempotencyRecord, IdempotencyStore
+from app.logger import logger
+from app.midlewares.exception import ErrorHandlingMiddleware
+
+# Methods whose requests honour an Idempotency-Key header.
+IDEMPOTENT_METHODS = frozenset({"POST", "PUT", "PATCH", "DELETE"})
+
+# Seconds between checks of a key claimed by a running request.
+IDEMPOTENCY_POLL_INTERVAL = 0.05
+
+
+class JSONBytesResponse(JSONResponse):
+    """
+    JSON response whose content has already been serialized to bytes.
+
+    Being a JSONResponse, it is still documented with the route's response model.
+    """
+
+    def render(self, content: bytes) -> bytes:
+        return content
+
+
+class ResponseSerializer:
+    """
+    Serializes endpoint results to JSON bytes according to a return annotation.
+
+    Results that already match the annotation, e.g. schemas built by the CRUD
+    classes, are serialized directly by pydantic-core, without the second
+    validation FastAPI would run. Other results (row mappings, plain dicts
+    for a schema) are validated once first. The TypeAdapter is built once
+    per route.
+
+    Attributes:
+        adapter (TypeAdapter): Serializer and validator of the annotated type.
+    """
+
+    def __init__(self, annotation: Any) -> None:
+        """
+        Builds the serializer of an annotation.
+
+        Args:
+            annotation (Any): The endpoint's return annotation, None if it has none.
+        """
+        self.adapter = TypeAdapter(Any if annotation is None else annotation)
+
+    def serialize(self, content: Any) -> bytes:
+        """
+        Serializes a result to JSON bytes.
+
+        Args:
+            content (Any): The endpoint's result.
+
+        Returns:
+            bytes: The JSON document.
+
+        Raises:
+            ResponseValidationError: If the result does not match the annotation.
+        """
+        try:
+            return self.adapter.dump_json(content, warnings="error")
+        except PydanticSerializationError:
+            pass
+        try:
+            value = self.adapter.validate_python(content, from_attributes=True)
+        except ValidationError as e:
+            raise ResponseValidationError(errors=e.errors(), body=content)
+        return self.adapter.dump_json(value)
+
+
+def serialize_responses(
+    endpoint: Callable[..., Coroutine],
+    annotation: Any,
+    status_code: int,
+) -> Callable[..., Coroutine]:
+    """
+    Wraps an endpoint so that it returns its result as a JSONBytesResponse.
+
+    The wrapper keeps the endpoint's signature, so FastAPI still derives the
+    parameters and the documented response model from it. Responses returned
+    by the endpoint are passed through unchanged; headers set on an injected
+    Response parameter are copied, as FastAPI does for its own responses.
+
+    Args:
+        endpoint (Callable): The route handler.
+        annotation (Any): The handler's return annotation.
+        status_code (int): Status code of successful responses.
+
+    Returns:
+        Callable: The wrapped handler.
+    """
+    serializer = ResponseSerializer(annotation)
+
+    @wraps(endpoint)
+    async def serialized_endpoint(*args, **kwargs):
+        content = await endpoint(*args, **kwargs)
+        if isinstance(content, Response):
+            return content
+        response = JSONBytesResponse(serializer.serialize(content), status_code)
+        for value in kwargs.values():
+            if isinstance(value, Response):
+                response.headers.update(value.headers)
+        return response
+
+    # Bound methods and decorated handlers keep the signature FastAPI saw before.
+    serialized_endpoint.__signature__ = inspect.signature(endpoint)
+    return serialized_endpoint
+
+
+def cache_responses(
+    handler: Callable[[Request], Coroutine[Any, Any, Response]],
+    ttl: float,
+) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+    """
+    Wraps a route handler so that its successful GET responses are cached as bytes.
+
+    Entries are keyed by path and query string and hold the final body, gzipped
+    above RESPONSE_CACHE_GZIP_MIN_SIZE, with its content type and ETag. A hit
+    is sent as stored: no handler, no database session and no serialization.
+    Clients accepting gzip get the compressed body as it is, and a matching
+    If-None-Match is answered with 304. Cache errors only skip the cache.
+
+    Args:
+        handler (Callable): The route handler.
+        ttl (float): Seconds a response is cached.
+
+    Returns:
+        Callable: The caching route handler.
+    """
+
+    async def cached_handler(request: Request) -> Response:
+        store = cahce.response_store
+        if request.method != "GET" or store is None:
+            return await handler(request)
+
+        key = cache_key(request)
+        try:
+            entry = await store.get(key)
+        except Exception as e:
+            logger.error(f"Response cache read failed: {e!r}")
+            return await handler(request)
+        if entry is None:
+            response = await handler(request)
+            if response.status_code != status.HTTP_200_OK or not hasattr(
+                response, "body"
+            ):
+                return response
+            entry = CachedResponse.build(response.body, response.media_type)
+            try:
+                await store.set(key, entry, ttl)
+            except Exception as e:
+                logger.error(f"Response cache write failed: {e!r}")
+        return cached_response(request, entry)
+
+    return cached_handler
+
+
+def cache_key(request: Request) -> str:
+    """
+    Returns the response cache key of a request: its path and sorted query parameters.
+
+    Args:
+        request (Request): HTTP request object.
+
+    Returns:
+        str: The cache key.
+    """
+    query = "&".join(
+        f"{name}={value}" for name, value in sorted(request.query_params.multi_items())
+    )
+    return f"{request.url.path}?{query}"
+
+
+def cached_response(request: Request, entry: CachedResponse) -> Response:
+    """
+    Builds the response of a cache entry for a request.
+
+    Args:
+        request (Request): HTTP request object.
+        entry (CachedResponse): The cache entry.
+
+    Returns:
+        Response: 304 if the client has the entry, else its body, compressed if the client accepts gzip.
+    """
+    headers = {"ETag": entry.etag, "Vary": "Accept-Encoding"}
+    if entry.etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    body = entry.body
+    if entry.gzipped and "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+    elif entry.gzipped:
+        body = gzip.decompress(body)
+    return Response(body, media_type=entry.media_type, headers=headers)
+
+
+def idempotent_responses(
+    handler: Callable[[Request], Coroutine[Any, Any, Response]],
+) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+    """
+    Wraps a route handler so that requests repeated with the same Idempotency-Key header run once.
+
+    The first request with a key claims it, runs, commits its session and
+    stores its response for IDEMPOTENCY_TTL seconds. This covers errors caused
+    by the request's data too, e.g. an order of a missing product. Requests
+    repeating the key get the stored response with "Idempotent-Replayed: true".
+    While the first request runs, they wait for it, up to
+    IDEMPOTENCY_WAIT_TIMEOUT seconds, then get 409. A key reused with a
+    different body gets 422.
+
+    Outcomes a retry should not repeat are not stored, and their key is
+    released: overload (503), deadline (504), disconnect (499) and unexpected
+    errors. Keys are scoped by method and path. Store errors only skip
+    idempotency.
+
+    Args:
+        handler (Callable): The route handler.
+
+    Returns:
+        Callable: The idempotent route handler.
+    """
+
+    async def idempotent_handler(request: Request) -> Response:
+        store = idempotency.idempotency_store
+        header = request.headers.get("idempotency-key")
+        if header is None or store is None or request.method not in IDEMPOTENT_METHODS:
+            return await handler(request)
+        if not 0 < len(header) <= 255:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Idempotency-Key must have 1 to 255 characters.",
+            )
+
+        key = f"{request.method}:{request.url.path}:{header}"
+        fingerprint = hashlib.blake2b(await request.body(), digest_size=16).hexdigest()
+        token = uuid.uuid4().hex
+        try:
+            record = await claim_idempotency_key(store, key, fingerprint, token)
+        except Exception as e:
+            logger.error(f"Idempotency key claim failed: {e!r}")
+            return await handler(request)
+        if record is not None:
+            return replayed_response(record, fingerprint)
+
+        try:
+            response, final = await respond_once(handler, request)
+        except BaseException:
+            await release_idempotency_key(store, key, token)
+            raise
+        if not final:
+            await release_idempotency_key(store, key, token)
+            return response
+        record = IdempotencyRecord(
+            fingerprint,
+            token,
+            response.status_code,
+            dict(response.headers),
+            response.body,
+        )
+        try:
+            stored = await store.complete(key, token, record, settings.IDEMPOTENCY_TTL)
+        except Exception as e:
+            logger.error(f"Idempotency record write failed: {e!r}")
+        else:
+            if not stored:
+                logger.warning(
+                    f"Idempotency key {key!r} lost its claim before its response was stored"
+                )
+        return response
+
+    return idempotent_handler
+
+
+async def claim_idempotency_key(
+    store: IdempotencyStore, key: str, fingerprint: str, token: str
+) -> IdempotencyRecord | None:
+    """
+    Claims an idempotency key for a request, or returns the record of the request holding it.
+
+    A key claimed by a running request with the same body is waited for until
+    its response is stored, up to IDEMPOTENCY_WAIT_TIMEOUT seconds. A claim
+    expires after IDEMPOTENCY_LOCK_TTL seconds, so a key whose request died is
+    claimed again. The claim carries the token, so a request outliving its
+    claim neither stores over nor releases the claim of the next request.
+
+    Args:
+        store (IdempotencyStore): Store of idempotency records.
+        key (str): The scoped idempotency key.
+        fingerprint (str): Hash of the request body.
+        token (str): Random ID of this request's claim.
+
+    Returns:
+        IdempotencyRecord | None: None if the key was claimed, else the record of the other request.
+    """
+    wait_until = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+    claim = IdempotencyRecord(fingerprint, token)
+    while True:
+        if await store.claim(key, claim, settings.IDEMPOTENCY_LOCK_TTL):
+            return None
+        record = await store.get(key)
+        if record is not None:
+            waited_out = time.monotonic() >= wait_until
+            if record.completed or record.fingerprint != fingerprint or waited_out:
+                return record
+        await asyncio.sleep(IDEMPOTENCY_POLL_INTERVAL)
+
+
+async def release_idempotency_key(
+    store: IdempotencyStore, key: str, token: str
+) -> None:
+    """
+    Removes the claim of an idempotency key, so a retry runs again.
+
+    A claim that expired and was taken by another request is left alone.
+
+    Args:
+        store (IdempotencyStore): Store of idempotency records.
+        key (str): The scoped idempotency key.
+        token (str): Random ID of the request's claim.
+    """
+    try:
+        await store.release(key, token)
+    except Exception as e:
+        logger.error(f"Idempotency key release failed: {e!r}")
+
+
+async def respond_once(
+    handler: Callable[[Request], Coroutine[Any, Any, Response]], request: Request
+) -> tuple[Response, bool]:
+    """
+    Runs the handler of an idempotent request and settles its transaction.
+
+    A response to keep is committed before it is stored, so only committed
+    results are replayed. Errors caused by the request's data, told apart by
+    their SQLSTATE as in the error middleware, are rolled back and turned into
+    the error response the middleware would send. No 5xx response is kept,
+    e.g. of a database error the middleware does not map to 409 or 422: the
+    key is released, and a retry runs again.
+
+    Args:
+        handler (Callable): The route handler.
+        request (Request): HTTP request object.
+
+    Returns:
+        tuple[Response, bool]: The response, and whether it is stored for the key.
+
+    Raises:
+        Exception: Any other exception of the handler, or of the commit.
+    """
+    session = getattr(request.state, "session", None)
+    try:
+        response = await handler(request)
+    except Exception as e:
+        # A request error fails a retry the same way, so its response is kept.
+        if isinstance(e, HTTPException):
+            if e.status_code >= 500:
+                raise
+        elif request_error_status(e) is None:
+            raise
+        if session is not None:
+            await session.rollback()
+        response = ErrorHandlingMiddleware.error_response(e)
+        return response, response.status_code < 500
+
+    # 499: the client left, and the request was rolled back.
+    final = response.status_code < 500 and response.status_code != 499
+    if final and hasattr(response, "body"):
+        if session is not None:
+            await session.commit()
+        return response, True
+    return response, False
+
+
+def replayed_response(record: IdempotencyRecord, fingerprint: str) -> Response:
+    """
+    Builds the response to a request repeating an idempotency key.
+
+    Args:
+        record (IdempotencyRecord): Record of the request that claimed the key.
+        fingerprint (str): Hash of the repeated request's body.
+
+    Returns:
+        Response: The stored response; 422 if the bodies differ, 409 if the first request still runs.
+    """
+    if record.fingerprint != fingerprint:
+        return JSONResponse(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            content={"detail": "Idempotency-Key was used with a different request."},
+        )
+    if not record.completed:
+        return JSONResponse(
+            status_code=status.HTTP_409_CONFLICT,
+            content={"detail": "A request with this Idempotency-Key is in progress."},
+            headers={"Retry-After": "1"},
+        )
+    headers = {**record.headers, "Idempotent-Replayed": "true"}
+    return Response(record.body, status_code=record.status_code, headers=headers)
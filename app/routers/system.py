@@ -0,0 +1,87 @@
+from fastapi import Request, status
+from starlette.responses import JSONResponse
+
+from app.db import engines
+from app.health import readiness_probe
+
+from .base import BaseRouter
+
+
+class SystemRouter(BaseRouter):
+    """
+    Router for operational endpoints of the worker: connection pool gauges and readiness.
+    Inherits from BaseRouter without a CRUD instance.
+    """
+
+    def __init__(self, prefix) -> None:
+        """
+        Initializes the SystemRouter with a URL prefix.
+
+        Args:
+            prefix (str): URL prefix for the system routes.
+        """
+        super().__init__(None, prefix)
+
+    def setup_routes(self) -> None:
+        """
+        Sets up the pool statistics and readiness routes.
+        """
+        self.add_api_route(
+            f"{self.prefix}/pool-stats",
+            self.pool_stats,
+            methods=["GET"],
+            status_code=200,
+            description="connection pool gauges of every engine in this worker",
+        )
+        self.add_api_route(
+            f"{self.prefix}/ready",
+            self.ready,
+            methods=["GET"],
+            status_code=200,
+            description="200 once the pools are warm and the database and Redis answer, 503 otherwise",
+        )
+
+    async def pool_stats(self, request: Request) -> list[dict]:
+        """
+        Returns the connection pool gauges of every engine of this worker.
+
+        Args:
+            request (Request): HTTP request object.
+
+        Returns:
+            list[dict]: Workload class, read-only flag and pool gauges of each engine.
+        """
+        return [
+            {"workload": workload, "read_only": read_only, **engine.pool.gauges()}
+            for (workload, read_only), engine in engines.items()
+        ]
+
+    async def ready(self, request: Request) -> JSONResponse:
+        """
+        Reports whether the worker is ready to serve traffic.
+
+        The worker is ready once its pools are warm and the database and Redis
+        answer; the result of the probe is reused for READINESS_CACHE_TTL seconds.
+
+        Args:
+            request (Request): HTTP request object.
+
+        Returns:
+            JSONResponse: 200 when ready, 503 otherwise, with the state of each check.
+        """
+        readiness = await readiness_probe.check()
+        ready = readiness_probe.warm and readiness.ready
+        return JSONResponse(
+            status_code=(
+                status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE
+            ),
+            content={
+                "ready": ready,
+                "warm": readiness_probe.warm,
+                "database": readiness.database,
+                "redis": readiness.redis,
+            },
+        )
+
+
+system_router = SystemRouter("").router
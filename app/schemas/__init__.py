@@ -1,4 +1,13 @@
-from .order import OrderReturnSchema, OrderSchema, OrderSchemaCreate
-from .order_product import OrderProductsSchema, OrderProductsSchemaCreate
+from .order import (
+    OrderReturnSchema,
+    OrderSchema,
+    OrderSchemaCreate,
+    OrderTicketSchema,
+)
+from .order_product import (
+    OrderProductsSchema,
+    OrderProductsSchemaCreate,
+    OrderProductsSchemaUpdate,
+)
 from .product import ProductSchema, ProductSchemaCreate
 from .report import ReportSchema
@@ -36,3 +36,52 @@ class BasePaginatedResponse(BaseSchema, Generic[T]):
     page_size: int
     prev_page: Optional[int] = None
     next_page: Optional[int] = None
+
+
+class BaseCursorPaginatedResponse(BaseSchema, Generic[T]):
+    """
+    Generic schema for keyset (cursor) paginated responses.
+
+    Attributes:
+        items (List[T]): List of items on the current page.
+        page_size (int): Number of items per page.
+        next_cursor (Optional[int]): Cursor to pass as 'after_id' for the next page (None on the last page).
+        prev_cursor (Optional[int]): Cursor to pass as 'before_id' for the previous page (None on the first page).
+    """
+
+    items: List[T]
+    page_size: int
+    next_cursor: Optional[int] = None
+    prev_cursor: Optional[int] = None
+
+
+class ImportErrorSchema(BaseSchema):
+    """
+    Schema for a row of a bulk import that was not imported.
+
+    Attributes:
+        line (int): Line of the row in the request body, starting at 1.
+        error (str): Why the row was not imported.
+    """
+
+    line: int
+    error: str
+
+
+class ImportReportSchema(BaseSchema):
+    """
+    Schema for the result of a bulk import.
+
+    Attributes:
+        rows (int): Number of data rows read.
+        imported (int): Number of rows written.
+        failed (int): Number of rows not written.
+        batches (int): Number of batches, each written and committed on its own.
+        errors (List[ImportErrorSchema]): The first rows not written, with their errors.
+    """
+
+    rows: int = 0
+    imported: int = 0
+    failed: int = 0
+    batches: int = 0
+    errors: List[ImportErrorSchema] = []
@@ -1,4 +1,6 @@
 from datetime import datetime
+from typing import Literal
+from uuid import UUID
 
 from pydantic import Field
 
@@ -41,7 +43,34 @@ class OrderReturnSchema(BaseSchema):
     Attributes:
         id (int): Unique identifier of the order (greater than 0).
         created_at (datetime): Timestamp when the order was created.
+        total_revenue (float): Sum of amount * unit price over the order's lines.
+        total_cost (float): Sum of amount * unit cost over the order's lines.
+        total_units (int): Sum of the amounts of the order's lines.
+        line_count (int): Number of lines of the order.
+        has_return (bool): Whether a line of the order has a negative amount.
     """
 
     id: int = Field(..., gt=0)
     created_at: datetime = Field(...)
+    total_revenue: float = 0
+    total_cost: float = 0
+    total_units: int = 0
+    line_count: int = 0
+    has_return: bool = False
+
+
+class OrderTicketSchema(BaseSchema):
+    """
+    Schema for the status of an order accepted into the order queue.
+
+    Attributes:
+        ticket (UUID): Ticket returned when the order was queued.
+        status (str): "queued", "created" or "failed".
+        order_id (int | None): ID of the order, once created.
+        error (str | None): Why the order could not be created, if it failed.
+    """
+
+    ticket: UUID = Field(...)
+    status: Literal["queued", "created", "failed"] = Field(...)
+    order_id: int | None = None
+    error: str | None = None
@@ -20,9 +20,12 @@ class OrderProductsSchemaCreate(BaseSchema):
     amount: int | None = Field(default=None, ge=0)
 
 
-class OrderProductsSchema(OrderProductsSchemaCreate):
+class OrderProductsSchemaUpdate(OrderProductsSchemaCreate):
     """
-    Schema representing an order-product relationship with additional fields.
+    Schema for updating an order-product association.
+
+    The price snapshot is not part of it: it is taken from the product by the
+    database when the line is created or its product changes.
 
     Extends:
         OrderProductsSchemaCreate
@@ -34,3 +37,19 @@ class OrderProductsSchema(OrderProductsSchemaCreate):
 
     id: int = Field(..., gt=0)
     created_at: datetime | None = Field(default=None)
+
+
+class OrderProductsSchema(OrderProductsSchemaUpdate):
+    """
+    Schema representing an order-product relationship with additional fields.
+
+    Extends:
+        OrderProductsSchemaUpdate
+
+    Attributes:
+        unit_price (float | None): Price of the product when the record was created.
+        unit_cost (float | None): Cost of the product when the record was created.
+    """
+
+    unit_price: float | None = Field(default=None)
+    unit_cost: float | None = Field(default=None)
@@ -0,0 +1,73 @@
+"""
+Order deletion throughput: one "DELETE /orders/{id}" per order vs chunked "DELETE /orders-batch".
+
+Creates '--orders' orders of '--lines' lines twice. It deletes the first set
+with one request per order and the second with one batch request, whose
+orders are deleted in chunks of '--chunk-size' per transaction. Requests are
+sent in-process through httpx.ASGITransport.
+
+Usage:
+    python -m benchmarks.batch_delete --orders 20000 --lines 5 --chunk-size 1000
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from app.config import settings
+from app.main import app
+from benchmarks.orders_batch import create_products
+
+
+async def create_orders(
+    client: httpx.AsyncClient, payload: dict, orders: int
+) -> list[int]:
+    """
+    Creates 'orders' orders and returns their IDs.
+    """
+    order_ids = []
+    for offset in range(0, orders, 1000):
+        count = min(1000, orders - offset)
+        response = await client.post("/orders-batch", json=[payload] * count)
+        response.raise_for_status()
+        order_ids.extend(response.json())
+    return order_ids
+
+
+async def main(orders: int, lines: int, chunk_size: int) -> None:
+    settings.BATCH_DELETE_CHUNK_SIZE = chunk_size
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=600
+    ) as client:
+        product_ids = await create_products(client, lines)
+        payload = {"product_ids": product_ids, "amounts": [1] * lines}
+
+        order_ids = await create_orders(client, payload, orders)
+        started = time.perf_counter()
+        for order_id in order_ids:
+            response = await client.delete(f"/orders/{order_id}")
+            response.raise_for_status()
+        single = orders / (time.perf_counter() - started)
+
+        order_ids = await create_orders(client, payload, orders)
+        started = time.perf_counter()
+        response = await client.request("DELETE", "/orders-batch", json=order_ids)
+        response.raise_for_status()
+        batched = orders / (time.perf_counter() - started)
+        assert len(response.json()) == orders
+
+    print(f"{'endpoint':<36}{'orders/s':>10}")
+    print(f"{'DELETE /orders/{id}':<36}{single:>10.0f}")
+    print(f"{f'DELETE /orders-batch ({chunk_size}/chunk)':<36}{batched:>10.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--orders", type=int, default=20000)
+    parser.add_argument("--lines", type=int, default=5)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(main(args.orders, args.lines, args.chunk_size))
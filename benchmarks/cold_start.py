@@ -0,0 +1,79 @@
+"""
+Cold-start and first-request latency with and without connection pool pre-warming.
+
+Runs the application's lifespan startup, then sends a burst of concurrent
+first requests to "/products/{id}" and reports the startup time and the
+latency of those requests. The cold run sets OLTP_POOL_PREWARM to 0, so
+every request of the burst opens its own connection.
+
+Usage:
+    python -m benchmarks.cold_start --burst 20 --prewarm 20
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from app.config import settings
+from app.main import app
+
+
+async def timed_get(client: httpx.AsyncClient, path: str) -> float:
+    """
+    Sends one GET request and returns its latency in milliseconds.
+    """
+    started = time.perf_counter()
+    response = await client.get(path)
+    response.raise_for_status()
+    return (time.perf_counter() - started) * 1000
+
+
+async def measure(prewarm: int, burst: int, path: str) -> tuple[float, list[float]]:
+    """
+    Starts the application with the given pre-warm size and sends a burst of first requests.
+
+    Returns the startup time and the burst latencies, in milliseconds.
+    """
+    settings.OLTP_POOL_PREWARM = prewarm
+    started = time.perf_counter()
+    async with app.router.lifespan_context(app):
+        startup = (time.perf_counter() - started) * 1000
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench"
+        ) as client:
+            latencies = await asyncio.gather(
+                *(timed_get(client, path) for _ in range(burst))
+            )
+    return startup, latencies
+
+
+async def main(burst: int, prewarm: int) -> None:
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench"
+        ) as client:
+            product = await client.post("/products", json={"product_name": "Benchmark"})
+            path = f"/products/{product.json()['id']}"
+
+    print(
+        f"{'prewarm':<10}{'startup ms':>12}{'first p50 ms':>14}" f"{'first max ms':>14}"
+    )
+    for connections in (0, prewarm):
+        startup, latencies = await measure(connections, burst, path)
+        print(
+            f"{connections:<10}{startup:>12.1f}{statistics.median(latencies):>14.1f}"
+            f"{max(latencies):>14.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--burst", type=int, default=20)
+    parser.add_argument("--prewarm", type=int, default=settings.OLTP_POOL_PREWARM)
+    args = parser.parse_args()
+    asyncio.run(main(args.burst, args.prewarm))
@@ -0,0 +1,118 @@
+"""
+Latency of create_order_with_products by order size: per-row loop vs set-based function.
+
+The per-row loop is the function of the db_init migration, created as a
+temporary function; the set-based one is the current create_order_with_products.
+Every call runs in its own transaction, which is rolled back, so the tables do
+not grow during the benchmark.
+
+Usage:
+    python -m benchmarks.create_order --sizes 1 10 100 1000 --calls 200
+"""
+
+import argparse
+import asyncio
+from datetime import datetime
+import statistics
+import time
+
+from sqlalchemy import text
+
+from app.db import get_engine
+
+LOOP_FUNCTION = """CREATE OR REPLACE FUNCTION pg_temp.create_order_with_products_loop(
+    p_product_ids BIGINT[], p_amounts INT[], p_order_created_at TIMESTAMP
+) RETURNS BIGINT LANGUAGE plpgsql AS $$
+DECLARE
+    v_order_id BIGINT;
+    v_index INT := 1;
+    v_product_exists BOOLEAN;
+BEGIN
+    IF array_length(p_product_ids, 1) != array_length(p_amounts, 1) THEN
+        RAISE EXCEPTION 'The lengths of product_ids and amounts must match.';
+    END IF;
+    INSERT INTO orders (created_at) VALUES (p_order_created_at) RETURNING id INTO v_order_id;
+    WHILE v_index <= array_length(p_product_ids, 1) LOOP
+        SELECT EXISTS (SELECT 1 FROM products WHERE id = p_product_ids[v_index]) INTO v_product_exists;
+        IF NOT v_product_exists THEN
+            RAISE EXCEPTION 'Product with ID % does not exist.', p_product_ids[v_index];
+        END IF;
+        INSERT INTO orders_products (order_id, product_id, amount, created_at)
+        VALUES (v_order_id, p_product_ids[v_index], p_amounts[v_index], p_order_created_at);
+        v_index := v_index + 1;
+    END LOOP;
+    RETURN v_order_id;
+EXCEPTION
+    WHEN OTHERS THEN
+        RAISE EXCEPTION 'Error creating order: %', SQLERRM;
+END;
+$$;"""
+
+
+async def product_ids(count: int) -> list[int]:
+    """
+    Returns the IDs of 'count' products, inserting products until there are enough.
+    """
+    async with get_engine().begin() as connection:
+        await connection.execute(
+            text(
+                "INSERT INTO products (product_name, price, cost, stock) "
+                "SELECT 'Benchmark ' || i, 10, 5, 100 "
+                "FROM generate_series(1, :count - (SELECT count(*) FROM products)) AS i"
+            ),
+            {"count": count},
+        )
+        result = await connection.execute(
+            text("SELECT id FROM products ORDER BY id LIMIT :count"), {"count": count}
+        )
+        return list(result.scalars())
+
+
+async def measure(functions: list[str], ids: list[int], calls: int) -> list[float]:
+    """
+    Returns the median milliseconds of 'calls' calls of each function with the given lines.
+
+    The functions are called in turns, so that all of them see the same table state.
+    """
+    params = {
+        "product_ids": ids,
+        "amounts": [1] * len(ids),
+        "created_at": datetime.now(),
+    }
+    timings: list[list[float]] = [[] for _ in functions]
+    async with get_engine().connect() as connection:
+        await connection.execute(text(LOOP_FUNCTION))
+        await connection.commit()
+        for _ in range(calls + 1):
+            for function, function_timings in zip(functions, timings):
+                statement = text(
+                    f"SELECT {function}(:product_ids, :amounts, :created_at)"
+                )
+                started = time.perf_counter()
+                await connection.execute(statement, params)
+                function_timings.append(time.perf_counter() - started)
+                await connection.rollback()
+    return [
+        statistics.median(function_timings[1:]) * 1000 for function_timings in timings
+    ]
+
+
+async def main(sizes: list[int], calls: int) -> None:
+    ids = await product_ids(max(sizes))
+    functions = [
+        "pg_temp.create_order_with_products_loop",
+        "create_order_with_products",
+    ]
+    print(f"{'lines':>6}{'loop ms':>12}{'set-based ms':>15}{'speedup':>10}")
+    for size in sizes:
+        loop, set_based = await measure(functions, ids[:size], calls)
+        print(f"{size:>6}{loop:>12.2f}{set_based:>15.2f}{loop / set_based:>9.1f}x")
+    await get_engine().dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.sizes, args.calls))
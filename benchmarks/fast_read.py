@@ -0,0 +1,72 @@
+"""
+1,000-row pages of "/products" with the ORM read path and the fast read path.
+
+Makes sure the products table has at least '--page-size' rows, then requests
+the first page with 'page_size' rows repeatedly through the whole
+application (in-process, via httpx.ASGITransport), once with
+CrudProduct.fast_read disabled and once enabled.
+
+Usage:
+    python -m benchmarks.fast_read --page-size 1000 --requests 200
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+from sqlalchemy import text
+
+from app.crud import product_crud
+from app.db import get_engine
+from app.main import app
+
+
+async def ensure_products(count: int) -> None:
+    """
+    Inserts products until the table has at least 'count' rows.
+    """
+    async with get_engine().begin() as connection:
+        await connection.execute(
+            text(
+                "INSERT INTO products (product_name, price, cost, stock) "
+                "SELECT 'Product ' || n, 10.5, 2.25, 100 "
+                "FROM generate_series(1, :count - (SELECT count(*) FROM products)) n"
+            ),
+            {"count": count},
+        )
+
+
+async def measure(client: httpx.AsyncClient, page_size: int, requests: int) -> float:
+    """
+    Requests the page 'requests' times and returns milliseconds per request.
+    """
+    params = {"page_size": page_size}
+    (await client.get("/products", params=params)).raise_for_status()  # warm-up
+    started = time.perf_counter()
+    for _ in range(requests):
+        response = await client.get("/products", params=params)
+        response.raise_for_status()
+    return (time.perf_counter() - started) / requests * 1000
+
+
+async def main(page_size: int, requests: int) -> None:
+    await ensure_products(page_size)
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench"
+        ) as client:
+            print(f"{'read path':<12}{'ms/request':>12}")
+            for name, fast_read in (("orm", False), ("fast", True)):
+                product_crud.fast_read = fast_read
+                latency = await measure(client, page_size, requests)
+                print(f"{name:<12}{latency:>12.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.page_size, args.requests))
@@ -0,0 +1,107 @@
+"""
+Product loading throughput: "POST /products-batch" vs the streamed "POST /products-import".
+
+Loads '--rows' products four times: as JSON arrays of '--batch-size'
+products to "/products-batch", and as one streamed CSV body, one streamed
+NDJSON body and one CSV body written through the staging table to
+"/products-import". Bodies are sent in chunks of 1000 rows, in-process
+through httpx.ASGITransport.
+
+Usage:
+    python -m benchmarks.import_rows --rows 200000 --batch-size 1000 --import-batch-size 10000
+"""
+
+import argparse
+import asyncio
+import time
+from typing import AsyncIterator
+
+import httpx
+import orjson
+
+from app.config import settings
+from app.main import app
+
+
+def chunks(items: list, size: int) -> list[list]:
+    """
+    Splits items into lists of 'size' items.
+    """
+    starts = list(range(0, len(items), size))
+    return [items[start:end] for start, end in zip(starts, starts[1:] + [None])]
+
+
+def products(rows: int) -> list[dict]:
+    """
+    Returns 'rows' products to load.
+    """
+    return [
+        {"product_name": f"Import {i}", "price": 10.5, "cost": 5.25, "stock": i % 100}
+        for i in range(rows)
+    ]
+
+
+async def csv_body(items: list[dict]) -> AsyncIterator[bytes]:
+    """
+    Streams products as CSV, 1000 rows per chunk.
+    """
+    yield b"product_name,price,cost,stock\n"
+    for chunk in chunks(items, 1000):
+        yield "".join(
+            f"{p['product_name']},{p['price']},{p['cost']},{p['stock']}\n"
+            for p in chunk
+        ).encode()
+
+
+async def ndjson_body(items: list[dict]) -> AsyncIterator[bytes]:
+    """
+    Streams products as NDJSON, 1000 rows per chunk.
+    """
+    for chunk in chunks(items, 1000):
+        yield b"".join(orjson.dumps(p) + b"\n" for p in chunk)
+
+
+async def main(rows: int, batch_size: int, import_batch_size: int) -> None:
+    settings.IMPORT_BATCH_SIZE = import_batch_size
+    items = products(rows)
+    transport = httpx.ASGITransport(app=app)
+    results = []
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=600
+    ) as client:
+        started = time.perf_counter()
+        for chunk in chunks(items, batch_size):
+            response = await client.post("/products-batch", json=chunk)
+            response.raise_for_status()
+        results.append(
+            (f"/products-batch ({batch_size}/request)", time.perf_counter() - started)
+        )
+
+        for name, body, content_type, staging in [
+            ("/products-import CSV", csv_body, "text/csv", False),
+            ("/products-import NDJSON", ndjson_body, "application/x-ndjson", False),
+            ("/products-import CSV staging", csv_body, "text/csv", True),
+        ]:
+            started = time.perf_counter()
+            response = await client.post(
+                "/products-import",
+                params={"staging": staging},
+                content=body(items),
+                headers={"Content-Type": content_type},
+            )
+            response.raise_for_status()
+            assert response.json()["imported"] == rows, response.text
+            results.append((name, time.perf_counter() - started))
+
+    print(f"{'endpoint':<40}{'rows/s':>10}")
+    for name, elapsed in results:
+        print(f"{name:<40}{rows / elapsed:>10.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--import-batch-size", type=int, default=10000)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.batch_size, args.import_batch_size))
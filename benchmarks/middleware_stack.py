@@ -0,0 +1,129 @@
+"""
+Requests-per-second benchmark of the middleware stack.
+
+Compares the previous stack (DBSessionMiddleware as a BaseHTTPMiddleware and the
+error handler registered through app.middleware("http")) with the pure ASGI
+middlewares on the "/" and "/products/{id}" routes. Requests are sent in-process
+through httpx.ASGITransport, so the numbers measure the application only.
+
+Usage:
+    python -m benchmarks.middleware_stack --requests 5000 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+import httpx
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.db import async_session_maker
+from app.midlewares import DBSessionMiddleware, LazySession, setup_error_middleware
+from app.midlewares.exception import ErrorHandlingMiddleware
+from app.routers import product_router
+
+
+class LegacyDBSessionMiddleware(BaseHTTPMiddleware):
+    """
+    The session middleware as it was before the pure ASGI rewrite.
+    """
+
+    async def dispatch(self, request: Request, call_next):
+        session = LazySession(async_session_maker)
+        request.state.session = session
+        try:
+            response = await call_next(request)
+            await session.commit()
+            return response
+        except Exception:
+            await session.rollback()
+            raise
+        finally:
+            await session.close()
+
+
+class LegacyErrorHandlingMiddleware:
+    """
+    The function-style error middleware as it was before the pure ASGI rewrite.
+    """
+
+    async def __call__(self, request: Request, call_next):
+        try:
+            return await call_next(request)
+        except Exception as exc:
+            return ErrorHandlingMiddleware.error_response(exc)
+
+
+def build_app(legacy: bool) -> FastAPI:
+    """
+    Builds an application with the same routes and either middleware stack.
+    """
+    app = FastAPI()
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.include_router(product_router)
+    if legacy:
+        app.middleware("http")(LegacyErrorHandlingMiddleware())
+        app.add_middleware(LegacyDBSessionMiddleware)
+    else:
+        setup_error_middleware(app)
+        app.add_middleware(DBSessionMiddleware)
+
+    @app.get("/")
+    async def hello_world():
+        return {"message": "Hello, World!"}
+
+    return app
+
+
+async def measure(app: FastAPI, path: str, requests: int, concurrency: int) -> float:
+    """
+    Sends 'requests' GET requests with 'concurrency' workers and returns requests per second.
+    """
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        remaining = iter(range(requests))
+
+        async def worker() -> None:
+            for _ in remaining:
+                response = await client.get(path)
+                response.raise_for_status()
+
+        await client.get(path)  # warm-up
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return requests / (time.perf_counter() - started)
+
+
+async def main(requests: int, concurrency: int) -> None:
+    setup_app = build_app(legacy=False)
+    transport = httpx.ASGITransport(app=setup_app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        product = await client.post("/products", json={"product_name": "Benchmark"})
+        product_id = product.json()["id"]
+
+    print(f"{'route':<20}{'before rps':>12}{'after rps':>12}{'change':>10}")
+    for path in ("/", f"/products/{product_id}"):
+        before = await measure(build_app(legacy=True), path, requests, concurrency)
+        after = await measure(build_app(legacy=False), path, requests, concurrency)
+        change = (after / before - 1) * 100
+        print(f"{path:<20}{before:>12.0f}{after:>12.0f}{change:>9.1f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
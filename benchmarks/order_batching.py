@@ -0,0 +1,90 @@
+"""
+Concurrent "POST /orders" with and without ORDER_BATCHING.
+
+Sends '--orders' single-order requests with '--concurrency' in flight, once
+with every order in its own transaction and once with micro-batching, and
+reports orders per second and the commits Postgres counted (pg_stat_database).
+Requests are sent in-process through httpx.ASGITransport.
+
+Usage:
+    python -m benchmarks.order_batching --orders 5000 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+from sqlalchemy import text
+
+from app.config import settings
+from app.db import get_engine
+from app.main import app
+
+
+async def commits() -> int:
+    """
+    Returns the number of commits of the database so far.
+    """
+    async with get_engine().connect() as connection:
+        # Statistics are cached per transaction, clear them to see the current counter.
+        await connection.execute(text("SELECT pg_stat_clear_snapshot()"))
+        result = await connection.execute(
+            text(
+                "SELECT xact_commit FROM pg_stat_database WHERE datname = current_database()"
+            )
+        )
+        return result.scalar()
+
+
+async def measure(
+    client: httpx.AsyncClient, payload: dict, orders: int, concurrency: int
+) -> tuple[float, int]:
+    """
+    Sends 'orders' requests and returns orders per second and commits.
+    """
+    remaining = iter(range(orders))
+
+    async def worker() -> None:
+        for _ in remaining:
+            response = await client.post("/orders", json=payload)
+            response.raise_for_status()
+
+    # Let the statistics collector catch up with earlier transactions.
+    await asyncio.sleep(1)
+    commits_before = await commits()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    rate = orders / (time.perf_counter() - started)
+    await asyncio.sleep(1)
+    return rate, await commits() - commits_before
+
+
+async def main(orders: int, lines: int, concurrency: int) -> None:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=60
+    ) as client:
+        product = await client.post(
+            "/products", json={"product_name": "Benchmark", "price": 10, "cost": 5}
+        )
+        payload = {
+            "product_ids": [product.json()["id"]] * lines,
+            "amounts": [1] * lines,
+        }
+
+        print(f"{'mode':<12}{'orders/s':>10}{'commits':>10}")
+        for batching in (False, True):
+            settings.ORDER_BATCHING = batching
+            rate, committed = await measure(client, payload, orders, concurrency)
+            mode = "batched" if batching else "single"
+            print(f"{mode:<12}{rate:>10.0f}{committed:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--lines", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+    asyncio.run(main(args.orders, args.lines, args.concurrency))
@@ -0,0 +1,102 @@
+"""
+Decoding cost of CrudOrder.get_by_id on orders with many lines.
+
+Creates an order with '--lines' products and fetches it repeatedly with:
+
+- json, stdlib: lines built with json_agg, decoded with the json module
+  (the previous engine configuration).
+- json, orjson: lines built with json_agg, decoded with orjson.
+- typed arrays: lines fetched as one typed array per column.
+
+Reports wall time and CPU time per call; CPU time is what a busy worker pays.
+
+Usage:
+    python -m benchmarks.order_lines --lines 60 --calls 2000
+"""
+
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+
+from app.config import settings
+from app.crud import order_crud
+from app.db import create_workload_engine
+
+
+async def create_order(engine: AsyncEngine, lines: int) -> int:
+    """
+    Creates 'lines' products and an order containing all of them, returns the order ID.
+    """
+    async with engine.begin() as connection:
+        product_ids = (
+            (
+                await connection.execute(
+                    text(
+                        "INSERT INTO products (product_name, price, cost, stock) "
+                        "SELECT 'Line ' || n, 10.5 + n, 2.25, 1000 FROM generate_series(1, :lines) n "
+                        "RETURNING id"
+                    ),
+                    {"lines": lines},
+                )
+            )
+            .scalars()
+            .all()
+        )
+        order_id = (
+            await connection.execute(
+                text("INSERT INTO orders (created_at) VALUES (now()) RETURNING id")
+            )
+        ).scalar_one()
+        await connection.execute(
+            text(
+                "INSERT INTO orders_products (order_id, product_id, amount) "
+                "SELECT :order_id, unnest(CAST(:product_ids AS bigint[])), 1"
+            ),
+            {"order_id": order_id, "product_ids": list(product_ids)},
+        )
+    return order_id
+
+
+async def measure(
+    engine: AsyncEngine, order_id: int, calls: int, as_arrays: bool
+) -> tuple[float, float]:
+    """
+    Fetches the order 'calls' times and returns wall and CPU milliseconds per call.
+    """
+    settings.ORDER_LINES_AS_ARRAYS = as_arrays
+    async with async_sessionmaker(engine)() as session:
+        await order_crud.get_by_id(session, order_id)  # warm-up
+        wall, cpu = time.perf_counter(), time.process_time()
+        for _ in range(calls):
+            await order_crud.get_by_id(session, order_id)
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    return wall / calls * 1000, cpu / calls * 1000
+
+
+async def main(lines: int, calls: int) -> None:
+    stdlib_engine = create_async_engine(settings.DATABASE_URL)
+    orjson_engine = create_workload_engine("oltp")
+    order_id = await create_order(orjson_engine, lines)
+
+    print(f"{'decoding':<16}{'wall ms':>10}{'cpu ms':>10}")
+    for name, engine, as_arrays in (
+        ("json, stdlib", stdlib_engine, False),
+        ("json, orjson", orjson_engine, False),
+        ("typed arrays", orjson_engine, True),
+    ):
+        wall, cpu = await measure(engine, order_id, calls, as_arrays)
+        print(f"{name:<16}{wall:>10.3f}{cpu:>10.3f}")
+
+    await stdlib_engine.dispose()
+    await orjson_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--lines", type=int, default=60)
+    parser.add_argument("--calls", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(main(args.lines, args.calls))
@@ -0,0 +1,89 @@
+"""
+"POST /orders" answered after the commit vs accepted into the order queue.
+
+Sends '--orders' requests with '--concurrency' in flight, once creating each
+order before answering and once with "Prefer: respond-async" and ORDER_QUEUE
+on the "log" backend, and reports the orders accepted per second, the
+slowest response, and for the queue the seconds until its writer created
+every order. Requests are sent in-process through httpx.ASGITransport.
+
+Usage:
+    python -m benchmarks.order_queue --orders 5000 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+
+from app import order_queue
+from app.config import settings
+from app.main import app
+
+
+async def measure(
+    client: httpx.AsyncClient,
+    payload: dict,
+    orders: int,
+    concurrency: int,
+    headers: dict,
+) -> tuple[float, float]:
+    """
+    Sends 'orders' requests and returns requests per second and the slowest response in ms.
+    """
+    remaining = iter(range(orders))
+    slowest = 0.0
+
+    async def worker() -> None:
+        nonlocal slowest
+        for _ in remaining:
+            started = time.perf_counter()
+            response = await client.post("/orders", json=payload, headers=headers)
+            response.raise_for_status()
+            slowest = max(slowest, time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return orders / (time.perf_counter() - started), slowest * 1000
+
+
+async def main(orders: int, lines: int, concurrency: int) -> None:
+    settings.ORDER_QUEUE = True
+    settings.ORDER_QUEUE_BACKEND = "log"
+    settings.ORDER_QUEUE_LOG_PATH = os.path.join(tempfile.mkdtemp(), "orders.log")
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app), httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=60
+    ) as client:
+        product = await client.post(
+            "/products", json={"product_name": "Benchmark", "price": 10, "cost": 5}
+        )
+        payload = {
+            "product_ids": [product.json()["id"]] * lines,
+            "amounts": [1] * lines,
+        }
+
+        print(f"{'mode':<12}{'orders/s':>10}{'max ms':>10}{'drained s':>12}")
+        rate, slowest = await measure(client, payload, orders, concurrency, {})
+        print(f"{'sync':<12}{rate:>10.0f}{slowest:>10.1f}{'':>12}")
+
+        started = time.perf_counter()
+        rate, slowest = await measure(
+            client, payload, orders, concurrency, {"Prefer": "respond-async"}
+        )
+        while await order_queue.queue.depth():
+            await asyncio.sleep(0.01)
+        drained = time.perf_counter() - started
+        print(f"{'queued':<12}{rate:>10.0f}{slowest:>10.1f}{drained:>12.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--lines", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+    asyncio.run(main(args.orders, args.lines, args.concurrency))
@@ -0,0 +1,87 @@
+"""
+Editing every line of a big order: one PUT /orders/{id} against one request per line.
+
+Creates an order with '--lines' lines, then changes the amount of every line
+'--rounds' times, once with a "PUT /orders_products/{id}" per line and once
+with a single "PUT /orders/{id}" that replaces the order's lines, and reports
+milliseconds per edit of the whole order. Requests are sent in-process
+through httpx.ASGITransport.
+
+Usage:
+    python -m benchmarks.order_update --lines 500 --rounds 5
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+from sqlalchemy import select
+
+from app.db import get_session_maker
+from app.main import app
+from app.models import OrdersProducts
+from benchmarks.orders_batch import create_products
+
+
+async def line_ids(order_id: int) -> dict[int, int]:
+    """
+    Returns the line ID of each product of an order.
+    """
+    async with get_session_maker()() as session:
+        result = await session.execute(
+            select(OrdersProducts.product_id, OrdersProducts.id).filter(
+                OrdersProducts.order_id == order_id
+            )
+        )
+        return dict(result.tuples().all())
+
+
+async def main(lines: int, rounds: int) -> None:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=60
+    ) as client:
+        product_ids = await create_products(client, lines)
+        response = await client.post(
+            "/orders", json={"product_ids": product_ids, "amounts": [1] * lines}
+        )
+        response.raise_for_status()
+        order_id = response.json()
+        ids = await line_ids(order_id)
+
+        started = time.perf_counter()
+        for amount in range(2, rounds + 2):
+            for product_id in product_ids:
+                response = await client.put(
+                    f"/orders_products/{ids[product_id]}",
+                    json={
+                        "id": ids[product_id],
+                        "order_id": order_id,
+                        "product_id": product_id,
+                        "amount": amount,
+                    },
+                )
+                response.raise_for_status()
+        per_line = (time.perf_counter() - started) * 1000 / rounds
+
+        started = time.perf_counter()
+        for amount in range(rounds + 2, 2 * rounds + 2):
+            response = await client.put(
+                f"/orders/{order_id}",
+                json={"product_ids": product_ids, "amounts": [amount] * lines},
+            )
+            response.raise_for_status()
+        replaced = (time.perf_counter() - started) * 1000 / rounds
+
+        print(f"{'mode':<12}{'ms/edit':>10}{'requests':>10}")
+        print(f"{'per line':<12}{per_line:>10.1f}{lines:>10}")
+        print(f"{'replace':<12}{replaced:>10.1f}{1:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--lines", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.lines, args.rounds))
@@ -0,0 +1,78 @@
+"""
+Order creation throughput: looping "POST /orders" vs one "POST /orders-batch".
+
+Creates '--orders' orders of '--lines' lines each, once with one request per
+order ('--concurrency' at a time) and once with batches of '--batch-size'
+orders. Requests are sent in-process through httpx.ASGITransport.
+
+Usage:
+    python -m benchmarks.orders_batch --orders 2000 --lines 5 --batch-size 500
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from app.main import app
+
+
+async def create_products(client: httpx.AsyncClient, count: int) -> list[int]:
+    """
+    Creates 'count' products and returns their IDs.
+    """
+    response = await client.post(
+        "/products-batch",
+        json=[
+            {"product_name": f"Benchmark {i}", "price": 10, "cost": 5}
+            for i in range(count)
+        ],
+    )
+    response.raise_for_status()
+    # The newest products: the last page before an ID above all others.
+    listing = await client.get(
+        "/products", params={"page_size": count, "before_id": 2**62}
+    )
+    return [item["id"] for item in listing.json()["items"]]
+
+
+async def main(orders: int, lines: int, batch_size: int, concurrency: int) -> None:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=60
+    ) as client:
+        product_ids = await create_products(client, lines)
+        payload = {"product_ids": product_ids, "amounts": [1] * lines}
+
+        remaining = iter(range(orders))
+
+        async def worker() -> None:
+            for _ in remaining:
+                response = await client.post("/orders", json=payload)
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        single = orders / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        for offset in range(0, orders, batch_size):
+            count = min(batch_size, orders - offset)
+            response = await client.post("/orders-batch", json=[payload] * count)
+            response.raise_for_status()
+        batched = orders / (time.perf_counter() - started)
+
+    print(f"{'endpoint':<32}{'orders/s':>10}")
+    print(f"{'POST /orders':<32}{single:>10.0f}")
+    print(f"{f'POST /orders-batch ({batch_size})':<32}{batched:>10.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--lines", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.orders, args.lines, args.batch_size, args.concurrency))
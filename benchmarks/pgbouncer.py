@@ -0,0 +1,70 @@
+"""
+Transaction throughput directly against Postgres and through PgBouncer.
+
+Each worker runs short transactions with a primary-key lookup on "products",
+the typical OLTP query of the API. Measured setups:
+
+- direct: the default engine configuration against DB_HOST:DB_PORT.
+- direct, pgbouncer mode: DB_PGBOUNCER settings against DB_HOST:DB_PORT, showing
+  the cost of the compatibility mode itself (no statement cache, SET LOCAL).
+- pgbouncer: DB_PGBOUNCER settings against the given PgBouncer port.
+
+Usage:
+    python -m benchmarks.pgbouncer --transactions 20000 --concurrency 50 --pgbouncer-port 6432
+"""
+
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import text
+
+from app.config import settings
+from app.db import create_workload_engine
+
+
+async def measure(transactions: int, concurrency: int) -> float:
+    """
+    Runs 'transactions' lookups with 'concurrency' workers and returns transactions per second.
+    """
+    engine = create_workload_engine("oltp")
+    remaining = iter(range(transactions))
+
+    async def worker() -> None:
+        for number in remaining:
+            async with engine.begin() as connection:
+                await connection.execute(
+                    text("SELECT id, product_name FROM products WHERE id = :id"),
+                    {"id": number % 1000 + 1},
+                )
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))  # warm-up
+        remaining = iter(range(transactions))
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return transactions / (time.perf_counter() - started)
+    finally:
+        await engine.dispose()
+
+
+async def main(transactions: int, concurrency: int, pgbouncer_port: str | None) -> None:
+    setups = [("direct", False, settings.DB_PORT)]
+    setups.append(("direct, pgbouncer mode", True, settings.DB_PORT))
+    if pgbouncer_port:
+        setups.append(("pgbouncer", True, pgbouncer_port))
+
+    print(f"{'setup':<26}{'tx/s':>10}")
+    for name, pgbouncer, port in setups:
+        settings.DB_PGBOUNCER, settings.DB_PORT = pgbouncer, port
+        rate = await measure(transactions, concurrency)
+        print(f"{name:<26}{rate:>10.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--transactions", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--pgbouncer-port", default=None)
+    args = parser.parse_args()
+    asyncio.run(main(args.transactions, args.concurrency, args.pgbouncer_port))
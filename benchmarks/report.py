@@ -0,0 +1,172 @@
+"""
+"/reports-all" over order lines joined to products, over line price snapshots, and over order totals.
+
+Makes sure orders_products has at least '--lines' rows, then runs the report
+over the whole year '--runs' times, in turns with its two former queries: the
+first took price and cost from products, the second from the lines' price
+snapshots. Reports the median milliseconds of each.
+
+Usage:
+    python -m benchmarks.report --lines 1000000 --runs 20
+"""
+
+import argparse
+import asyncio
+from datetime import date, timedelta
+import statistics
+import time
+
+from sqlalchemy import text
+
+from app.crud import report_crud
+from app.db import get_engine, get_session_maker
+
+# The report as it was before the price snapshots.
+JOINED_REPORT = text(
+    """
+    SELECT
+        COALESCE((
+            SELECT SUM(op.amount * p.price)
+            FROM orders_products op
+            JOIN orders o ON op.order_id = o.id
+            JOIN products p ON op.product_id = p.id
+            WHERE o.created_at BETWEEN :start_date AND :end_date
+        ), 0) AS total_revenue,
+        COALESCE((
+            SELECT SUM(op.amount * (p.price - p.cost))
+            FROM orders_products op
+            JOIN orders o ON op.order_id = o.id
+            JOIN products p ON op.product_id = p.id
+            WHERE o.created_at BETWEEN :start_date AND :end_date
+        ), 0) AS total_profit,
+        COALESCE((
+            SELECT SUM(op.amount)
+            FROM orders_products op
+            JOIN orders o ON op.order_id = o.id
+            WHERE o.created_at BETWEEN :start_date AND :end_date
+        ), 0) AS total_units_sold,
+        COALESCE((
+            SELECT COUNT(*)
+            FROM orders o
+            WHERE o.created_at BETWEEN :start_date AND :end_date
+              AND o.id IN (
+                  SELECT op.order_id
+                  FROM orders_products op
+                  WHERE op.amount < 0
+              )
+        ), 0) AS total_returns
+    """
+)
+
+# The report over the lines' price snapshots, before the order totals.
+LINES_REPORT = text(
+    """
+    WITH lines AS (
+        SELECT
+            SUM(op.amount * op.unit_price) AS total_revenue,
+            SUM(op.amount * (op.unit_price - op.unit_cost)) AS total_profit,
+            SUM(op.amount) AS total_units_sold
+        FROM orders_products op
+        JOIN orders o ON op.order_id = o.id
+        WHERE o.created_at BETWEEN :start_date AND :end_date
+    )
+    SELECT
+        COALESCE(lines.total_revenue, 0) AS total_revenue,
+        COALESCE(lines.total_profit, 0) AS total_profit,
+        COALESCE(lines.total_units_sold, 0) AS total_units_sold,
+        COALESCE((
+            SELECT COUNT(*)
+            FROM orders o
+            WHERE o.created_at BETWEEN :start_date AND :end_date
+              AND o.id IN (
+                  SELECT op.order_id
+                  FROM orders_products op
+                  WHERE op.amount < 0
+              )
+        ), 0) AS total_returns
+    FROM lines
+    """
+)
+
+
+async def ensure_lines(count: int, lines_per_order: int = 4) -> None:
+    """
+    Inserts orders of the last year until orders_products has at least 'count' rows.
+    """
+    async with get_engine().begin() as connection:
+        await connection.execute(
+            text(
+                "INSERT INTO products (product_name, price, cost, stock) "
+                "SELECT 'Product ' || n, 10 + n % 90, 5 + n % 40, NULL "
+                "FROM generate_series(1, 1000 - (SELECT count(*) FROM products)) n"
+            )
+        )
+        missing = await connection.scalar(
+            text("SELECT :count - count(*) FROM orders_products"), {"count": count}
+        )
+        if missing <= 0:
+            return
+        await connection.execute(
+            text(
+                """
+                WITH catalog AS (
+                    SELECT array_agg(id) AS ids FROM (SELECT id FROM products LIMIT 1000) p
+                ), new_orders AS (
+                    INSERT INTO orders (created_at)
+                    SELECT now() - random() * interval '365 days'
+                    FROM generate_series(1, :orders)
+                    RETURNING id, created_at
+                )
+                INSERT INTO orders_products
+                    (order_id, product_id, amount, unit_price, unit_cost, created_at)
+                SELECT o.id, p.id, 1 + line % 5, p.price, p.cost, o.created_at
+                FROM new_orders o
+                CROSS JOIN generate_series(1, :lines_per_order) AS line
+                CROSS JOIN catalog
+                JOIN products p
+                    ON p.id = catalog.ids[1 + (o.id * 7 + line) % cardinality(catalog.ids)]
+                """
+            ),
+            {
+                "orders": -(-missing // lines_per_order),
+                "lines_per_order": lines_per_order,
+            },
+        )
+        await connection.execute(text("ANALYZE orders, orders_products, products"))
+
+
+async def main(lines: int, runs: int) -> None:
+    await ensure_lines(lines)
+    start_date = str(date.today() - timedelta(days=366))
+    end_date = str(date.today() + timedelta(days=1))
+    params = {
+        "start_date": date.fromisoformat(start_date),
+        "end_date": date.fromisoformat(end_date),
+    }
+    queries = {"joined": JOINED_REPORT, "lines": LINES_REPORT}
+    timings: dict[str, list[float]] = {name: [] for name in (*queries, "totals")}
+    reports = {}
+    async with get_session_maker("analytics")() as session:
+        for _ in range(runs):
+            for name, query in queries.items():
+                started = time.perf_counter()
+                reports[name] = (await session.execute(query, params)).mappings().one()
+                timings[name].append(time.perf_counter() - started)
+            started = time.perf_counter()
+            reports["totals"] = await report_crud.get_report(
+                session, start_date, end_date
+            )
+            timings["totals"].append(time.perf_counter() - started)
+
+    print(f"{'report':<12}{'median ms':>12}{'revenue':>16}")
+    for name, report in reports.items():
+        median = statistics.median(timings[name]) * 1000
+        print(f"{name:<12}{median:>12.1f}{report['total_revenue']:>16}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--lines", type=int, default=1_000_000)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.lines, args.runs))
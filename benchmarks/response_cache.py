@@ -0,0 +1,94 @@
+"""
+Cache hits of "/reports-all": fastapi-cache's @cache decorator vs the route response cache.
+
+The decorator stores the encoded result and, on every hit, decodes it and
+lets FastAPI validate and encode it again. The route response cache stores
+the final body and sends it as it is. Both use an in-memory store, so the
+numbers measure the application only; requests are sent in-process through
+httpx.ASGITransport.
+
+Usage:
+    python -m benchmarks.response_cache --requests 5000 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import time
+
+from fastapi import FastAPI, Request
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+from fastapi_cache.decorator import cache
+import httpx
+
+from app import cahce
+from app.cahce import MemoryResponseStore
+from app.crud import report_crud
+from app.midlewares import DBSessionMiddleware, setup_error_middleware
+from app.routers import report_router
+from app.schemas import ReportSchema
+
+PATH = "/reports-all?start_date=2023-01-01&end_date=2023-12-31"
+
+
+def build_app(legacy: bool) -> FastAPI:
+    """
+    Builds an application serving "/reports-all" with either cache.
+    """
+    app = FastAPI()
+    if legacy:
+
+        @app.get("/reports-all")
+        @cache(expire=60 * 30)
+        async def report(
+            request: Request, start_date: str, end_date: str
+        ) -> ReportSchema:
+            return await report_crud.get_report(
+                request.state.session, start_date, end_date
+            )
+
+    else:
+        app.include_router(report_router)
+    setup_error_middleware(app)
+    app.add_middleware(DBSessionMiddleware)
+    return app
+
+
+async def measure(app: FastAPI, requests: int, concurrency: int) -> float:
+    """
+    Sends 'requests' cached GET requests with 'concurrency' workers and returns requests per second.
+    """
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        remaining = iter(range(requests))
+
+        async def worker() -> None:
+            for _ in remaining:
+                response = await client.get(PATH)
+                response.raise_for_status()
+
+        await client.get(PATH)  # fills the cache
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return requests / (time.perf_counter() - started)
+
+
+async def main(requests: int, concurrency: int) -> None:
+    FastAPICache.init(InMemoryBackend(), prefix="fastapi-cache")
+    cahce.response_store = MemoryResponseStore(max_items=16)
+
+    before = await measure(build_app(legacy=True), requests, concurrency)
+    after = await measure(build_app(legacy=False), requests, concurrency)
+    print(f"{'cache':<24}{'hits per second':>16}")
+    print(f"{'fastapi-cache @cache':<24}{before:>16.0f}")
+    print(f"{'route response cache':<24}{after:>16.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
@@ -0,0 +1,144 @@
+"""
+Flash-sale contention: many concurrent "POST /orders" on the same few products.
+
+Creates '--hot-products' products with '--stock' units each and sends
+'--orders' orders of '--lines' of them, picked at random and in random order,
+with '--concurrency' in flight: once with each order in its own transaction
+and once with ORDER_BATCHING. Reports orders per second, latency percentiles,
+orders rejected for lack of stock, deadlocks counted by Postgres and units
+oversold (sold units beyond the stock taken, always expected to be 0).
+Requests are sent in-process through httpx.ASGITransport.
+
+Usage:
+    python -m benchmarks.stock_contention --orders 5000 --hot-products 3 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import httpx
+from sqlalchemy import text
+
+from app.config import settings
+from app.db import get_engine
+from app.main import app
+
+
+async def deadlocks() -> int:
+    """
+    Returns the number of deadlocks of the database so far.
+    """
+    async with get_engine().connect() as connection:
+        await connection.execute(text("SELECT pg_stat_clear_snapshot()"))
+        result = await connection.execute(
+            text(
+                "SELECT deadlocks FROM pg_stat_database WHERE datname = current_database()"
+            )
+        )
+        return result.scalar()
+
+
+async def create_products(
+    client: httpx.AsyncClient, count: int, stock: int
+) -> list[int]:
+    """
+    Creates 'count' products with 'stock' units each and returns their IDs.
+    """
+    return [
+        (
+            await client.post(
+                "/products",
+                json={
+                    "product_name": f"Hot {i}",
+                    "price": 10,
+                    "cost": 5,
+                    "stock": stock,
+                },
+            )
+        ).json()["id"]
+        for i in range(count)
+    ]
+
+
+async def stock_left(client: httpx.AsyncClient, product_ids: list[int]) -> int:
+    """
+    Returns the units left in stock over all products.
+    """
+    return sum(
+        [
+            (await client.get(f"/products/{product_id}")).json()["stock"]
+            for product_id in product_ids
+        ]
+    )
+
+
+async def measure(
+    client: httpx.AsyncClient, args: argparse.Namespace
+) -> tuple[float, list[float], int, int, int]:
+    """
+    Sends the orders against fresh hot products.
+
+    Returns:
+        tuple: Orders per second, latencies in ms, rejected orders, deadlocks and oversold units.
+    """
+    product_ids = await create_products(client, args.hot_products, args.stock)
+    remaining = iter(range(args.orders))
+    latencies: list[float] = []
+    sold = rejected = 0
+
+    async def worker() -> None:
+        nonlocal sold, rejected
+        for _ in remaining:
+            lines = random.sample(product_ids, args.lines)
+            payload = {"product_ids": lines, "amounts": [1] * len(lines)}
+            started = time.perf_counter()
+            response = await client.post("/orders", json=payload)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code == 201:
+                sold += len(lines)
+            else:
+                rejected += 1
+
+    await asyncio.sleep(1)
+    deadlocks_before = await deadlocks()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    rate = args.orders / (time.perf_counter() - started)
+    await asyncio.sleep(1)
+    taken = args.hot_products * args.stock - await stock_left(client, product_ids)
+    return rate, latencies, rejected, await deadlocks() - deadlocks_before, sold - taken
+
+
+async def main(args: argparse.Namespace) -> None:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", timeout=60
+    ) as client:
+        print(
+            f"{'mode':<10}{'orders/s':>10}{'p50 ms':>9}{'p99 ms':>9}"
+            f"{'rejected':>10}{'deadlocks':>11}{'oversold':>10}"
+        )
+        for batching in (False, True):
+            settings.ORDER_BATCHING = batching
+            rate, latencies, rejected, deadlocked, oversold = await measure(
+                client, args
+            )
+            p50, p99 = (statistics.quantiles(latencies, n=100)[i] for i in (49, 98))
+            mode = "batched" if batching else "single"
+            print(
+                f"{mode:<10}{rate:>10.0f}{p50:>9.1f}{p99:>9.1f}"
+                f"{rejected:>10}{deadlocked:>11}{oversold:>10}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--hot-products", type=int, default=3)
+    parser.add_argument("--lines", type=int, default=2)
+    parser.add_argument("--stock", type=int, default=1_000_000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,106 @@
+"""row_counts
+
+Revision ID: eae71177d196
+Revises: 18a499df26d0
+Create Date: 2026-10-18 09:10:12.418093
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "eae71177d196"
+down_revision: Union[str, None] = "18a499df26d0"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COUNTED_TABLES = ("orders", "products", "orders_products")
+
+
+def upgrade() -> None:
+    op.create_table(
+        "row_counts",
+        sa.Column("table_name", sa.String(length=63), nullable=False),
+        sa.Column("slot", sa.SmallInteger(), nullable=False),
+        sa.Column("row_count", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("table_name", "slot"),
+    )
+    # Statement-level triggers with transition tables: one counter update per
+    # statement, not per row. The slot is derived from the backend PID so that
+    # concurrent writers mostly touch different counter rows.
+    op.execute(
+        """CREATE OR REPLACE FUNCTION row_counts_add() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+    BEGIN
+        INSERT INTO row_counts (table_name, slot, row_count)
+        SELECT TG_TABLE_NAME, pg_backend_pid() % 16, count(*)
+        FROM new_rows
+        HAVING count(*) > 0
+        ON CONFLICT (table_name, slot)
+        DO UPDATE SET row_count = row_counts.row_count + EXCLUDED.row_count;
+        RETURN NULL;
+    END;
+    $$;"""
+    )
+    op.execute(
+        """CREATE OR REPLACE FUNCTION row_counts_subtract() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+    BEGIN
+        INSERT INTO row_counts (table_name, slot, row_count)
+        SELECT TG_TABLE_NAME, pg_backend_pid() % 16, -count(*)
+        FROM old_rows
+        HAVING count(*) > 0
+        ON CONFLICT (table_name, slot)
+        DO UPDATE SET row_count = row_counts.row_count + EXCLUDED.row_count;
+        RETURN NULL;
+    END;
+    $$;"""
+    )
+    op.execute(
+        """CREATE OR REPLACE FUNCTION row_counts_reset() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+    BEGIN
+        DELETE FROM row_counts WHERE table_name = TG_TABLE_NAME;
+        RETURN NULL;
+    END;
+    $$;"""
+    )
+    for table in COUNTED_TABLES:
+        op.execute(
+            f"""CREATE TRIGGER trg_{table}_count_insert
+        AFTER INSERT ON {table}
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION row_counts_add();"""
+        )
+        op.execute(
+            f"""CREATE TRIGGER trg_{table}_count_delete
+        AFTER DELETE ON {table}
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION row_counts_subtract();"""
+        )
+        op.execute(
+            f"""CREATE TRIGGER trg_{table}_count_truncate
+        AFTER TRUNCATE ON {table}
+        FOR EACH STATEMENT EXECUTE FUNCTION row_counts_reset();"""
+        )
+        op.execute(
+            f"""INSERT INTO row_counts (table_name, slot, row_count)
+        SELECT '{table}', 0, count(*) FROM {table};"""
+        )
+
+
+def downgrade() -> None:
+    for table in COUNTED_TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS trg_{table}_count_truncate ON {table};")
+        op.execute(f"DROP TRIGGER IF EXISTS trg_{table}_count_delete ON {table};")
+        op.execute(f"DROP TRIGGER IF EXISTS trg_{table}_count_insert ON {table};")
+    op.execute("DROP FUNCTION IF EXISTS row_counts_reset();")
+    op.execute("DROP FUNCTION IF EXISTS row_counts_subtract();")
+    op.execute("DROP FUNCTION IF EXISTS row_counts_add();")
+    op.drop_table("row_counts")
@@ -0,0 +1,135 @@
+"""set_based_create_order
+
+Revision ID: f593728ad56e
+Revises: eae71177d196
+Create Date: 2026-10-18 09:30:41.203518
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f593728ad56e"
+down_revision: Union[str, None] = "eae71177d196"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The products are validated with one primary key lookup and the lines are
+    # inserted with one statement, whatever the size of the order. Lines of the
+    # same product are merged. Only a failed validation runs the anti-join that
+    # lists the missing products. Without an EXCEPTION block the function runs
+    # without a subtransaction.
+    op.execute(
+        """CREATE OR REPLACE FUNCTION create_order_with_products(
+        p_product_ids BIGINT[],
+        p_amounts INT[],
+        p_order_created_at TIMESTAMP
+    )
+    RETURNS BIGINT
+    LANGUAGE plpgsql
+    AS $$
+    DECLARE
+        v_order_id BIGINT;
+        v_found_products INT;
+        v_missing_ids BIGINT[];
+    BEGIN
+        IF cardinality(p_product_ids) IS DISTINCT FROM cardinality(p_amounts) THEN
+            RAISE EXCEPTION 'The lengths of product_ids and amounts must match.';
+        END IF;
+
+        SELECT count(*) INTO v_found_products
+        FROM products
+        WHERE id = ANY (p_product_ids);
+
+        IF v_found_products < (
+            SELECT count(DISTINCT line.product_id)
+            FROM unnest(p_product_ids) AS line(product_id)
+        ) THEN
+            -- Report every unknown product at once
+            SELECT array_agg(DISTINCT line.product_id ORDER BY line.product_id)
+            INTO v_missing_ids
+            FROM unnest(p_product_ids) AS line(product_id)
+            WHERE NOT EXISTS (SELECT 1 FROM products WHERE id = line.product_id);
+
+            RAISE EXCEPTION 'Products with IDs % do not exist.', v_missing_ids
+                USING ERRCODE = 'foreign_key_violation';
+        END IF;
+
+        INSERT INTO orders (created_at)
+        VALUES (p_order_created_at)
+        RETURNING id INTO v_order_id;
+
+        INSERT INTO orders_products (order_id, product_id, amount, created_at)
+        SELECT v_order_id, line.product_id, sum(line.amount), p_order_created_at
+        FROM unnest(p_product_ids, p_amounts) AS line(product_id, amount)
+        GROUP BY line.product_id
+        ORDER BY line.product_id;
+
+        RETURN v_order_id;
+    END;
+    $$;"""
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        """CREATE OR REPLACE FUNCTION create_order_with_products(
+        p_product_ids BIGINT[],
+        p_amounts INT[],
+        p_order_created_at TIMESTAMP
+    )
+    RETURNS BIGINT
+    LANGUAGE plpgsql
+    AS $$
+    DECLARE
+        v_order_id BIGINT;
+        v_product_id BIGINT;
+        v_amount INT;
+        v_index INT := 1;
+        v_product_exists BOOLEAN;
+    BEGIN
+        -- Validate that the lengths of product_ids and amounts match
+        IF array_length(p_product_ids, 1) != array_length(p_amounts, 1) THEN
+            RAISE EXCEPTION 'The lengths of product_ids and amounts must match.';
+        END IF;
+
+        -- Insert a new order into the orders table
+        INSERT INTO orders (created_at)
+        VALUES (p_order_created_at)
+        RETURNING id INTO v_order_id;
+
+        -- Loop through the product IDs and amounts
+        WHILE v_index <= array_length(p_product_ids, 1) LOOP
+            v_product_id := p_product_ids[v_index];
+            v_amount := p_amounts[v_index];
+
+            -- Check if the product exists in the products table
+            SELECT EXISTS (SELECT 1 FROM products WHERE id = v_product_id)
+            INTO v_product_exists;
+
+            -- If the product does not exist, raise an exception
+            IF NOT v_product_exists THEN
+                RAISE EXCEPTION 'Product with ID % does not exist.', v_product_id;
+            END IF;
+
+            -- Insert into orders_products table
+            INSERT INTO orders_products (order_id, product_id, amount, created_at)
+            VALUES (v_order_id, v_product_id, v_amount, p_order_created_at);
+
+            -- Increment the index
+            v_index := v_index + 1;
+        END LOOP;
+
+        -- Return the newly created order ID
+        RETURN v_order_id;
+    EXCEPTION
+        -- Raise an exception in case of any error
+        WHEN OTHERS THEN
+            RAISE EXCEPTION 'Error creating order: %', SQLERRM;
+    END;
+    $$;"""
+    )
@@ -0,0 +1,100 @@
+"""create_orders_with_products
+
+Revision ID: 6c2d8e41b7a9
+Revises: f593728ad56e
+Create Date: 2026-10-18 09:50:07.518342
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "6c2d8e41b7a9"
+down_revision: Union[str, None] = "f593728ad56e"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Bulk counterpart of create_order_with_products. The lines of all orders
+    # come as three flat arrays; p_order_numbers holds the 1-based position of
+    # the line's order in the batch. The order IDs are drawn from the sequence
+    # up front, so the returned array maps positions to IDs without relying on
+    # the row order of INSERT ... RETURNING.
+    op.execute(
+        """CREATE OR REPLACE FUNCTION create_orders_with_products(
+        p_order_count INT,
+        p_order_numbers INT[],
+        p_product_ids BIGINT[],
+        p_amounts INT[],
+        p_order_created_at TIMESTAMP
+    )
+    RETURNS BIGINT[]
+    LANGUAGE plpgsql
+    AS $$
+    DECLARE
+        v_order_ids BIGINT[];
+        v_found_products INT;
+        v_missing_ids BIGINT[];
+    BEGIN
+        IF cardinality(p_order_numbers) IS DISTINCT FROM cardinality(p_product_ids)
+            OR cardinality(p_product_ids) IS DISTINCT FROM cardinality(p_amounts) THEN
+            RAISE EXCEPTION 'The lengths of order_numbers, product_ids and amounts must match.';
+        END IF;
+
+        IF EXISTS (
+            SELECT 1 FROM unnest(p_order_numbers) AS line(order_number)
+            WHERE line.order_number NOT BETWEEN 1 AND p_order_count
+        ) THEN
+            RAISE EXCEPTION 'Order numbers must be between 1 and %.', p_order_count;
+        END IF;
+
+        SELECT count(*) INTO v_found_products
+        FROM products
+        WHERE id = ANY (p_product_ids);
+
+        IF v_found_products < (
+            SELECT count(DISTINCT line.product_id)
+            FROM unnest(p_product_ids) AS line(product_id)
+        ) THEN
+            -- Report every unknown product at once
+            SELECT array_agg(DISTINCT line.product_id ORDER BY line.product_id)
+            INTO v_missing_ids
+            FROM unnest(p_product_ids) AS line(product_id)
+            WHERE NOT EXISTS (SELECT 1 FROM products WHERE id = line.product_id);
+
+            RAISE EXCEPTION 'Products with IDs % do not exist.', v_missing_ids
+                USING ERRCODE = 'foreign_key_violation';
+        END IF;
+
+        SELECT array_agg(nextval(pg_get_serial_sequence('orders', 'id')) ORDER BY n)
+        INTO v_order_ids
+        FROM generate_series(1, p_order_count) AS n;
+
+        INSERT INTO orders (id, created_at)
+        SELECT order_id, p_order_created_at
+        FROM unnest(v_order_ids) AS new_order(order_id);
+
+        INSERT INTO orders_products (order_id, product_id, amount, created_at)
+        SELECT
+            v_order_ids[line.order_number],
+            line.product_id,
+            sum(line.amount),
+            p_order_created_at
+        FROM unnest(p_order_numbers, p_product_ids, p_amounts)
+            AS line(order_number, product_id, amount)
+        GROUP BY line.order_number, line.product_id
+        ORDER BY line.order_number, line.product_id;
+
+        RETURN coalesce(v_order_ids, '{}');
+    END;
+    $$;"""
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        "DROP FUNCTION IF EXISTS create_orders_with_products(INT, INT[], BIGINT[], INT[], TIMESTAMP);"
+    )
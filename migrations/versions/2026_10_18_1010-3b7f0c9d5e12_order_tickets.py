@@ -0,0 +1,40 @@
+"""order_tickets
+
+Revision ID: 3b7f0c9d5e12
+Revises: 6c2d8e41b7a9
+Create Date: 2026-10-18 10:10:26.904117
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "3b7f0c9d5e12"
+down_revision: Union[str, None] = "6c2d8e41b7a9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Tickets of queued orders that were written, inserted in the transaction
+    # of the order itself: a redelivered queue entry whose ticket is already
+    # here is acknowledged without creating the order again.
+    op.create_table(
+        "order_tickets",
+        sa.Column("ticket", sa.Uuid(), nullable=False),
+        sa.Column("order_id", sa.BigInteger(), nullable=False),
+        sa.Column(
+            "created_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False
+        ),
+        sa.ForeignKeyConstraint(["order_id"], ["orders.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("ticket"),
+    )
+    op.create_index("idx_order_tickets_order_id", "order_tickets", ["order_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("idx_order_tickets_order_id", table_name="order_tickets")
+    op.drop_table("order_tickets")
@@ -0,0 +1,335 @@
+"""reserve_stock
+
+Revision ID: 9d4a61e2c8f3
+Revises: 3b7f0c9d5e12
+Create Date: 2026-10-18 10:30:52.117604
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "9d4a61e2c8f3"
+down_revision: Union[str, None] = "3b7f0c9d5e12"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Orders take their amounts from the stock of their products with one
+    # conditional UPDATE over all lines, after locking the products in ID
+    # order. A NULL stock is not tracked and never limits orders. When any
+    # product is short, the error lists all short products and the
+    # transaction, reservations included, is rolled back.
+    op.execute(
+        """CREATE OR REPLACE FUNCTION reserve_stock(
+        p_product_ids BIGINT[],
+        p_amounts INT[]
+    )
+    RETURNS VOID
+    LANGUAGE plpgsql
+    AS $$
+    DECLARE
+        v_stocked_products INT;
+        v_reserved_ids BIGINT[];
+        v_shortages TEXT;
+    BEGIN
+        -- Every order locks its products in ID order, so orders sharing
+        -- products queue behind each other instead of deadlocking.
+        SELECT count(*) INTO v_stocked_products
+        FROM (
+            SELECT id
+            FROM products
+            WHERE id = ANY (p_product_ids) AND stock IS NOT NULL
+            ORDER BY id
+            FOR NO KEY UPDATE
+        ) AS locked;
+
+        IF v_stocked_products = 0 THEN
+            RETURN;
+        END IF;
+
+        WITH reserved AS (
+            UPDATE products
+            SET stock = products.stock - wanted.amount
+            FROM (
+                SELECT line.product_id, sum(line.amount) AS amount
+                FROM unnest(p_product_ids, p_amounts) AS line(product_id, amount)
+                GROUP BY line.product_id
+            ) AS wanted
+            WHERE products.id = wanted.product_id
+                AND products.stock >= wanted.amount
+            RETURNING products.id
+        )
+        SELECT array_agg(id) INTO v_reserved_ids FROM reserved;
+
+        IF coalesce(cardinality(v_reserved_ids), 0) < v_stocked_products THEN
+            -- Report every short product at once
+            SELECT string_agg(
+                format('%s (requested %s, in stock %s)', products.id, wanted.amount, products.stock),
+                ', ' ORDER BY products.id
+            )
+            INTO v_shortages
+            FROM products
+            JOIN (
+                SELECT line.product_id, sum(line.amount) AS amount
+                FROM unnest(p_product_ids, p_amounts) AS line(product_id, amount)
+                GROUP BY line.product_id
+            ) AS wanted ON wanted.product_id = products.id
+            WHERE products.stock IS NOT NULL
+                AND products.id <> ALL (coalesce(v_reserved_ids, '{}'));
+
+            RAISE EXCEPTION 'Insufficient stock for products %.', v_shortages
+                USING ERRCODE = 'check_violation';
+        END IF;
+    END;
+    $$;"""
+    )
+    op.execute(
+        """CREATE OR REPLACE FUNCTION create_order_with_products(
+        p_product_ids BIGINT[],
+        p_amounts INT[],
+        p_order_created_at TIMESTAMP
+    )
+    RETURNS BIGINT
+    LANGUAGE plpgsql
+    AS $$
+    DECLARE
+        v_order_id BIGINT;
+        v_found_products INT;
+        v_missing_ids BIGINT[];
+    BEGIN
+        IF cardinality(p_product_ids) IS DISTINCT FROM cardinality(p_amounts) THEN
+            RAISE EXCEPTION 'The lengths of product_ids and amounts must match.';
+        END IF;
+
+        SELECT count(*) INTO v_found_products
+        FROM products
+        WHERE id = ANY (p_product_ids);
+
+        IF v_found_products < (
+            SELECT count(DISTINCT line.product_id)
+            FROM unnest(p_product_ids) AS line(product_id)
+        ) THEN
+            -- Report every unknown product at once
+            SELECT array_agg(DISTINCT line.product_id ORDER BY line.product_id)
+            INTO v_missing_ids
+            FROM unnest(p_product_ids) AS line(product_id)
+            WHERE NOT EXISTS (SELECT 1 FROM products WHERE id = line.product_id);
+
+            RAISE EXCEPTION 'Products with IDs % do not exist.', v_missing_ids
+                USING ERRCODE = 'foreign_key_violation';
+        END IF;
+
+        PERFORM reserve_stock(p_product_ids, p_amounts);
+
+        INSERT INTO orders (created_at)
+        VALUES (p_order_created_at)
+        RETURNING id INTO v_order_id;
+
+        INSERT INTO orders_products (order_id, product_id, amount, created_at)
+        SELECT v_order_id, line.product_id, sum(line.amount), p_order_created_at
+        FROM unnest(p_product_ids, p_amounts) AS line(product_id, amount)
+        GROUP BY line.product_id
+        ORDER BY line.product_id;
+
+        RETURN v_order_id;
+    END;
+    $$;"""
+    )
+    op.execute(
+        """CREATE OR REPLACE FUNCTION create_orders_with_products(
+        p_order_count INT,
+        p_order_numbers INT[],
+        p_product_ids BIGINT[],
+        p_amounts INT[],
+        p_order_created_at TIMESTAMP
+    )
+    RETURNS BIGINT[]
+    LANGUAGE plpgsql
+    AS $$
+    DECLARE
+        v_order_ids BIGINT[];
+        v_found_products INT;
+        v_missing_ids BIGINT[];
+    BEGIN
+        IF cardinality(p_order_numbers) IS DISTINCT FROM cardinality(p_product_ids)
+            OR cardinality(p_product_ids) IS DISTINCT FROM cardinality(p_amounts) THEN
+            RAISE EXCEPTION 'The lengths of order_numbers, product_ids and amounts must match.';
+        END IF;
+
+        IF EXISTS (
+            SELECT 1 FROM unnest(p_order_numbers) AS line(order_number)
+            WHERE line.order_number NOT BETWEEN 1 AND p_order_count
+        ) THEN
+            RAISE EXCEPTION 'Order numbers must be between 1 and %.', p_order_count;
+        END IF;
+
+        SELECT count(*) INTO v_found_products
+        FROM products
+        WHERE id = ANY (p_product_ids);
+
+        IF v_found_products < (
+            SELECT count(DISTINCT line.product_id)
+            FROM unnest(p_product_ids) AS line(product_id)
+        ) THEN
+            -- Report every unknown product at once
+            SELECT array_agg(DISTINCT line.product_id ORDER BY line.product_id)
+            INTO v_missing_ids
+            FROM unnest(p_product_ids) AS line(product_id)
+            WHERE NOT EXISTS (SELECT 1 FROM products WHERE id = line.product_id);
+
+            RAISE EXCEPTION 'Products with IDs % do not exist.', v_missing_ids
+                USING ERRCODE = 'foreign_key_violation';
+        END IF;
+
+        PERFORM reserve_stock(p_product_ids, p_amounts);
+
+        SELECT array_agg(nextval(pg_get_serial_sequence('orders', 'id')) ORDER BY n)
+        INTO v_order_ids
+        FROM generate_series(1, p_order_count) AS n;
+
+        INSERT INTO orders (id, created_at)
+        SELECT order_id, p_order_created_at
+        FROM unnest(v_order_ids) AS new_order(order_id);
+
+        INSERT INTO orders_products (order_id, product_id, amount, created_at)
+        SELECT
+            v_order_ids[line.order_number],
+            line.product_id,
+            sum(line.amount),
+            p_order_created_at
+        FROM unnest(p_order_numbers, p_product_ids, p_amounts)
+            AS line(order_number, product_id, amount)
+        GROUP BY line.order_number, line.product_id
+        ORDER BY line.order_number, line.product_id;
+
+        RETURN coalesce(v_order_ids, '{}');
+    END;
+    $$;"""
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        """CREATE OR REPLACE FUNCTION create_order_with_products(
+        p_product_ids BIGINT[],
+        p_amounts INT[],
+        p_order_created_at TIMESTAMP
+    )
+    RETURNS BIGINT
+    LANGUAGE plpgsql
+    AS $$
+    DECLARE
+        v_order_id BIGINT;
+        v_found_products INT;
+        v_missing_ids BIGINT[];
+    BEGIN
+        IF cardinality(p_product_ids) IS DISTINCT FROM cardinality(p_amounts) THEN
+            RAISE EXCEPTION 'The lengths of product_ids and amounts must match.';
+        END IF;
+
+        SELECT count(*) INTO v_found_products
+        FROM products
+        WHERE id = ANY (p_product_ids);
+
+        IF v_found_products < (
+            SELECT count(DISTINCT line.product_id)
+            FROM unnest(p_product_ids) AS line(product_id)
+        ) THEN
+            -- Report every unknown product at once
+            SELECT array_agg(DISTINCT line.product_id ORDER BY line.product_id)
+            INTO v_missing_ids
+            FROM unnest(p_product_ids) AS line(product_id)
+            WHERE NOT EXISTS (SELECT 1 FROM products WHERE id = line.product_id);
+
+            RAISE EXCEPTION 'Products with IDs % do not exist.', v_missing_ids
+                USING ERRCODE = 'foreign_key_violation';
+        END IF;
+
+        INSERT INTO orders (created_at)
+        VALUES (p_order_created_at)
+        RETURNING id INTO v_order_id;
+
+        INSERT INTO orders_products (order_id, product_id, amount, created_at)
+        SELECT v_order_id, line.product_id, sum(line.amount), p_order_created_at
+        FROM unnest(p_product_ids, p_amounts) AS line(product_id, amount)
+        GROUP BY line.product_id
+        ORDER BY line.product_id;
+
+        RETURN v_order_id;
+    END;
+    $$;"""
+    )
+    op.execute(
+        """CREATE OR REPLACE FUNCTION create_orders_with_products(
+        p_order_count INT,
+        p_order_numbers INT[],
+        p_product_ids BIGINT[],
+        p_amounts INT[],
+        p_order_created_at TIMESTAMP
+    )
+    RETURNS BIGINT[]
+    LANGUAGE plpgsql
+    AS $$
+    DECLARE
+        v_order_ids BIGINT[];
+        v_found_products INT;
+        v_missing_ids BIGINT[];
+    BEGIN
+        IF cardinality(p_order_numbers) IS DISTINCT FROM cardinality(p_product_ids)
+            OR cardinality(p_product_ids) IS DISTINCT FROM cardinality(p_amounts) THEN
+            RAISE EXCEPTION 'The lengths of order_numbers, product_ids and amounts must match.';
+        END IF;
+
+        IF EXISTS (
+            SELECT 1 FROM unnest(p_order_numbers) AS line(order_number)
+            WHERE line.order_number NOT BETWEEN 1 AND p_order_count
+        ) THEN
+            RAISE EXCEPTION 'Order numbers must be between 1 and %.', p_order_count;
+        END IF;
+
+        SELECT count(*) INTO v_found_products
+        FROM products
+        WHERE id = ANY (p_product_ids);
+
+        IF v_found_products < (
+            SELECT count(DISTINCT line.product_id)
+            FROM unnest(p_product_ids) AS line(product_id)
+        ) THEN
+            -- Report every unknown product at once
+            SELECT array_agg(DISTINCT line.product_id ORDER BY line.product_id)
+            INTO v_missing_ids
+            FROM unnest(p_product_ids) AS line(product_id)
+            WHERE NOT EXISTS (SELECT 1 FROM products WHERE id = line.product_id);
+
+            RAISE EXCEPTION 'Products with IDs % do not exist.', v_missing_ids
+                USING ERRCODE = 'foreign_key_violation';
+        END IF;
+
+        SELECT array_agg(nextval(pg_get_serial_sequence('orders', 'id')) ORDER BY n)
+        INTO v_order_ids
+        FROM generate_series(1, p_order_count) AS n;
+
+        INSERT INTO orders (id, created_at)
+        SELECT order_id, p_order_created_at
+        FROM unnest(v_order_ids) AS new_order(order_id);
+
+        INSERT INTO orders_products (order_id, product_id, amount, created_at)
+        SELECT
+            v_order_ids[line.order_number],
+            line.product_id,
+            sum(line.amount),
+            p_order_created_at
+        FROM unnest(p_order_numbers, p_product_ids, p_amounts)
+            AS line(order_number, product_id, amount)
+        GROUP BY line.order_number, line.product_id
+        ORDER BY line.order_number, line.product_id;
+
+        RETURN coalesce(v_order_ids, '{}');
+    END;
+    $$;"""
+    )
+    op.execute("DROP FUNCTION IF EXISTS reserve_stock(BIGINT[], INT[]);")
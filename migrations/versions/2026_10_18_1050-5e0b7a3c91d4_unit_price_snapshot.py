@@ -0,0 +1,362 @@
+"""unit_price_snapshot
+
+Revision ID: 5e0b7a3c91d4
+Revises: 9d4a61e2c8f3
+Create Date: 2026-10-18 10:50:13.468295
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "5e0b7a3c91d4"
+down_revision: Union[str, None] = "9d4a61e2c8f3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Rows of orders_products, by ID range, updated per backfill transaction.
+BACKFILL_BATCH_SIZE = 10_000
+
+
+def upgrade() -> None:
+    # The backfill below commits as it goes, and so does everything before it.
+    # The DDL is idempotent, so an interrupted upgrade can simply be rerun.
+    # Triggers are dropped and created again rather than created with
+    # CREATE OR REPLACE TRIGGER, which needs PostgreSQL 14.
+    op.execute(
+        """ALTER TABLE orders_products
+        ADD COLUMN IF NOT EXISTS unit_price NUMERIC(15, 2),
+        ADD COLUMN IF NOT EXISTS unit_cost NUMERIC(15, 2)"""
+    )
+
+    # The order creation functions fill the snapshot themselves; the triggers
+    # cover lines written through /orders_products, and lines moved to
+    # another product.
+    op.execute(
+        """CREATE OR REPLACE FUNCTION orders_products_snapshot_prices() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+    BEGIN
+        SELECT price, cost INTO NEW.unit_price, NEW.unit_cost
+        FROM products
+        WHERE id = NEW.product_id;
+        RETURN NEW;
+    END;
+    $$;"""
+    )
+    op.execute(
+        "DROP TRIGGER IF EXISTS trg_orders_products_snapshot_insert ON orders_products;"
+    )
+    op.execute(
+        """CREATE TRIGGER trg_orders_products_snapshot_insert
+        BEFORE INSERT ON orders_products
+        FOR EACH ROW WHEN (NEW.unit_price IS NULL)
+        EXECUTE FUNCTION orders_products_snapshot_prices();"""
+    )
+    op.execute(
+        "DROP TRIGGER IF EXISTS trg_orders_products_snapshot_update ON orders_products;"
+    )
+    op.execute(
+        """CREATE TRIGGER trg_orders_products_snapshot_update
+        BEFORE UPDATE OF product_id ON orders_products
+        FOR EACH ROW WHEN (NEW.product_id IS DISTINCT FROM OLD.product_id)
+        EXECUTE FUNCTION orders_products_snapshot_prices();"""
+    )
+    op.execute(
+        """CREATE OR REPLACE FUNCTION create_order_with_products(
+        p_product_ids BIGINT[],
+        p_amounts INT[],
+        p_order_created_at TIMESTAMP
+    )
+    RETURNS BIGINT
+    LANGUAGE plpgsql
+    AS $$
+    DECLARE
+        v_order_id BIGINT;
+        v_found_products INT;
+        v_missing_ids BIGINT[];
+    BEGIN
+        IF cardinality(p_product_ids) IS DISTINCT FROM cardinality(p_amounts) THEN
+            RAISE EXCEPTION 'The lengths of product_ids and amounts must match.';
+        END IF;
+
+        SELECT count(*) INTO v_found_products
+        FROM products
+        WHERE id = ANY (p_product_ids);
+
+        IF v_found_products < (
+            SELECT count(DISTINCT line.product_id)
+            FROM unnest(p_product_ids) AS line(product_id)
+        ) THEN
+            -- Report every unknown product at once
+            SELECT array_agg(DISTINCT line.product_id ORDER BY line.product_id)
+            INTO v_missing_ids
+            FROM unnest(p_product_ids) AS line(product_id)
+            WHERE NOT EXISTS (SELECT 1 FROM products WHERE id = line.product_id);
+
+            RAISE EXCEPTION 'Products with IDs % do not exist.', v_missing_ids
+                USING ERRCODE = 'foreign_key_violation';
+        END IF;
+
+        PERFORM reserve_stock(p_product_ids, p_amounts);
+
+        INSERT INTO orders (created_at)
+        VALUES (p_order_created_at)
+        RETURNING id INTO v_order_id;
+
+        INSERT INTO orders_products (
+            order_id, product_id, amount, unit_price, unit_cost, created_at
+        )
+        SELECT
+            v_order_id,
+            line.product_id,
+            sum(line.amount),
+            products.price,
+            products.cost,
+            p_order_created_at
+        FROM unnest(p_product_ids, p_amounts) AS line(product_id, amount)
+        JOIN products ON products.id = line.product_id
+        GROUP BY line.product_id, products.id
+        ORDER BY line.product_id;
+
+        RETURN v_order_id;
+    END;
+    $$;"""
+    )
+    op.execute(
+        """CREATE OR REPLACE FUNCTION create_orders_with_products(
+        p_order_count INT,
+        p_order_numbers INT[],
+        p_product_ids BIGINT[],
+        p_amounts INT[],
+        p_order_created_at TIMESTAMP
+    )
+    RETURNS BIGINT[]
+    LANGUAGE plpgsql
+    AS $$
+    DECLARE
+        v_order_ids BIGINT[];
+        v_found_products INT;
+        v_missing_ids BIGINT[];
+    BEGIN
+        IF cardinality(p_order_numbers) IS DISTINCT FROM cardinality(p_product_ids)
+            OR cardinality(p_product_ids) IS DISTINCT FROM cardinality(p_amounts) THEN
+            RAISE EXCEPTION 'The lengths of order_numbers, product_ids and amounts must match.';
+        END IF;
+
+        IF EXISTS (
+            SELECT 1 FROM unnest(p_order_numbers) AS line(order_number)
+            WHERE line.order_number NOT BETWEEN 1 AND p_order_count
+        ) THEN
+            RAISE EXCEPTION 'Order numbers must be between 1 and %.', p_order_count;
+        END IF;
+
+        SELECT count(*) INTO v_found_products
+        FROM products
+        WHERE id = ANY (p_product_ids);
+
+        IF v_found_products < (
+            SELECT count(DISTINCT line.product_id)
+            FROM unnest(p_product_ids) AS line(product_id)
+        ) THEN
+            -- Report every unknown product at once
+            SELECT array_agg(DISTINCT line.product_id ORDER BY line.product_id)
+            INTO v_missing_ids
+            FROM unnest(p_product_ids) AS line(product_id)
+            WHERE NOT EXISTS (SELECT 1 FROM products WHERE id = line.product_id);
+
+            RAISE EXCEPTION 'Products with IDs % do not exist.', v_missing_ids
+                USING ERRCODE = 'foreign_key_violation';
+        END IF;
+
+        PERFORM reserve_stock(p_product_ids, p_amounts);
+
+        SELECT array_agg(nextval(pg_get_serial_sequence('orders', 'id')) ORDER BY n)
+        INTO v_order_ids
+        FROM generate_series(1, p_order_count) AS n;
+
+        INSERT INTO orders (id, created_at)
+        SELECT order_id, p_order_created_at
+        FROM unnest(v_order_ids) AS new_order(order_id);
+
+        INSERT INTO orders_products (
+            order_id, product_id, amount, unit_price, unit_cost, created_at
+        )
+        SELECT
+            v_order_ids[line.order_number],
+            line.product_id,
+            sum(line.amount),
+            products.price,
+            products.cost,
+            p_order_created_at
+        FROM unnest(p_order_numbers, p_product_ids, p_amounts)
+            AS line(order_number, product_id, amount)
+        JOIN products ON products.id = line.product_id
+        GROUP BY line.order_number, line.product_id, products.id
+        ORDER BY line.order_number, line.product_id;
+
+        RETURN coalesce(v_order_ids, '{}');
+    END;
+    $$;"""
+    )
+
+    # Existing lines get the current price and cost, their original ones
+    # are not known. Each batch is committed on its own, so rows are locked
+    # only briefly; rerunning an interrupted upgrade skips the lines that
+    # already have a price.
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        max_id = connection.execute(
+            sa.text("SELECT coalesce(max(id), 0) FROM orders_products")
+        ).scalar()
+        for start in range(0, max_id, BACKFILL_BATCH_SIZE):
+            connection.execute(
+                sa.text(
+                    """UPDATE orders_products
+                    SET unit_price = products.price, unit_cost = products.cost
+                    FROM products
+                    WHERE products.id = orders_products.product_id
+                        AND orders_products.id > :start
+                        AND orders_products.id <= :end
+                        AND orders_products.unit_price IS NULL"""
+                ),
+                {"start": start, "end": start + BACKFILL_BATCH_SIZE},
+            )
+
+
+def downgrade() -> None:
+    op.execute(
+        """CREATE OR REPLACE FUNCTION create_order_with_products(
+        p_product_ids BIGINT[],
+        p_amounts INT[],
+        p_order_created_at TIMESTAMP
+    )
+    RETURNS BIGINT
+    LANGUAGE plpgsql
+    AS $$
+    DECLARE
+        v_order_id BIGINT;
+        v_found_products INT;
+        v_missing_ids BIGINT[];
+    BEGIN
+        IF cardinality(p_product_ids) IS DISTINCT FROM cardinality(p_amounts) THEN
+            RAISE EXCEPTION 'The lengths of product_ids and amounts must match.';
+        END IF;
+
+        SELECT count(*) INTO v_found_products
+        FROM products
+        WHERE id = ANY (p_product_ids);
+
+        IF v_found_products < (
+            SELECT count(DISTINCT line.product_id)
+            FROM unnest(p_product_ids) AS line(product_id)
+        ) THEN
+            -- Report every unknown product at once
+            SELECT array_agg(DISTINCT line.product_id ORDER BY line.product_id)
+            INTO v_missing_ids
+            FROM unnest(p_product_ids) AS line(product_id)
+            WHERE NOT EXISTS (SELECT 1 FROM products WHERE id = line.product_id);
+
+            RAISE EXCEPTION 'Products with IDs % do not exist.', v_missing_ids
+                USING ERRCODE = 'foreign_key_violation';
+        END IF;
+
+        PERFORM reserve_stock(p_product_ids, p_amounts);
+
+        INSERT INTO orders (created_at)
+        VALUES (p_order_created_at)
+        RETURNING id INTO v_order_id;
+
+        INSERT INTO orders_products (order_id, product_id, amount, created_at)
+        SELECT v_order_id, line.product_id, sum(line.amount), p_order_created_at
+        FROM unnest(p_product_ids, p_amounts) AS line(product_id, amount)
+        GROUP BY line.product_id
+        ORDER BY line.product_id;
+
+        RETURN v_order_id;
+    END;
+    $$;"""
+    )
+    op.execute(
+        """CREATE OR REPLACE FUNCTION create_orders_with_products(
+        p_order_count INT,
+        p_order_numbers INT[],
+        p_product_ids BIGINT[],
+        p_amounts INT[],
+        p_order_created_at TIMESTAMP
+    )
+    RETURNS BIGINT[]
+    LANGUAGE plpgsql
+    AS $$
+    DECLARE
+        v_order_ids BIGINT[];
+        v_found_products INT;
+        v_missing_ids BIGINT[];
+    BEGIN
+        IF cardinality(p_order_numbers) IS DISTINCT FROM cardinality(p_product_ids)
+            OR cardinality(p_product_ids) IS DISTINCT FROM cardinality(p_amounts) THEN
+            RAISE EXCEPTION 'The lengths of order_numbers, product_ids and amounts must match.';
+        END IF;
+
+        IF EXISTS (
+            SELECT 1 FROM unnest(p_order_numbers) AS line(order_number)
+            WHERE line.order_number NOT BETWEEN 1 AND p_order_count
+        ) THEN
+            RAISE EXCEPTION 'Order numbers must be between 1 and %.', p_order_count;
+        END IF;
+
+        SELECT count(*) INTO v_found_products
+        FROM products
+        WHERE id = ANY (p_product_ids);
+
+        IF v_found_products < (
+            SELECT count(DISTINCT line.product_id)
+            FROM unnest(p_product_ids) AS line(product_id)
+        ) THEN
+            -- Report every unknown product at once
+            SELECT array_agg(DISTINCT line.product_id ORDER BY line.product_id)
+            INTO v_missing_ids
+            FROM unnest(p_product_ids) AS line(product_id)
+            WHERE NOT EXISTS (SELECT 1 FROM products WHERE id = line.product_id);
+
+            RAISE EXCEPTION 'Products with IDs % do not exist.', v_missing_ids
+                USING ERRCODE = 'foreign_key_violation';
+        END IF;
+
+        PERFORM reserve_stock(p_product_ids, p_amounts);
+
+        SELECT array_agg(nextval(pg_get_serial_sequence('orders', 'id')) ORDER BY n)
+        INTO v_order_ids
+        FROM generate_series(1, p_order_count) AS n;
+
+        INSERT INTO orders (id, created_at)
+        SELECT order_id, p_order_created_at
+        FROM unnest(v_order_ids) AS new_order(order_id);
+
+        INSERT INTO orders_products (order_id, product_id, amount, created_at)
+        SELECT
+            v_order_ids[line.order_number],
+            line.product_id,
+            sum(line.amount),
+            p_order_created_at
+        FROM unnest(p_order_numbers, p_product_ids, p_amounts)
+            AS line(order_number, product_id, amount)
+        GROUP BY line.order_number, line.product_id
+        ORDER BY line.order_number, line.product_id;
+
+        RETURN coalesce(v_order_ids, '{}');
+    END;
+    $$;"""
+    )
+    op.execute(
+        "DROP TRIGGER IF EXISTS trg_orders_products_snapshot_update ON orders_products;"
+    )
+    op.execute(
+        "DROP TRIGGER IF EXISTS trg_orders_products_snapshot_insert ON orders_products;"
+    )
+    op.execute("DROP FUNCTION IF EXISTS orders_products_snapshot_prices();")
+    op.drop_column("orders_products", "unit_cost")
+    op.drop_column("orders_products", "unit_price")
@@ -0,0 +1,256 @@
+"""order_totals
+
+Revision ID: b1c5e8f04a27
+Revises: 5e0b7a3c91d4
+Create Date: 2026-10-18 11:10:38.850241
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "b1c5e8f04a27"
+down_revision: Union[str, None] = "5e0b7a3c91d4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Orders, by ID range, recomputed per backfill transaction.
+BACKFILL_BATCH_SIZE = 10_000
+
+# Per-order totals of a set of order lines.
+LINE_TOTALS = """
+            sum(amount * unit_price) AS revenue,
+            sum(amount * unit_cost) AS cost,
+            sum(amount) AS units,
+            count(*) AS line_count,
+            bool_or(amount < 0) AS has_return"""
+
+
+def upgrade() -> None:
+    op.add_column(
+        "orders",
+        sa.Column(
+            "total_revenue",
+            sa.DECIMAL(precision=20, scale=2),
+            server_default="0",
+            nullable=False,
+        ),
+    )
+    op.add_column(
+        "orders",
+        sa.Column(
+            "total_cost",
+            sa.DECIMAL(precision=20, scale=2),
+            server_default="0",
+            nullable=False,
+        ),
+    )
+    op.add_column(
+        "orders",
+        sa.Column("total_units", sa.BigInteger(), server_default="0", nullable=False),
+    )
+    op.add_column(
+        "orders",
+        sa.Column("line_count", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.add_column(
+        "orders",
+        sa.Column(
+            "has_return", sa.Boolean(), server_default=sa.false(), nullable=False
+        ),
+    )
+    op.create_index("idx_orders_created_at", "orders", ["created_at"])
+    op.create_index(
+        "idx_orders_returns",
+        "orders",
+        ["created_at"],
+        postgresql_where=sa.text("has_return"),
+    )
+
+    # Statement-level triggers with transition tables apply the lines changed
+    # by a statement to their orders with one UPDATE. Sums and counts move by
+    # deltas; has_return is only looked up again when a returned line goes.
+    op.execute(
+        f"""CREATE OR REPLACE FUNCTION orders_totals_add() RETURNS trigger
+        LANGUAGE plpgsql
+        AS $$
+        BEGIN
+            UPDATE orders
+            SET total_revenue = orders.total_revenue + coalesce(lines.revenue, 0),
+                total_cost = orders.total_cost + coalesce(lines.cost, 0),
+                total_units = orders.total_units + coalesce(lines.units, 0),
+                line_count = orders.line_count + lines.line_count,
+                has_return = orders.has_return OR coalesce(lines.has_return, false)
+            FROM (
+                SELECT order_id,{LINE_TOTALS}
+                FROM new_rows
+                GROUP BY order_id
+            ) AS lines
+            WHERE orders.id = lines.order_id;
+            RETURN NULL;
+        END;
+        $$;"""
+    )
+    op.execute(
+        f"""CREATE OR REPLACE FUNCTION orders_totals_subtract() RETURNS trigger
+        LANGUAGE plpgsql
+        AS $$
+        BEGIN
+            UPDATE orders
+            SET total_revenue = orders.total_revenue - coalesce(lines.revenue, 0),
+                total_cost = orders.total_cost - coalesce(lines.cost, 0),
+                total_units = orders.total_units - coalesce(lines.units, 0),
+                line_count = orders.line_count - lines.line_count,
+                has_return = CASE WHEN lines.has_return THEN EXISTS (
+                    SELECT 1 FROM orders_products
+                    WHERE orders_products.order_id = orders.id AND orders_products.amount < 0
+                ) ELSE orders.has_return END
+            FROM (
+                SELECT order_id,{LINE_TOTALS}
+                FROM old_rows
+                GROUP BY order_id
+            ) AS lines
+            WHERE orders.id = lines.order_id;
+            RETURN NULL;
+        END;
+        $$;"""
+    )
+    op.execute(
+        """CREATE OR REPLACE FUNCTION orders_totals_change() RETURNS trigger
+        LANGUAGE plpgsql
+        AS $$
+        BEGIN
+            UPDATE orders
+            SET total_revenue = orders.total_revenue + coalesce(lines.revenue, 0),
+                total_cost = orders.total_cost + coalesce(lines.cost, 0),
+                total_units = orders.total_units + coalesce(lines.units, 0),
+                line_count = orders.line_count + lines.line_count,
+                has_return = CASE WHEN lines.has_return THEN EXISTS (
+                    SELECT 1 FROM orders_products
+                    WHERE orders_products.order_id = orders.id AND orders_products.amount < 0
+                ) ELSE orders.has_return END
+            FROM (
+                SELECT
+                    order_id,
+                    sum(revenue) AS revenue,
+                    sum(cost) AS cost,
+                    sum(units) AS units,
+                    sum(line_count) AS line_count,
+                    bool_or(has_return) AS has_return
+                FROM (
+                    SELECT
+                        order_id,
+                        amount * unit_price AS revenue,
+                        amount * unit_cost AS cost,
+                        amount AS units,
+                        1 AS line_count,
+                        amount < 0 AS has_return
+                    FROM new_rows
+                    UNION ALL
+                    SELECT
+                        order_id,
+                        -amount * unit_price,
+                        -amount * unit_cost,
+                        -amount,
+                        -1,
+                        amount < 0
+                    FROM old_rows
+                ) AS changed
+                GROUP BY order_id
+            ) AS lines
+            WHERE orders.id = lines.order_id;
+            RETURN NULL;
+        END;
+        $$;"""
+    )
+    op.execute(
+        """CREATE OR REPLACE FUNCTION orders_totals_reset() RETURNS trigger
+        LANGUAGE plpgsql
+        AS $$
+        BEGIN
+            UPDATE orders
+            SET total_revenue = 0, total_cost = 0, total_units = 0, line_count = 0, has_return = false
+            WHERE line_count <> 0 OR has_return;
+            RETURN NULL;
+        END;
+        $$;"""
+    )
+    op.execute(
+        """CREATE TRIGGER trg_orders_products_totals_insert
+        AFTER INSERT ON orders_products
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION orders_totals_add();"""
+    )
+    op.execute(
+        """CREATE TRIGGER trg_orders_products_totals_delete
+        AFTER DELETE ON orders_products
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION orders_totals_subtract();"""
+    )
+    op.execute(
+        """CREATE TRIGGER trg_orders_products_totals_update
+        AFTER UPDATE ON orders_products
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION orders_totals_change();"""
+    )
+    op.execute(
+        """CREATE TRIGGER trg_orders_products_totals_truncate
+        AFTER TRUNCATE ON orders_products
+        FOR EACH STATEMENT EXECUTE FUNCTION orders_totals_reset();"""
+    )
+
+    # The triggers are live, so each batch first locks its orders: lines
+    # committed before are then all visible to the recomputation, and lines
+    # committed later are added by the triggers. Each batch is committed on
+    # its own.
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        max_id = connection.execute(
+            sa.text("SELECT coalesce(max(id), 0) FROM orders")
+        ).scalar()
+        for start in range(0, max_id, BACKFILL_BATCH_SIZE):
+            end = start + BACKFILL_BATCH_SIZE
+            connection.execute(
+                sa.text(
+                    f"""DO $$
+                    BEGIN
+                        PERFORM 1 FROM orders WHERE id > {start} AND id <= {end} FOR UPDATE;
+
+                        UPDATE orders
+                        SET total_revenue = coalesce(lines.revenue, 0),
+                            total_cost = coalesce(lines.cost, 0),
+                            total_units = coalesce(lines.units, 0),
+                            line_count = lines.line_count,
+                            has_return = coalesce(lines.has_return, false)
+                        FROM (
+                            SELECT order_id,{LINE_TOTALS}
+                            FROM orders_products
+                            WHERE order_id > {start} AND order_id <= {end}
+                            GROUP BY order_id
+                        ) AS lines
+                        WHERE orders.id = lines.order_id;
+                    END;
+                    $$;"""
+                )
+            )
+
+
+def downgrade() -> None:
+    for operation in ("truncate", "update", "delete", "insert"):
+        op.execute(
+            f"DROP TRIGGER IF EXISTS trg_orders_products_totals_{operation} ON orders_products;"
+        )
+    op.execute("DROP FUNCTION IF EXISTS orders_totals_reset();")
+    op.execute("DROP FUNCTION IF EXISTS orders_totals_change();")
+    op.execute("DROP FUNCTION IF EXISTS orders_totals_subtract();")
+    op.execute("DROP FUNCTION IF EXISTS orders_totals_add();")
+    op.drop_index("idx_orders_returns", table_name="orders")
+    op.drop_index("idx_orders_created_at", table_name="orders")
+    op.drop_column("orders", "has_return")
+    op.drop_column("orders", "line_count")
+    op.drop_column("orders", "total_units")
+    op.drop_column("orders", "total_cost")
+    op.drop_column("orders", "total_revenue")
@@ -0,0 +1,140 @@
+"""replace_order_products
+
+Revision ID: c47d9e2a6b15
+Revises: b1c5e8f04a27
+Create Date: 2026-10-18 11:30:21.530786
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c47d9e2a6b15"
+down_revision: Union[str, None] = "b1c5e8f04a27"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Replaces the lines of an order with the requested ones. Only the
+    # differences to the current lines reserve or give back stock, and the
+    # lines are changed by one statement: lines of products no longer wanted
+    # are deleted, changed amounts updated and new products inserted with the
+    # price snapshot of now. Kept lines keep their snapshot. MERGE cannot
+    # delete rows missing from its source before Postgres 17, so the three
+    # changes are data-modifying CTEs of one statement.
+    op.execute(
+        """CREATE OR REPLACE FUNCTION replace_order_products(
+        p_order_id BIGINT,
+        p_product_ids BIGINT[],
+        p_amounts INT[]
+    )
+    RETURNS TIMESTAMP
+    LANGUAGE plpgsql
+    AS $$
+    DECLARE
+        v_order_created_at TIMESTAMP;
+        v_found_products INT;
+        v_missing_ids BIGINT[];
+        v_changed_ids BIGINT[];
+        v_changed_amounts INT[];
+    BEGIN
+        IF cardinality(p_product_ids) IS DISTINCT FROM cardinality(p_amounts) THEN
+            RAISE EXCEPTION 'The lengths of product_ids and amounts must match.';
+        END IF;
+
+        -- Concurrent replacements of the same order apply one after the other.
+        SELECT created_at INTO v_order_created_at
+        FROM orders
+        WHERE id = p_order_id
+        FOR UPDATE;
+
+        IF NOT FOUND THEN
+            RETURN NULL;
+        END IF;
+
+        SELECT count(*) INTO v_found_products
+        FROM products
+        WHERE id = ANY (p_product_ids);
+
+        IF v_found_products < (
+            SELECT count(DISTINCT line.product_id)
+            FROM unnest(p_product_ids) AS line(product_id)
+        ) THEN
+            -- Report every unknown product at once
+            SELECT array_agg(DISTINCT line.product_id ORDER BY line.product_id)
+            INTO v_missing_ids
+            FROM unnest(p_product_ids) AS line(product_id)
+            WHERE NOT EXISTS (SELECT 1 FROM products WHERE id = line.product_id);
+
+            RAISE EXCEPTION 'Products with IDs % do not exist.', v_missing_ids
+                USING ERRCODE = 'foreign_key_violation';
+        END IF;
+
+        -- Stock moves by the difference of each product's amount: positive
+        -- differences are reserved, negative ones given back.
+        SELECT array_agg(product_id), array_agg(coalesce(wanted.amount, 0) - coalesce(existing.amount, 0))
+        INTO v_changed_ids, v_changed_amounts
+        FROM (
+            SELECT line.product_id, sum(line.amount)::INT AS amount
+            FROM unnest(p_product_ids, p_amounts) AS line(product_id, amount)
+            GROUP BY line.product_id
+        ) AS wanted
+        FULL JOIN (
+            SELECT product_id, amount
+            FROM orders_products
+            WHERE order_id = p_order_id
+        ) AS existing USING (product_id)
+        WHERE coalesce(wanted.amount, 0) <> coalesce(existing.amount, 0);
+
+        PERFORM reserve_stock(v_changed_ids, v_changed_amounts);
+
+        WITH wanted AS (
+            SELECT line.product_id, sum(line.amount)::INT AS amount
+            FROM unnest(p_product_ids, p_amounts) AS line(product_id, amount)
+            GROUP BY line.product_id
+        ),
+        removed AS (
+            DELETE FROM orders_products
+            WHERE order_id = p_order_id
+                AND product_id <> ALL (p_product_ids)
+        ),
+        changed AS (
+            UPDATE orders_products
+            SET amount = wanted.amount
+            FROM wanted
+            WHERE orders_products.order_id = p_order_id
+                AND orders_products.product_id = wanted.product_id
+                AND orders_products.amount IS DISTINCT FROM wanted.amount
+        )
+        INSERT INTO orders_products (
+            order_id, product_id, amount, unit_price, unit_cost, created_at
+        )
+        SELECT
+            p_order_id,
+            wanted.product_id,
+            wanted.amount,
+            products.price,
+            products.cost,
+            LOCALTIMESTAMP
+        FROM wanted
+        JOIN products ON products.id = wanted.product_id
+        WHERE NOT EXISTS (
+            SELECT 1
+            FROM orders_products
+            WHERE order_id = p_order_id AND product_id = wanted.product_id
+        )
+        ORDER BY wanted.product_id;
+
+        RETURN v_order_created_at;
+    END;
+    $$;"""
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        "DROP FUNCTION IF EXISTS replace_order_products(BIGINT, BIGINT[], INT[]);"
+    )
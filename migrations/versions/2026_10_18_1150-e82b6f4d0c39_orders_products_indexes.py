@@ -0,0 +1,55 @@
+"""orders_products_indexes
+
+Revision ID: e82b6f4d0c39
+Revises: c47d9e2a6b15
+Create Date: 2026-10-18 11:50:44.207918
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e82b6f4d0c39"
+down_revision: Union[str, None] = "c47d9e2a6b15"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The model declares these indexes, but no migration created them. Without
+    # idx_order_id every deleted order makes its foreign key check scan all
+    # lines, and so do the lookups of an order's lines. Built concurrently, so
+    # orders keep being written meanwhile.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "idx_order_id",
+            "orders_products",
+            ["order_id"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "idx_product_id",
+            "orders_products",
+            ["product_id"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "idx_product_id",
+            table_name="orders_products",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.drop_index(
+            "idx_order_id",
+            table_name="orders_products",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
@@ -0,0 +1,88 @@
+"""uq_order_product
+
+Revision ID: f3a9d27c6e80
+Revises: e82b6f4d0c39
+Create Date: 2026-10-18 12:10:31.582046
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "f3a9d27c6e80"
+down_revision: Union[str, None] = "e82b6f4d0c39"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The model declares uq_order_product, but no migration created it, and
+    # replace_order_products and bulk imports rely on one line per product
+    # and order. Lines written twice for the same product are merged first
+    # into the oldest one, which gets their summed amount; stock is
+    # unchanged, since the reserved units are the same.
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        connection.execute(
+            sa.text(
+                """WITH duplicates AS (
+                    SELECT
+                        id,
+                        min(id) OVER line AS kept_id,
+                        sum(amount) OVER line AS amount
+                    FROM orders_products
+                    WHERE (order_id, product_id) IN (
+                        SELECT order_id, product_id
+                        FROM orders_products
+                        GROUP BY order_id, product_id
+                        HAVING count(*) > 1
+                    )
+                    WINDOW line AS (PARTITION BY order_id, product_id)
+                ),
+                merged AS (
+                    UPDATE orders_products
+                    SET amount = duplicates.amount
+                    FROM duplicates
+                    WHERE orders_products.id = duplicates.id
+                        AND duplicates.id = duplicates.kept_id
+                )
+                DELETE FROM orders_products
+                USING duplicates
+                WHERE orders_products.id = duplicates.id
+                    AND duplicates.id <> duplicates.kept_id"""
+            )
+        )
+
+        exists = connection.execute(
+            sa.text("SELECT 1 FROM pg_constraint WHERE conname = 'uq_order_product'")
+        ).scalar()
+        if exists:
+            return
+        # Built concurrently, so lines keep being written meanwhile. A build
+        # that failed, e.g. on a duplicate written since the merge, leaves an
+        # invalid index behind; it is dropped and the upgrade can be rerun.
+        op.drop_index(
+            "uq_order_product",
+            table_name="orders_products",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.create_index(
+            "uq_order_product",
+            "orders_products",
+            ["order_id", "product_id"],
+            unique=True,
+            postgresql_concurrently=True,
+        )
+        op.execute(
+            """ALTER TABLE orders_products
+            ADD CONSTRAINT uq_order_product UNIQUE USING INDEX uq_order_product"""
+        )
+
+
+def downgrade() -> None:
+    # Merged lines stay merged.
+    op.execute("ALTER TABLE orders_products DROP CONSTRAINT IF EXISTS uq_order_product")
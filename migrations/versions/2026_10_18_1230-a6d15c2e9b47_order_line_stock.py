@@ -0,0 +1,616 @@
+"""order_line_stock
+
+Revision ID: a6d15c2e9b47
+Revises: f3a9d27c6e80
+Create Date: 2026-10-18 12:30:44.208513
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a6d15c2e9b47"
+down_revision: Union[str, None] = "f3a9d27c6e80"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Stock follows the order lines: statement-level triggers with transition
+    # tables reserve the amounts of inserted lines, give back those of deleted
+    # lines and move updated lines by their difference, with one reserve_stock
+    # call per statement. This covers order creation and replacement, order
+    # deletes, /orders_products and imports alike; a shortage fails the
+    # statement. Lines with a NULL amount reserve nothing.
+    op.execute(
+        """CREATE OR REPLACE FUNCTION orders_products_stock_take() RETURNS trigger
+        LANGUAGE plpgsql
+        AS $$
+        DECLARE
+            v_product_ids BIGINT[];
+            v_amounts INT[];
+        BEGIN
+            SELECT array_agg(product_id), array_agg(amount)
+            INTO v_product_ids, v_amounts
+            FROM new_rows
+            WHERE amount IS NOT NULL;
+
+            PERFORM reserve_stock(v_product_ids, v_amounts);
+            RETURN NULL;
+        END;
+        $$;"""
+    )
+    op.execute(
+        """CREATE OR REPLACE FUNCTION orders_products_stock_give_back() RETURNS trigger
+        LANGUAGE plpgsql
+        AS $$
+        DECLARE
+            v_product_ids BIGINT[];
+            v_amounts INT[];
+        BEGIN
+            -- Negative amounts give stock back.
+            SELECT array_agg(product_id), array_agg(-amount)
+            INTO v_product_ids, v_amounts
+            FROM old_rows
+            WHERE amount IS NOT NULL;
+
+            PERFORM reserve_stock(v_product_ids, v_amounts);
+            RETURN NULL;
+        END;
+        $$;"""
+    )
+    op.execute(
+        """CREATE OR REPLACE FUNCTION orders_products_stock_change() RETURNS trigger
+        LANGUAGE plpgsql
+        AS $$
+        DECLARE
+            v_product_ids BIGINT[];
+            v_amounts INT[];
+        BEGIN
+            SELECT array_agg(product_id), array_agg(amount)
+            INTO v_product_ids, v_amounts
+            FROM (
+                SELECT product_id, sum(amount)::INT AS amount
+                FROM (
+                    SELECT product_id, amount FROM new_rows
+                    UNION ALL
+                    SELECT product_id, -amount FROM old_rows
+                ) AS changed
+                WHERE amount IS NOT NULL
+                GROUP BY product_id
+                HAVING sum(amount) <> 0
+            ) AS moved;
+
+            PERFORM reserve_stock(v_product_ids, v_amounts);
+            RETURN NULL;
+        END;
+        $$;"""
+    )
+    op.execute(
+        """CREATE TRIGGER trg_orders_products_stock_insert
+        AFTER INSERT ON orders_products
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION orders_products_stock_take();"""
+    )
+    op.execute(
+        """CREATE TRIGGER trg_orders_products_stock_delete
+        AFTER DELETE ON orders_products
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION orders_products_stock_give_back();"""
+    )
+    op.execute(
+        """CREATE TRIGGER trg_orders_products_stock_update
+        AFTER UPDATE ON orders_products
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION orders_products_stock_change();"""
+    )
+
+    # The order functions no longer reserve stock themselves, the triggers do.
+    # They still lock the products first, in ID order.
+    op.execute(
+        """CREATE OR REPLACE FUNCTION create_order_with_products(
+        p_product_ids BIGINT[],
+        p_amounts INT[],
+        p_order_created_at TIMESTAMP
+    )
+    RETURNS BIGINT
+    LANGUAGE plpgsql
+    AS $$
+    DECLARE
+        v_order_id BIGINT;
+        v_found_products INT;
+        v_missing_ids BIGINT[];
+    BEGIN
+        IF cardinality(p_product_ids) IS DISTINCT FROM cardinality(p_amounts) THEN
+            RAISE EXCEPTION 'The lengths of product_ids and amounts must match.';
+        END IF;
+
+        SELECT count(*) INTO v_found_products
+        FROM products
+        WHERE id = ANY (p_product_ids);
+
+        IF v_found_products < (
+            SELECT count(DISTINCT line.product_id)
+            FROM unnest(p_product_ids) AS line(product_id)
+        ) THEN
+            -- Report every unknown product at once
+            SELECT array_agg(DISTINCT line.product_id ORDER BY line.product_id)
+            INTO v_missing_ids
+            FROM unnest(p_product_ids) AS line(product_id)
+            WHERE NOT EXISTS (SELECT 1 FROM products WHERE id = line.product_id);
+
+            RAISE EXCEPTION 'Products with IDs % do not exist.', v_missing_ids
+                USING ERRCODE = 'foreign_key_violation';
+        END IF;
+
+        -- Locked ahead of the line inserts, whose foreign key checks then
+        -- share no product lock with other orders; the stock trigger reserves.
+        PERFORM 1
+        FROM products
+        WHERE id = ANY (p_product_ids) AND stock IS NOT NULL
+        ORDER BY id
+        FOR NO KEY UPDATE;
+
+        INSERT INTO orders (created_at)
+        VALUES (p_order_created_at)
+        RETURNING id INTO v_order_id;
+
+        INSERT INTO orders_products (
+            order_id, product_id, amount, unit_price, unit_cost, created_at
+        )
+        SELECT
+            v_order_id,
+            line.product_id,
+            sum(line.amount),
+            products.price,
+            products.cost,
+            p_order_created_at
+        FROM unnest(p_product_ids, p_amounts) AS line(product_id, amount)
+        JOIN products ON products.id = line.product_id
+        GROUP BY line.product_id, products.id
+        ORDER BY line.product_id;
+
+        RETURN v_order_id;
+    END;
+    $$;"""
+    )
+    op.execute(
+        """CREATE OR REPLACE FUNCTION create_orders_with_products(
+        p_order_count INT,
+        p_order_numbers INT[],
+        p_product_ids BIGINT[],
+        p_amounts INT[],
+        p_order_created_at TIMESTAMP
+    )
+    RETURNS BIGINT[]
+    LANGUAGE plpgsql
+    AS $$
+    DECLARE
+        v_order_ids BIGINT[];
+        v_found_products INT;
+        v_missing_ids BIGINT[];
+    BEGIN
+        IF cardinality(p_order_numbers) IS DISTINCT FROM cardinality(p_product_ids)
+            OR cardinality(p_product_ids) IS DISTINCT FROM cardinality(p_amounts) THEN
+            RAISE EXCEPTION 'The lengths of order_numbers, product_ids and amounts must match.';
+        END IF;
+
+        IF EXISTS (
+            SELECT 1 FROM unnest(p_order_numbers) AS line(order_number)
+            WHERE line.order_number NOT BETWEEN 1 AND p_order_count
+        ) THEN
+            RAISE EXCEPTION 'Order numbers must be between 1 and %.', p_order_count;
+        END IF;
+
+        SELECT count(*) INTO v_found_products
+        FROM products
+        WHERE id = ANY (p_product_ids);
+
+        IF v_found_products < (
+            SELECT count(DISTINCT line.product_id)
+            FROM unnest(p_product_ids) AS line(product_id)
+        ) THEN
+            -- Report every unknown product at once
+            SELECT array_agg(DISTINCT line.product_id ORDER BY line.product_id)
+            INTO v_missing_ids
+            FROM unnest(p_product_ids) AS line(product_id)
+            WHERE NOT EXISTS (SELECT 1 FROM products WHERE id = line.product_id);
+
+            RAISE EXCEPTION 'Products with IDs % do not exist.', v_missing_ids
+                USING ERRCODE = 'foreign_key_violation';
+        END IF;
+
+        -- Locked ahead of the line inserts, whose foreign key checks then
+        -- share no product lock with other orders; the stock trigger reserves.
+        PERFORM 1
+        FROM products
+        WHERE id = ANY (p_product_ids) AND stock IS NOT NULL
+        ORDER BY id
+        FOR NO KEY UPDATE;
+
+        SELECT array_agg(nextval(pg_get_serial_sequence('orders', 'id')) ORDER BY n)
+        INTO v_order_ids
+        FROM generate_series(1, p_order_count) AS n;
+
+        INSERT INTO orders (id, created_at)
+        SELECT order_id, p_order_created_at
+        FROM unnest(v_order_ids) AS new_order(order_id);
+
+        INSERT INTO orders_products (
+            order_id, product_id, amount, unit_price, unit_cost, created_at
+        )
+        SELECT
+            v_order_ids[line.order_number],
+            line.product_id,
+            sum(line.amount),
+            products.price,
+            products.cost,
+            p_order_created_at
+        FROM unnest(p_order_numbers, p_product_ids, p_amounts)
+            AS line(order_number, product_id, amount)
+        JOIN products ON products.id = line.product_id
+        GROUP BY line.order_number, line.product_id, products.id
+        ORDER BY line.order_number, line.product_id;
+
+        RETURN coalesce(v_order_ids, '{}');
+    END;
+    $$;"""
+    )
+    op.execute(
+        """CREATE OR REPLACE FUNCTION replace_order_products(
+        p_order_id BIGINT,
+        p_product_ids BIGINT[],
+        p_amounts INT[]
+    )
+    RETURNS TIMESTAMP
+    LANGUAGE plpgsql
+    AS $$
+    DECLARE
+        v_order_created_at TIMESTAMP;
+        v_found_products INT;
+        v_missing_ids BIGINT[];
+    BEGIN
+        IF cardinality(p_product_ids) IS DISTINCT FROM cardinality(p_amounts) THEN
+            RAISE EXCEPTION 'The lengths of product_ids and amounts must match.';
+        END IF;
+
+        -- Concurrent replacements of the same order apply one after the other.
+        SELECT created_at INTO v_order_created_at
+        FROM orders
+        WHERE id = p_order_id
+        FOR UPDATE;
+
+        IF NOT FOUND THEN
+            RETURN NULL;
+        END IF;
+
+        SELECT count(*) INTO v_found_products
+        FROM products
+        WHERE id = ANY (p_product_ids);
+
+        IF v_found_products < (
+            SELECT count(DISTINCT line.product_id)
+            FROM unnest(p_product_ids) AS line(product_id)
+        ) THEN
+            -- Report every unknown product at once
+            SELECT array_agg(DISTINCT line.product_id ORDER BY line.product_id)
+            INTO v_missing_ids
+            FROM unnest(p_product_ids) AS line(product_id)
+            WHERE NOT EXISTS (SELECT 1 FROM products WHERE id = line.product_id);
+
+            RAISE EXCEPTION 'Products with IDs % do not exist.', v_missing_ids
+                USING ERRCODE = 'foreign_key_violation';
+        END IF;
+
+        -- The stock triggers lock the products of each kind of line change
+        -- on their own. Locking all of them first, in ID order, keeps
+        -- replacements of orders sharing products from deadlocking.
+        PERFORM 1
+        FROM products
+        WHERE id = ANY (p_product_ids)
+            OR id IN (SELECT product_id FROM orders_products WHERE order_id = p_order_id)
+        ORDER BY id
+        FOR NO KEY UPDATE;
+
+        WITH wanted AS (
+            SELECT line.product_id, sum(line.amount)::INT AS amount
+            FROM unnest(p_product_ids, p_amounts) AS line(product_id, amount)
+            GROUP BY line.product_id
+        ),
+        removed AS (
+            DELETE FROM orders_products
+            WHERE order_id = p_order_id
+                AND product_id <> ALL (p_product_ids)
+        ),
+        changed AS (
+            UPDATE orders_products
+            SET amount = wanted.amount
+            FROM wanted
+            WHERE orders_products.order_id = p_order_id
+                AND orders_products.product_id = wanted.product_id
+                AND orders_products.amount IS DISTINCT FROM wanted.amount
+        )
+        INSERT INTO orders_products (
+            order_id, product_id, amount, unit_price, unit_cost, created_at
+        )
+        SELECT
+            p_order_id,
+            wanted.product_id,
+            wanted.amount,
+            products.price,
+            products.cost,
+            LOCALTIMESTAMP
+        FROM wanted
+        JOIN products ON products.id = wanted.product_id
+        WHERE NOT EXISTS (
+            SELECT 1
+            FROM orders_products
+            WHERE order_id = p_order_id AND product_id = wanted.product_id
+        )
+        ORDER BY wanted.product_id;
+
+        RETURN v_order_created_at;
+    END;
+    $$;"""
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        "DROP TRIGGER IF EXISTS trg_orders_products_stock_update ON orders_products;"
+    )
+    op.execute(
+        "DROP TRIGGER IF EXISTS trg_orders_products_stock_delete ON orders_products;"
+    )
+    op.execute(
+        "DROP TRIGGER IF EXISTS trg_orders_products_stock_insert ON orders_products;"
+    )
+    op.execute("DROP FUNCTION IF EXISTS orders_products_stock_change();")
+    op.execute("DROP FUNCTION IF EXISTS orders_products_stock_give_back();")
+    op.execute("DROP FUNCTION IF EXISTS orders_products_stock_take();")
+    op.execute(
+        """CREATE OR REPLACE FUNCTION create_order_with_products(
+        p_product_ids BIGINT[],
+        p_amounts INT[],
+        p_order_created_at TIMESTAMP
+    )
+    RETURNS BIGINT
+    LANGUAGE plpgsql
+    AS $$
+    DECLARE
+        v_order_id BIGINT;
+        v_found_products INT;
+        v_missing_ids BIGINT[];
+    BEGIN
+        IF cardinality(p_product_ids) IS DISTINCT FROM cardinality(p_amounts) THEN
+            RAISE EXCEPTION 'The lengths of product_ids and amounts must match.';
+        END IF;
+
+        SELECT count(*) INTO v_found_products
+        FROM products
+        WHERE id = ANY (p_product_ids);
+
+        IF v_found_products < (
+            SELECT count(DISTINCT line.product_id)
+            FROM unnest(p_product_ids) AS line(product_id)
+        ) THEN
+            -- Report every unknown product at once
+            SELECT array_agg(DISTINCT line.product_id ORDER BY line.product_id)
+            INTO v_missing_ids
+            FROM unnest(p_product_ids) AS line(product_id)
+            WHERE NOT EXISTS (SELECT 1 FROM products WHERE id = line.product_id);
+
+            RAISE EXCEPTION 'Products with IDs % do not exist.', v_missing_ids
+                USING ERRCODE = 'foreign_key_violation';
+        END IF;
+
+        PERFORM reserve_stock(p_product_ids, p_amounts);
+
+        INSERT INTO orders (created_at)
+        VALUES (p_order_created_at)
+        RETURNING id INTO v_order_id;
+
+        INSERT INTO orders_products (
+            order_id, product_id, amount, unit_price, unit_cost, created_at
+        )
+        SELECT
+            v_order_id,
+            line.product_id,
+            sum(line.amount),
+            products.price,
+            products.cost,
+            p_order_created_at
+        FROM unnest(p_product_ids, p_amounts) AS line(product_id, amount)
+        JOIN products ON products.id = line.product_id
+        GROUP BY line.product_id, products.id
+        ORDER BY line.product_id;
+
+        RETURN v_order_id;
+    END;
+    $$;"""
+    )
+    op.execute(
+        """CREATE OR REPLACE FUNCTION create_orders_with_products(
+        p_order_count INT,
+        p_order_numbers INT[],
+        p_product_ids BIGINT[],
+        p_amounts INT[],
+        p_order_created_at TIMESTAMP
+    )
+    RETURNS BIGINT[]
+    LANGUAGE plpgsql
+    AS $$
+    DECLARE
+        v_order_ids BIGINT[];
+        v_found_products INT;
+        v_missing_ids BIGINT[];
+    BEGIN
+        IF cardinality(p_order_numbers) IS DISTINCT FROM cardinality(p_product_ids)
+            OR cardinality(p_product_ids) IS DISTINCT FROM cardinality(p_amounts) THEN
+            RAISE EXCEPTION 'The lengths of order_numbers, product_ids and amounts must match.';
+        END IF;
+
+        IF EXISTS (
+            SELECT 1 FROM unnest(p_order_numbers) AS line(order_number)
+            WHERE line.order_number NOT BETWEEN 1 AND p_order_count
+        ) THEN
+            RAISE EXCEPTION 'Order numbers must be between 1 and %.', p_order_count;
+        END IF;
+
+        SELECT count(*) INTO v_found_products
+        FROM products
+        WHERE id = ANY (p_product_ids);
+
+        IF v_found_products < (
+            SELECT count(DISTINCT line.product_id)
+            FROM unnest(p_product_ids) AS line(product_id)
+        ) THEN
+            -- Report every unknown product at once
+            SELECT array_agg(DISTINCT line.product_id ORDER BY line.product_id)
+            INTO v_missing_ids
+            FROM unnest(p_product_ids) AS line(product_id)
+            WHERE NOT EXISTS (SELECT 1 FROM products WHERE id = line.product_id);
+
+            RAISE EXCEPTION 'Products with IDs % do not exist.', v_missing_ids
+                USING ERRCODE = 'foreign_key_violation';
+        END IF;
+
+        PERFORM reserve_stock(p_product_ids, p_amounts);
+
+        SELECT array_agg(nextval(pg_get_serial_sequence('orders', 'id')) ORDER BY n)
+        INTO v_order_ids
+        FROM generate_series(1, p_order_count) AS n;
+
+        INSERT INTO orders (id, created_at)
+        SELECT order_id, p_order_created_at
+        FROM unnest(v_order_ids) AS new_order(order_id);
+
+        INSERT INTO orders_products (
+            order_id, product_id, amount, unit_price, unit_cost, created_at
+        )
+        SELECT
+            v_order_ids[line.order_number],
+            line.product_id,
+            sum(line.amount),
+            products.price,
+            products.cost,
+            p_order_created_at
+        FROM unnest(p_order_numbers, p_product_ids, p_amounts)
+            AS line(order_number, product_id, amount)
+        JOIN products ON products.id = line.product_id
+        GROUP BY line.order_number, line.product_id, products.id
+        ORDER BY line.order_number, line.product_id;
+
+        RETURN coalesce(v_order_ids, '{}');
+    END;
+    $$;"""
+    )
+    op.execute(
+        """CREATE OR REPLACE FUNCTION replace_order_products(
+        p_order_id BIGINT,
+        p_product_ids BIGINT[],
+        p_amounts INT[]
+    )
+    RETURNS TIMESTAMP
+    LANGUAGE plpgsql
+    AS $$
+    DECLARE
+        v_order_created_at TIMESTAMP;
+        v_found_products INT;
+        v_missing_ids BIGINT[];
+        v_changed_ids BIGINT[];
+        v_changed_amounts INT[];
+    BEGIN
+        IF cardinality(p_product_ids) IS DISTINCT FROM cardinality(p_amounts) THEN
+            RAISE EXCEPTION 'The lengths of product_ids and amounts must match.';
+        END IF;
+
+        -- Concurrent replacements of the same order apply one after the other.
+        SELECT created_at INTO v_order_created_at
+        FROM orders
+        WHERE id = p_order_id
+        FOR UPDATE;
+
+        IF NOT FOUND THEN
+            RETURN NULL;
+        END IF;
+
+        SELECT count(*) INTO v_found_products
+        FROM products
+        WHERE id = ANY (p_product_ids);
+
+        IF v_found_products < (
+            SELECT count(DISTINCT line.product_id)
+            FROM unnest(p_product_ids) AS line(product_id)
+        ) THEN
+            -- Report every unknown product at once
+            SELECT array_agg(DISTINCT line.product_id ORDER BY line.product_id)
+            INTO v_missing_ids
+            FROM unnest(p_product_ids) AS line(product_id)
+            WHERE NOT EXISTS (SELECT 1 FROM products WHERE id = line.product_id);
+
+            RAISE EXCEPTION 'Products with IDs % do not exist.', v_missing_ids
+                USING ERRCODE = 'foreign_key_violation';
+        END IF;
+
+        -- Stock moves by the difference of each product's amount: positive
+        -- differences are reserved, negative ones given back.
+        SELECT array_agg(product_id), array_agg(coalesce(wanted.amount, 0) - coalesce(existing.amount, 0))
+        INTO v_changed_ids, v_changed_amounts
+        FROM (
+            SELECT line.product_id, sum(line.amount)::INT AS amount
+            FROM unnest(p_product_ids, p_amounts) AS line(product_id, amount)
+            GROUP BY line.product_id
+        ) AS wanted
+        FULL JOIN (
+            SELECT product_id, amount
+            FROM orders_products
+            WHERE order_id = p_order_id
+        ) AS existing USING (product_id)
+        WHERE coalesce(wanted.amount, 0) <> coalesce(existing.amount, 0);
+
+        PERFORM reserve_stock(v_changed_ids, v_changed_amounts);
+
+        WITH wanted AS (
+            SELECT line.product_id, sum(line.amount)::INT AS amount
+            FROM unnest(p_product_ids, p_amounts) AS line(product_id, amount)
+            GROUP BY line.product_id
+        ),
+        removed AS (
+            DELETE FROM orders_products
+            WHERE order_id = p_order_id
+                AND product_id <> ALL (p_product_ids)
+        ),
+        changed AS (
+            UPDATE orders_products
+            SET amount = wanted.amount
+            FROM wanted
+            WHERE orders_products.order_id = p_order_id
+                AND orders_products.product_id = wanted.product_id
+                AND orders_products.amount IS DISTINCT FROM wanted.amount
+        )
+        INSERT INTO orders_products (
+            order_id, product_id, amount, unit_price, unit_cost, created_at
+        )
+        SELECT
+            p_order_id,
+            wanted.product_id,
+            wanted.amount,
+            products.price,
+            products.cost,
+            LOCALTIMESTAMP
+        FROM wanted
+        JOIN products ON products.id = wanted.product_id
+        WHERE NOT EXISTS (
+            SELECT 1
+            FROM orders_products
+            WHERE order_id = p_order_id AND product_id = wanted.product_id
+        )
+        ORDER BY wanted.product_id;
+
+        RETURN v_order_created_at;
+    END;
+    $$;"""
+    )
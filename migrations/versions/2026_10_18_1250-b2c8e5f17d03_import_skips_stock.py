@@ -0,0 +1,66 @@
+"""import_skips_stock
+
+Revision ID: b2c8e5f17d03
+Revises: a6d15c2e9b47
+Create Date: 2026-10-18 12:50:12.604317
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b2c8e5f17d03"
+down_revision: Union[str, None] = "a6d15c2e9b47"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Imported lines are records of orders placed elsewhere, not new orders:
+    # transactions that set app.importing to 'on' insert them without
+    # reserving stock, so a short product no longer rejects the batch.
+    op.execute(
+        """CREATE OR REPLACE FUNCTION orders_products_stock_take() RETURNS trigger
+        LANGUAGE plpgsql
+        AS $$
+        DECLARE
+            v_product_ids BIGINT[];
+            v_amounts INT[];
+        BEGIN
+            IF current_setting('app.importing', true) = 'on' THEN
+                RETURN NULL;
+            END IF;
+
+            SELECT array_agg(product_id), array_agg(amount)
+            INTO v_product_ids, v_amounts
+            FROM new_rows
+            WHERE amount IS NOT NULL;
+
+            PERFORM reserve_stock(v_product_ids, v_amounts);
+            RETURN NULL;
+        END;
+        $$;"""
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        """CREATE OR REPLACE FUNCTION orders_products_stock_take() RETURNS trigger
+        LANGUAGE plpgsql
+        AS $$
+        DECLARE
+            v_product_ids BIGINT[];
+            v_amounts INT[];
+        BEGIN
+            SELECT array_agg(product_id), array_agg(amount)
+            INTO v_product_ids, v_amounts
+            FROM new_rows
+            WHERE amount IS NOT NULL;
+
+            PERFORM reserve_stock(v_product_ids, v_amounts);
+            RETURN NULL;
+        END;
+        $$;"""
+    )
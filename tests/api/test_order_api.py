@@ -1,4 +1,15 @@
+import time
+from types import SimpleNamespace
+import uuid
+
 import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app import order_queue
+from app.config import settings
+from app.crud import base as crud_base
+from app.crud.order import order_crud
+from app.order_queue import QueuedOrder, start_order_queue, stop_order_queue
 
 
 def test_create_product(client):
@@ -19,14 +30,14 @@ def test_create_product(client):
 
 
 def test_create_order(client):
-    response = client.post("/orders", json={"product_ids": [1], "amounts": [10]})
+    response = client.post("/orders", json={"product_ids": [1], "amounts": [1]})
     assert response.status_code == 201
     order_id = response.json()
     assert isinstance(order_id, int)
 
 
 def test_get_order(client):
-    create_response = client.post("/orders", json={"product_ids": [1], "amounts": [10]})
+    create_response = client.post("/orders", json={"product_ids": [1], "amounts": [1]})
     assert create_response.status_code == 201
     order_id = create_response.json()
 
@@ -39,7 +50,7 @@ def test_get_order(client):
 
 
 def test_delete_order(client):
-    create_response = client.post("/orders", json={"product_ids": [1], "amounts": [10]})
+    create_response = client.post("/orders", json={"product_ids": [1], "amounts": [1]})
     assert create_response.status_code == 201
     order_id = create_response.json()
 
@@ -59,3 +70,344 @@ def test_get_order_count(client):
 
     data = response.json()
     assert isinstance(data, int), f"Response JSON is not an integer: {data}"
+
+
+def test_get_order_lines_as_arrays_match_json(client, monkeypatch):
+    product_ids = [
+        client.post(
+            "/products",
+            json={"product_name": f"Line {i}", "price": 10.5, "cost": 2.25},
+        ).json()["id"]
+        for i in range(3)
+    ]
+    create_response = client.post(
+        "/orders", json={"product_ids": product_ids, "amounts": [1, 2, 3]}
+    )
+    order_id = create_response.json()
+
+    monkeypatch.setattr(settings, "ORDER_LINES_AS_ARRAYS", True)
+    from_arrays = client.get(f"/orders/{order_id}").json()
+    monkeypatch.setattr(settings, "ORDER_LINES_AS_ARRAYS", False)
+    from_json = client.get(f"/orders/{order_id}").json()
+
+    def by_product(products):
+        return sorted(products, key=lambda product: product["product_id"])
+
+    assert by_product(from_arrays.pop("products")) == by_product(
+        from_json.pop("products")
+    )
+    assert from_arrays == from_json
+
+
+def test_create_order_merges_duplicate_products(client):
+    product_id = client.post(
+        "/products", json={"product_name": "Merged", "price": 1.0, "cost": 0.5}
+    ).json()["id"]
+    create_response = client.post(
+        "/orders", json={"product_ids": [product_id, product_id], "amounts": [2, 3]}
+    )
+    assert create_response.status_code == 201
+
+    order = client.get(f"/orders/{create_response.json()}").json()
+    assert [(line["product_id"], line["amount"]) for line in order["products"]] == [
+        (product_id, 5)
+    ]
+
+
+def test_create_order_with_missing_products_fails(client):
+    response = client.post(
+        "/orders", json={"product_ids": [10**12, 10**12 + 1], "amounts": [1, 1]}
+    )
+    assert response.status_code == 422
+    assert response.json()["detail"].startswith("Products with IDs")
+
+
+def test_create_order_reserves_stock(client):
+    first, second = (
+        client.post(
+            "/products",
+            json={
+                "product_name": f"Stocked {i}",
+                "price": 1.0,
+                "cost": 0.5,
+                "stock": 5,
+            },
+        ).json()["id"]
+        for i in range(2)
+    )
+
+    response = client.post(
+        "/orders", json={"product_ids": [first, second, first], "amounts": [2, 1, 1]}
+    )
+    assert response.status_code == 201
+    assert client.get(f"/products/{first}").json()["stock"] == 2
+    assert client.get(f"/products/{second}").json()["stock"] == 4
+
+    # Short on one product: nothing is reserved.
+    response = client.post(
+        "/orders", json={"product_ids": [first, second], "amounts": [3, 1]}
+    )
+    assert response.status_code == 409
+    assert response.json()["detail"].startswith("Insufficient stock")
+    assert client.get(f"/products/{first}").json()["stock"] == 2
+    assert client.get(f"/products/{second}").json()["stock"] == 4
+
+
+def test_update_order_replaces_products(client):
+    kept, changed, removed, added = (
+        client.post(
+            "/products",
+            json={
+                "product_name": f"Replaced {i}",
+                "price": 2.0,
+                "cost": 1.0,
+                "stock": 10,
+            },
+        ).json()["id"]
+        for i in range(4)
+    )
+    order_id = client.post(
+        "/orders",
+        json={"product_ids": [kept, changed, removed], "amounts": [1, 2, 3]},
+    ).json()
+
+    response = client.put(
+        f"/orders/{order_id}",
+        json={"product_ids": [kept, changed, added], "amounts": [1, 5, 4]},
+    )
+    assert response.status_code == 200
+    order = response.json()
+    assert order["order_id"] == order_id
+    assert sorted(
+        (line["product_id"], line["amount"]) for line in order["products"]
+    ) == [(kept, 1), (changed, 5), (added, 4)]
+    assert client.get(f"/orders/{order_id}").json()["products"] == order["products"]
+
+    # Stock moves by the differences only.
+    stocks = [
+        client.get(f"/products/{product_id}").json()["stock"]
+        for product_id in (kept, changed, removed, added)
+    ]
+    assert stocks == [9, 5, 10, 6]
+
+    orders = client.get("/orders-list", params={"after_id": order_id - 1}).json()
+    assert orders["items"][0]["line_count"] == 3
+    assert orders["items"][0]["total_units"] == 10
+
+    # Short on stock: the order is left as it was.
+    response = client.put(
+        f"/orders/{order_id}",
+        json={"product_ids": [changed], "amounts": [11]},
+    )
+    assert response.status_code == 409
+    assert client.get(f"/orders/{order_id}").json()["products"] == order["products"]
+
+    response = client.put(
+        f"/orders/{order_id}", json={"product_ids": [], "amounts": []}
+    )
+    assert response.status_code == 200
+    assert response.json()["products"] == []
+    assert client.get(f"/products/{changed}").json()["stock"] == 10
+
+    response = client.put(
+        f"/orders/{10**12}", json={"product_ids": [kept], "amounts": [1]}
+    )
+    assert response.status_code == 404
+
+
+def test_batch_create_orders(client):
+    product_ids = [
+        client.post(
+            "/products", json={"product_name": f"Batch {i}", "price": 1.0, "cost": 0.5}
+        ).json()["id"]
+        for i in range(2)
+    ]
+    response = client.post(
+        "/orders-batch",
+        json=[
+            {"product_ids": product_ids, "amounts": [1, 2]},
+            {"product_ids": [product_ids[1]], "amounts": [3]},
+        ],
+    )
+    assert response.status_code == 201
+    first_id, second_id = response.json()
+
+    first = client.get(f"/orders/{first_id}").json()
+    second = client.get(f"/orders/{second_id}").json()
+    assert sorted(line["amount"] for line in first["products"]) == [1, 2]
+    assert [line["amount"] for line in second["products"]] == [3]
+
+
+def test_batch_delete_orders_with_products(client, monkeypatch):
+    monkeypatch.setattr(settings, "BATCH_DELETE_CHUNK_SIZE", 2)
+    product_id = client.post(
+        "/products",
+        json={"product_name": "Deleted", "price": 1.0, "cost": 0.5, "stock": 10},
+    ).json()["id"]
+    order_ids = client.post(
+        "/orders-batch",
+        json=[{"product_ids": [product_id], "amounts": [2]} for _ in range(4)],
+    ).json()
+    assert client.get(f"/products/{product_id}").json()["stock"] == 2
+
+    response = client.delete(f"/orders/{order_ids[0]}")
+    assert response.status_code == 202
+    assert response.json() == order_ids[0]
+
+    # Three orders and an unknown ID, in two chunks.
+    response = client.request("DELETE", "/orders-batch", json=order_ids[1:] + [10**12])
+    assert response.status_code == 202
+    assert sorted(response.json()) == order_ids[1:]
+    for order_id in order_ids:
+        assert client.get(f"/orders/{order_id}").status_code == 404
+
+    assert client.delete(f"/orders/{order_ids[0]}").status_code == 404
+    # Deleted lines give their amounts back.
+    assert client.get(f"/products/{product_id}").json()["stock"] == 10
+
+
+def test_batch_delete_stops_before_deadline(client, monkeypatch):
+    monkeypatch.setattr(settings, "BATCH_DELETE_CHUNK_SIZE", 1)
+    order_ids = client.post(
+        "/orders-batch",
+        json=[{"product_ids": [1], "amounts": [1]} for _ in range(3)],
+    ).json()
+
+    # Every reading of the clock is 10 s later: after a 10 s chunk, the
+    # second one would end past the 30 s deadline of the route.
+    clock = iter(range(0, 1000, 10))
+    monkeypatch.setattr(
+        crud_base, "time", SimpleNamespace(monotonic=lambda: next(clock))
+    )
+    response = client.request("DELETE", "/orders-batch", json=order_ids)
+    assert response.status_code == 202
+    assert response.json() == order_ids[:1]
+    assert client.get(f"/orders/{order_ids[1]}").status_code == 200
+
+
+def test_create_order_with_idempotency_key(client):
+    product_id = client.post(
+        "/products",
+        json={"product_name": "Idempotent", "price": 1.0, "cost": 0.5, "stock": 5},
+    ).json()["id"]
+    payload = {"product_ids": [product_id], "amounts": [1]}
+    headers = {"Idempotency-Key": str(uuid.uuid4())}
+
+    first = client.post("/orders", json=payload, headers=headers)
+    retried = client.post("/orders", json=payload, headers=headers)
+    assert first.status_code == retried.status_code == 201
+    assert retried.json() == first.json()
+    assert retried.headers["idempotent-replayed"] == "true"
+    assert client.get(f"/products/{product_id}").json()["stock"] == 4
+
+    changed = client.post("/orders", json={**payload, "amounts": [2]}, headers=headers)
+    assert changed.status_code == 422
+
+    # Errors caused by the order are replayed as well.
+    headers = {"Idempotency-Key": str(uuid.uuid4())}
+    missing = {"product_ids": [10**12], "amounts": [1]}
+    assert client.post("/orders", json=missing, headers=headers).status_code == 422
+    replayed = client.post("/orders", json=missing, headers=headers)
+    assert replayed.status_code == 422
+    assert replayed.headers["idempotent-replayed"] == "true"
+
+    headers = {"Idempotency-Key": str(uuid.uuid4())}
+    batch = client.post("/orders-batch", json=[payload, payload], headers=headers)
+    retried = client.post("/orders-batch", json=[payload, payload], headers=headers)
+    assert batch.status_code == retried.status_code == 201
+    assert retried.json() == batch.json()
+    assert client.get(f"/products/{product_id}").json()["stock"] == 2
+
+
+def test_idempotency_key_is_released_after_server_error(client, monkeypatch):
+    payload = {"product_ids": [1], "amounts": [1]}
+    headers = {"Idempotency-Key": str(uuid.uuid4())}
+
+    async def fail(session, create_obj):
+        raise IntegrityError("SELECT create_order_with_products()", {}, Exception())
+
+    # A database error without a SQLSTATE is a 500, which is not stored.
+    with monkeypatch.context() as patch:
+        patch.setattr(order_crud, "create_order", fail)
+        assert client.post("/orders", json=payload, headers=headers).status_code == 500
+    response = client.post("/orders", json=payload, headers=headers)
+    assert response.status_code == 201
+    assert "idempotent-replayed" not in response.headers
+
+
+def test_create_order_with_batching(client, monkeypatch):
+    monkeypatch.setattr(settings, "ORDER_BATCHING", True)
+    product_id = client.post(
+        "/products", json={"product_name": "Batched", "price": 1.0, "cost": 0.5}
+    ).json()["id"]
+
+    payload = {"product_ids": [product_id], "amounts": [4]}
+    response = client.post("/orders", json=payload)
+    assert response.status_code == 201
+    order = client.get(f"/orders/{response.json()}").json()
+    assert order["products"][0]["amount"] == 4
+
+    # With an Idempotency-Key, a retry gets the batched order.
+    headers = {"Idempotency-Key": str(uuid.uuid4())}
+    response = client.post("/orders", json=payload, headers=headers)
+    assert response.status_code == 201
+    retried = client.post("/orders", json=payload, headers=headers)
+    assert retried.json() == response.json()
+
+    invalid = client.post("/orders", json={"product_ids": [10**12], "amounts": [1]})
+    assert invalid.status_code == 422
+
+
+def test_create_order_through_queue(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "ORDER_QUEUE", True)
+    monkeypatch.setattr(settings, "ORDER_QUEUE_BACKEND", "log")
+    monkeypatch.setattr(settings, "ORDER_QUEUE_LOG_PATH", str(tmp_path / "orders.log"))
+    client.portal.call(start_order_queue)
+    try:
+        product_id = client.post(
+            "/products", json={"product_name": "Queued", "price": 1.0, "cost": 0.5}
+        ).json()["id"]
+        headers = {"Prefer": "respond-async"}
+
+        response = client.post(
+            "/orders",
+            json={"product_ids": [product_id], "amounts": [2]},
+            headers=headers,
+        )
+        assert response.status_code == 202
+        ticket = response.json()["ticket"]
+        assert response.headers["location"] == f"/orders-tickets/{ticket}"
+        invalid = client.post(
+            "/orders", json={"product_ids": [10**12], "amounts": [1]}, headers=headers
+        )
+
+        created = wait_for_ticket(client, ticket)
+        assert created["status"] == "created"
+        order = client.get(f"/orders/{created['order_id']}").json()
+        assert order["products"][0]["amount"] == 2
+        failed = wait_for_ticket(client, invalid.json()["ticket"])
+        assert failed["status"] == "failed"
+        assert "do not exist" in failed["error"]
+
+        # A redelivered order is acknowledged without being created again.
+        count = client.get("/orders-count").json()
+        redelivered = QueuedOrder(
+            "0", uuid.UUID(ticket), {"product_ids": [product_id], "amounts": [2]}
+        )
+        client.portal.call(order_queue.writer.write, [redelivered])
+        assert client.get("/orders-count").json() == count
+    finally:
+        client.portal.call(stop_order_queue)
+
+    # Without the queue's status, the ticket of a created order is found in the database.
+    assert client.get(f"/orders-tickets/{ticket}").json() == created
+    assert client.get(f"/orders-tickets/{uuid.uuid4()}").status_code == 404
+
+
+def wait_for_ticket(client, ticket: str) -> dict:
+    for _ in range(100):
+        status = client.get(f"/orders-tickets/{ticket}").json()
+        if status["status"] != "queued":
+            return status
+        time.sleep(0.05)
+    raise AssertionError(f"Ticket {ticket} is still queued")
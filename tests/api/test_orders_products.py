@@ -1,6 +1,15 @@
+import json
+
 import pytest
 
 
+def other_product(client) -> int:
+    """Creates the product an order is made of, so a line can be added for another one."""
+    return client.post(
+        "/products", json={"product_name": "Other Product", "price": 1.0}
+    ).json()["id"]
+
+
 def test_create_order_product(client):
     product_payload = {
         "product_name": "Test Product",
@@ -14,7 +23,7 @@ def test_create_order_product(client):
     ), f"Create product failed: {product_response.json()}"
     product_id = product_response.json()["id"]
 
-    order_payload = {"product_ids": [product_id], "amounts": [10]}
+    order_payload = {"product_ids": [other_product(client)], "amounts": [10]}
     order_response = client.post("/orders", json=order_payload)
     assert (
         order_response.status_code == 201
@@ -56,7 +65,7 @@ def test_get_order_product(client):
     product_id = product_response.json()["id"]
 
     # Create an order with the product
-    order_payload = {"product_ids": [product_id], "amounts": [10]}
+    order_payload = {"product_ids": [other_product(client)], "amounts": [10]}
     order_response = client.post("/orders", json=order_payload)
     assert (
         order_response.status_code == 201
@@ -141,7 +150,7 @@ def test_update_order_product(client):
         "product_name": "Test Product",
         "price": 100.0,
         "cost": 50.0,
-        "stock": 10,
+        "stock": 20,
     }
     product_response = client.post("/products", json=product_payload)
     assert (
@@ -150,7 +159,7 @@ def test_update_order_product(client):
     product_id = product_response.json()["id"]
 
     # Create an order
-    order_payload = {"product_ids": [product_id], "amounts": [10]}
+    order_payload = {"product_ids": [other_product(client)], "amounts": [10]}
     order_response = client.post("/orders", json=order_payload)
     assert (
         order_response.status_code == 201
@@ -198,6 +207,14 @@ def test_update_order_product(client):
         updated_data["amount"] == 15
     ), f"Expected amount 15, got {updated_data['amount']}"
 
+    # The price snapshot cannot be overwritten through an update.
+    update_response = client.put(
+        f"/orders_products/{order_product_id}",
+        json={**update_payload, "unit_price": 1.0, "unit_cost": 1.0},
+    )
+    assert update_response.json()["unit_price"] == 100.0
+    assert update_response.json()["unit_cost"] == 50.0
+
 
 def test_delete_order_product(client):
     """Creates an order-product entry, attempts to delete it, and handles potential failures gracefully."""
@@ -216,7 +233,7 @@ def test_delete_order_product(client):
     product_id = product_response.json()["id"]
 
     # Create an order
-    order_payload = {"product_ids": [product_id], "amounts": [10]}
+    order_payload = {"product_ids": [other_product(client)], "amounts": [10]}
     order_response = client.post("/orders", json=order_payload)
     assert (
         order_response.status_code == 201
@@ -260,3 +277,152 @@ def test_get_order_products_count(client):
         count, int
     ), f"Expected an integer count, but got {type(count)}: {count}"
     print(f"Order products count: {count}")
+
+
+def order_totals(client, order_id: int) -> dict:
+    page = client.get(
+        "/orders-list", params={"after_id": order_id - 1, "page_size": 1}
+    ).json()
+    order = page["items"][0]
+    return {
+        name: order[name]
+        for name in ("total_revenue", "total_cost", "total_units", "line_count")
+    }
+
+
+def test_order_totals_follow_line_changes(client):
+    product_ids = [
+        client.post(
+            "/products", json={"product_name": name, "price": 10.0, "cost": 4.0}
+        ).json()["id"]
+        for name in ("Totals 1", "Totals 2")
+    ]
+    order_id = client.post(
+        "/orders", json={"product_ids": product_ids[:1], "amounts": [3]}
+    ).json()
+    assert order_totals(client, order_id) == {
+        "total_revenue": 30,
+        "total_cost": 12,
+        "total_units": 3,
+        "line_count": 1,
+    }
+
+    line = client.post(
+        "/orders_products",
+        json={"order_id": order_id, "product_id": product_ids[1], "amount": 2},
+    ).json()
+    assert order_totals(client, order_id)["total_revenue"] == 50
+
+    response = client.put(f"/orders_products/{line['id']}", json={**line, "amount": 4})
+    assert response.status_code == 200
+    assert order_totals(client, order_id) == {
+        "total_revenue": 70,
+        "total_cost": 28,
+        "total_units": 7,
+        "line_count": 2,
+    }
+
+
+def test_import_order_products_through_staging(client):
+    product_ids = [
+        client.post("/products", json={"product_name": name, "price": 10.0}).json()[
+            "id"
+        ]
+        for name in ("Staged 1", "Staged 2")
+    ]
+    order_id = client.post(
+        "/orders", json={"product_ids": product_ids[:1], "amounts": [1]}
+    ).json()
+    lines = [
+        {"order_id": order_id, "product_id": product_ids[1], "amount": 2},
+        {"order_id": 10**12, "product_id": product_ids[1], "amount": 1},
+        {"order_id": order_id, "product_id": product_ids[0], "amount": 1},
+        {"order_id": order_id, "product_id": product_ids[1], "amount": -1},
+        "not json",
+    ]
+    body = "\n".join(
+        line if isinstance(line, str) else json.dumps(line) for line in lines
+    )
+
+    response = client.post(
+        "/orders_products-import",
+        params={"staging": True},
+        content=body,
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200, response.text
+    report = response.json()
+    assert (report["rows"], report["imported"], report["failed"]) == (5, 1, 4)
+    errors = {error["line"]: error["error"] for error in report["errors"]}
+    assert errors[2] == "order_id: no orders row with this ID"
+    assert errors[3] == "order_id, product_id: already exists"
+    assert errors[4].startswith("amount: ")
+    assert errors[5].startswith("invalid JSON")
+    # Rows written with COPY fire the triggers of the table like inserts do.
+    assert order_totals(client, order_id)["total_revenue"] == 30
+
+    # Without staging, uq_order_product rejects the batch of an existing line.
+    response = client.post(
+        "/orders_products-import",
+        content=json.dumps(lines[0]),
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    report = response.json()
+    assert (report["imported"], report["failed"]) == (0, 1)
+    assert "uq_order_product" in report["errors"][0]["error"]
+
+
+def test_order_lines_move_stock(client):
+    product_id = client.post(
+        "/products", json={"product_name": "Stocked", "price": 1.0, "stock": 10}
+    ).json()["id"]
+    order_id = client.post(
+        "/orders", json={"product_ids": [other_product(client)], "amounts": [1]}
+    ).json()
+
+    def stock() -> int:
+        return client.get(f"/products/{product_id}").json()["stock"]
+
+    line = client.post(
+        "/orders_products",
+        json={"order_id": order_id, "product_id": product_id, "amount": 4},
+    ).json()
+    assert stock() == 6
+    client.put(f"/orders_products/{line['id']}", json={**line, "amount": 7})
+    assert stock() == 3
+
+    response = client.put(f"/orders_products/{line['id']}", json={**line, "amount": 11})
+    assert response.status_code == 409
+    assert stock() == 3
+
+    # One line per product and order.
+    response = client.post(
+        "/orders_products",
+        json={"order_id": order_id, "product_id": product_id, "amount": 1},
+    )
+    assert response.status_code == 409
+
+    client.delete(f"/orders_products/{line['id']}")
+    assert stock() == 10
+
+
+@pytest.mark.parametrize("staging", [False, True])
+def test_import_reserves_no_stock(client, staging):
+    product_id = client.post(
+        "/products", json={"product_name": "Imported", "price": 1.0, "stock": 1}
+    ).json()["id"]
+    order_id = client.post(
+        "/orders", json={"product_ids": [other_product(client)], "amounts": [1]}
+    ).json()
+
+    response = client.post(
+        "/orders_products-import",
+        params={"staging": staging},
+        content=json.dumps(
+            {"order_id": order_id, "product_id": product_id, "amount": 5}
+        ),
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    report = response.json()
+    assert (report["imported"], report["failed"]) == (1, 0)
+    assert client.get(f"/products/{product_id}").json()["stock"] == 1
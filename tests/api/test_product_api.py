@@ -1,6 +1,7 @@
 import pytest
 from sqlalchemy import text
 
+from app.crud import product_crud
 from app.db import async_session_maker
 
 
@@ -191,3 +192,105 @@ def test_get_product_count(client):
     ), f"Expected an integer count, but got {type(count)}: {count}"
 
     print(f"Product count retrieved successfully: {count}")
+
+
+def test_get_products_keyset_pagination(client):
+    """Walks the product list with cursors and checks that pages do not overlap."""
+
+    payload = [
+        {"product_name": f"Keyset {i}", "price": 1.0, "cost": 1.0, "stock": 1}
+        for i in range(5)
+    ]
+    response = client.post("/products-batch", json=payload)
+    assert response.status_code == 201, f"Batch create failed: {response.text}"
+
+    first_page = client.get("/products", params={"after_id": 0, "page_size": 2})
+    assert first_page.status_code == 200, f"Get page failed: {first_page.json()}"
+    first = first_page.json()
+    assert len(first["items"]) == 2
+    assert first["prev_cursor"] is None
+    assert first["next_cursor"] == first["items"][-1]["id"]
+
+    second_page = client.get(
+        "/products", params={"after_id": first["next_cursor"], "page_size": 2}
+    )
+    second = second_page.json()
+    assert second["items"][0]["id"] > first["items"][-1]["id"]
+
+    back_page = client.get(
+        "/products", params={"before_id": second["prev_cursor"], "page_size": 2}
+    )
+    assert back_page.json()["items"] == first["items"]
+
+
+def test_get_products_page_envelope(client):
+    """Checks the paginated envelope returned by the offset list route."""
+
+    response = client.get("/products", params={"page": 1, "page_size": 2})
+    assert response.status_code == 200, f"Get page failed: {response.json()}"
+
+    data = response.json()
+    assert len(data["items"]) == 2
+    assert data["page"] == 1 and data["page_size"] == 2
+    assert data["prev_page"] is None
+    assert data["next_page"] == 2
+    assert data["total_items"] >= 2
+    assert data["total_pages"] == -(-data["total_items"] // 2)
+
+
+def test_get_product_count_sources(client):
+    """The trigger-maintained counter agrees with an exact count(*)."""
+
+    exact = client.get("/products-count", params={"total_source": "count"}).json()
+    counter = client.get("/products-count", params={"total_source": "counter"}).json()
+    estimate = client.get("/products-count", params={"total_source": "estimate"})
+
+    assert counter == exact, f"Counter {counter} differs from count(*) {exact}"
+    assert estimate.status_code == 200
+    assert isinstance(estimate.json(), int)
+
+
+def test_fast_read_matches_orm_read(client, monkeypatch):
+    product_id = client.post(
+        "/products", json={"product_name": "Fast", "price": 12.5, "cost": 3.0}
+    ).json()["id"]
+
+    responses = {}
+    for fast_read in (False, True):
+        monkeypatch.setattr(product_crud, "fast_read", fast_read)
+        responses[fast_read] = (
+            client.get("/products", params={"page_size": 50}).json(),
+            client.get("/products", params={"after_id": 0}).json(),
+            client.get(f"/products/{product_id}").json(),
+        )
+    assert responses[True][0]["items"] and responses[True][1]["items"]
+    assert responses[True][2]["product_name"] == "Fast"
+    assert responses[True] == responses[False]
+
+
+def test_import_products_csv(client):
+    """Imports products from a CSV body and reports the rejected rows."""
+
+    before = client.get("/products-count").json()
+    body = (
+        "product_name,price,cost,stock\r\n"
+        '"Imported, quoted",12.5,6,3\r\n'
+        "Negative price,-1,1,1\r\n"
+        '"Two\nlines",,,\r\n'
+        "Too,many,values,here,!\r\n"
+    )
+
+    response = client.post(
+        "/products-import", content=body, headers={"Content-Type": "text/csv"}
+    )
+    assert response.status_code == 200, response.text
+    report = response.json()
+    assert (report["rows"], report["imported"], report["failed"]) == (4, 2, 2)
+    assert [error["line"] for error in report["errors"]] == [3, 6]
+    assert report["errors"][0]["error"].startswith("price: ")
+    assert client.get("/products-count").json() == before + 2
+
+    response = client.post(
+        "/products-import", content=body, headers={"Content-Type": "text/plain"}
+    )
+    assert response.status_code == 415
@@ -0,0 +1,31 @@
+from datetime import date, timedelta
+
+
+def report(client, days_before: int) -> dict:
+    # A distinct range per call, so that no cached report is returned.
+    start = date.today() - timedelta(days=days_before)
+    end = date.today() + timedelta(days=1)
+    response = client.get(f"/reports-all?start_date={start}&end_date={end}")
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_report_uses_prices_at_order_time(client):
+    product = {"product_name": "Reported", "price": 10.0, "cost": 4.0}
+    product_id = client.post("/products", json=product).json()["id"]
+    before = report(client, days_before=1)
+
+    response = client.post(
+        "/orders", json={"product_ids": [product_id], "amounts": [2]}
+    )
+    assert response.status_code == 201
+    client.put(
+        f"/products/{product_id}", json={**product, "id": product_id, "price": 100.0}
+    )
+    after = report(client, days_before=2)
+
+    assert after["total_revenue"] - before["total_revenue"] == 20
+    assert after["total_profit"] - before["total_profit"] == 12
+    assert after["total_units_sold"] - before["total_units_sold"] == 2
+    order = client.get(f"/orders/{response.json()}").json()
+    assert order["products"][0]["price"] == 10
@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+
+from app.batching import MicroBatcher
+
+
+async def test_concurrent_items_are_flushed_together():
+    batches = []
+
+    async def flush(items):
+        batches.append(items)
+        return [item * 10 for item in items]
+
+    batcher = MicroBatcher(flush, max_size=3, max_delay=0.01)
+    results = await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+
+    assert results == [0, 10, 20, 30, 40]
+    assert batches == [[0, 1, 2], [3, 4]]
+
+
+async def test_errors_are_raised_to_their_submitter_only():
+    async def flush(items):
+        return [ValueError(item) if item < 0 else item for item in items]
+
+    batcher = MicroBatcher(flush, max_size=10, max_delay=0.01)
+    valid, invalid = await asyncio.gather(
+        batcher.submit(1), batcher.submit(-1), return_exceptions=True
+    )
+
+    assert valid == 1
+    assert isinstance(invalid, ValueError)
+    with pytest.raises(RuntimeError):
+        await MicroBatcher(_failing_flush, max_size=1, max_delay=0.01).submit(1)
+
+
+async def _failing_flush(items):
+    raise RuntimeError("database unavailable")
@@ -1,9 +1,13 @@
 import asyncio
+import json
 
 import pytest
 from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from starlette.responses import Response
 
 from app.db import async_session_maker
+from app.midlewares import DBSessionMiddleware, LazySession
 
 
 @pytest.mark.asyncio
@@ -16,3 +20,44 @@ async def test_db(test_db_session):
 
     assert current_user == "test"
     assert current_db_name == "test"
+
+
+@pytest.mark.asyncio
+async def test_lazy_session_is_not_created_without_queries():
+    session = LazySession()
+
+    await session.commit()
+    await session.rollback()
+    await session.close()
+
+    assert not session.started
+
+
+@pytest.mark.asyncio
+async def test_failed_commit_sends_the_error_response(monkeypatch):
+    class UniqueViolation(Exception):
+        sqlstate = "23505"
+
+    async def commit(self) -> None:
+        raise IntegrityError("COMMIT", {}, UniqueViolation("duplicate key"))
+
+    monkeypatch.setattr(LazySession, "commit", commit)
+
+    async def app(scope, receive, send):
+        response = Response(b"created", status_code=201)
+        await response(scope, receive, send)
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": "/orders", "headers": []}
+    await DBSessionMiddleware(app)(scope, receive, send)
+
+    assert sent[0]["status"] == 409
+    assert json.loads(sent[1]["body"]) == {"detail": "duplicate key"}
+    assert len(sent) == 2
@@ -0,0 +1,95 @@
+import asyncio
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.routers.base import BaseRouter
+
+
+class SlowRouter(BaseRouter):
+    def setup_routes(self) -> None:
+        self.add_api_route("/slow", self.slow, methods=["GET"], deadline=0.1)
+        self.add_api_route("/fast", self.fast, methods=["POST"], deadline=5)
+        self.add_api_route(
+            "/stream", self.stream, methods=["POST"], deadline=5, streaming_body=True
+        )
+
+    async def slow(self, request: Request) -> int:
+        await asyncio.sleep(5)
+        return 1
+
+    async def fast(self, request: Request, items: list[int]) -> int:
+        return sum(items)
+
+    async def stream(self, request: Request) -> int:
+        return len([chunk async for chunk in request.stream() if chunk])
+
+
+app = FastAPI()
+app.include_router(SlowRouter(None, "").router)
+
+
+def test_deadline_exceeded():
+    response = TestClient(app).get("/slow")
+    assert response.status_code == 504
+
+
+def test_deadline_not_exceeded():
+    response = TestClient(app).post("/fast", json=[1, 2, 3])
+    assert response.status_code == 200
+    assert response.json() == 6
+
+
+def test_client_disconnect_cancels_route():
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/slow",
+        "raw_path": b"/slow",
+        "query_string": b"",
+        "headers": [],
+        "root_path": "",
+        "app": app,
+    }
+    messages = [{"type": "http.request", "body": b"", "more_body": False}]
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(asyncio.wait_for(app(scope, receive, send), timeout=1))
+    assert sent[0]["status"] == 499
+
+
+def test_streamed_body_reaches_the_handler_unbuffered():
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/stream",
+        "raw_path": b"/stream",
+        "query_string": b"",
+        "headers": [],
+        "root_path": "",
+        "app": app,
+    }
+    messages = [
+        {"type": "http.request", "body": b"1\n", "more_body": True},
+        {"type": "http.request", "body": b"2\n", "more_body": True},
+        {"type": "http.request", "body": b"3\n", "more_body": False},
+    ]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(asyncio.wait_for(app(scope, receive, send), timeout=1))
+    assert sent[0]["status"] == 200
+    assert sent[1]["body"] == b"3"
@@ -0,0 +1,15 @@
+from app.config import settings
+from app.db import get_engine
+
+
+def test_pools_are_warm_after_startup(client):
+    pool = get_engine().pool
+    assert pool.checkedin() + pool.checkedout() >= settings.OLTP_POOL_PREWARM
+
+
+def test_ready(client):
+    response = client.get("/ready")
+    body = response.json()
+    assert body["warm"] is True
+    assert body["database"] is True
+    assert response.status_code == (200 if body["redis"] else 503)
@@ -0,0 +1,99 @@
+import asyncio
+
+from sqlalchemy.exc import OperationalError
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app import idempotency
+from app.idempotency import IdempotencyRecord, MemoryIdempotencyStore
+from app.routers.responses import idempotent_responses
+
+
+def request(key: str, body: bytes) -> Request:
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    headers = [(b"idempotency-key", key.encode())]
+    scope = {"type": "http", "method": "POST", "path": "/orders", "headers": headers}
+    return Request(scope, receive)
+
+
+async def test_concurrent_requests_with_one_key_run_once(monkeypatch):
+    monkeypatch.setattr(idempotency, "idempotency_store", MemoryIdempotencyStore())
+    calls = []
+
+    async def handler(request: Request) -> Response:
+        calls.append(request)
+        await asyncio.sleep(0.1)
+        return Response(b"42", status_code=201, media_type="application/json")
+
+    idempotent_handler = idempotent_responses(handler)
+    first, repeated = await asyncio.gather(
+        idempotent_handler(request("order-1", b"{}")),
+        idempotent_handler(request("order-1", b"{}")),
+    )
+
+    assert len(calls) == 1
+    assert (first.status_code, first.body) == (201, b"42")
+    assert (repeated.status_code, repeated.body) == (201, b"42")
+    assert repeated.headers["idempotent-replayed"] == "true"
+
+    other_body = await idempotent_handler(request("order-1", b"[]"))
+    assert other_body.status_code == 422
+    assert len(calls) == 1
+
+
+async def test_unexpected_errors_release_the_key(monkeypatch):
+    monkeypatch.setattr(idempotency, "idempotency_store", MemoryIdempotencyStore())
+    outcomes = [RuntimeError("connection lost"), Response(b"1", status_code=201)]
+
+    async def handler(request: Request) -> Response:
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    idempotent_handler = idempotent_responses(handler)
+    try:
+        await idempotent_handler(request("order-2", b"{}"))
+    except RuntimeError:
+        pass
+
+    retried = await idempotent_handler(request("order-2", b"{}"))
+    assert (retried.status_code, retried.body) == (201, b"1")
+    assert "idempotent-replayed" not in retried.headers
+
+
+async def test_expired_claims_leave_the_next_claim_alone():
+    store = MemoryIdempotencyStore()
+    assert await store.claim("order-3", IdempotencyRecord("{}", "first"), ttl=0)
+    assert await store.claim("order-3", IdempotencyRecord("{}", "second"), ttl=60)
+
+    response = IdempotencyRecord("{}", "first", 201, {}, b"1")
+    assert not await store.complete("order-3", "first", response, ttl=60)
+    assert not await store.release("order-3", "first")
+    assert (await store.get("order-3")).token == "second"
+
+    assert await store.release("order-3", "second")
+    assert await store.get("order-3") is None
+
+
+async def test_request_errors_are_stored_by_sqlstate(monkeypatch):
+    monkeypatch.setattr(idempotency, "idempotency_store", MemoryIdempotencyStore())
+    calls = []
+
+    class ShortStock(Exception):
+        sqlstate = "23514"
+
+    async def handler(request: Request) -> Response:
+        calls.append(request)
+        # Not an IntegrityError: the SQLSTATE alone makes it a request error.
+        raise OperationalError("SELECT reserve_stock()", {}, ShortStock("short"))
+
+    idempotent_handler = idempotent_responses(handler)
+    first = await idempotent_handler(request("order-4", b"{}"))
+    repeated = await idempotent_handler(request("order-4", b"{}"))
+
+    assert len(calls) == 1
+    assert first.status_code == repeated.status_code == 409
+    assert repeated.headers["idempotent-replayed"] == "true"
@@ -0,0 +1,32 @@
+import pytest
+
+from app.order_queue import LogOrderQueue, OrderQueueFullError
+
+
+async def test_log_queue_redelivers_unacknowledged_orders(tmp_path):
+    path = str(tmp_path / "orders.log")
+    queue = LogOrderQueue(path, max_depth=10, ticket_ttl=60)
+    tickets = [await queue.put({"number": number}) for number in range(3)]
+    first, second = await queue.read(2, timeout=0)
+    await queue.ack([first])
+    await queue.close()
+
+    restarted = LogOrderQueue(path, max_depth=10, ticket_ttl=60)
+    orders = await restarted.read(10, timeout=0)
+    assert [order.ticket for order in orders] == tickets[1:]
+    assert [order.order for order in orders] == [{"number": 1}, {"number": 2}]
+    assert await restarted.get_status(tickets[1]) == {"status": "queued"}
+
+    await restarted.ack(orders)
+    assert await restarted.depth() == 0
+    assert await restarted.read(10, timeout=0) == []
+    await restarted.close()
+    assert (tmp_path / "orders.log").stat().st_size == 0
+
+
+async def test_log_queue_rejects_orders_beyond_max_depth(tmp_path):
+    queue = LogOrderQueue(str(tmp_path / "orders.log"), max_depth=1, ticket_ttl=60)
+    await queue.put({})
+    with pytest.raises(OrderQueueFullError):
+        await queue.put({})
+    await queue.close()
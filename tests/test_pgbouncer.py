@@ -0,0 +1,54 @@
+import asyncio
+import os
+
+import pytest
+from sqlalchemy import text
+
+from app.config import settings
+from app.db import create_workload_engine
+
+# Port of a local PgBouncer in transaction pooling mode in front of the test database.
+PGBOUNCER_PORT = os.environ.get("PGBOUNCER_PORT")
+
+pytestmark = pytest.mark.skipif(
+    not PGBOUNCER_PORT, reason="PGBOUNCER_PORT of a local PgBouncer is not set"
+)
+
+
+@pytest.fixture
+def pgbouncer_engine(monkeypatch):
+    monkeypatch.setattr(settings, "DB_PGBOUNCER", True)
+    monkeypatch.setattr(
+        settings, "DB_HOST", os.environ.get("PGBOUNCER_HOST", "localhost")
+    )
+    monkeypatch.setattr(settings, "DB_PORT", PGBOUNCER_PORT)
+    return create_workload_engine("oltp")
+
+
+@pytest.mark.asyncio
+async def test_prepared_statements_behind_pgbouncer(pgbouncer_engine):
+    async def run(worker: int) -> list[int]:
+        results = []
+        for value in range(10):
+            async with pgbouncer_engine.begin() as connection:
+                result = await connection.execute(
+                    text("SELECT CAST(:value AS integer) + :worker"),
+                    {"value": value, "worker": worker},
+                )
+                results.append(result.scalar_one())
+        return results
+
+    # More concurrent clients than server connections, so transactions move between them.
+    results = await asyncio.gather(*(run(worker) for worker in range(50)))
+    await pgbouncer_engine.dispose()
+
+    assert results == [[value + worker for value in range(10)] for worker in range(50)]
+
+
+@pytest.mark.asyncio
+async def test_statement_timeout_is_set_per_transaction(pgbouncer_engine):
+    async with pgbouncer_engine.begin() as connection:
+        timeout = (await connection.execute(text("SHOW statement_timeout"))).scalar()
+    await pgbouncer_engine.dispose()
+
+    assert timeout == f"{settings.OLTP_STATEMENT_TIMEOUT // 1000}s"
@@ -0,0 +1,38 @@
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from app.config import settings
+from app.midlewares.exception import ErrorHandlingMiddleware
+from app.pool import pool_limits
+
+
+def test_pool_limits_stay_within_budget(monkeypatch):
+    monkeypatch.setattr(settings, "DB_CONNECTION_BUDGET", 100)
+    monkeypatch.setattr(settings, "WEB_CONCURRENCY", 4)
+
+    total = 0
+    for workload in settings.WORKLOADS:
+        for read_only in (False, True):
+            pool_size, max_overflow = pool_limits(workload, read_only)
+            assert pool_size >= 1 and max_overflow >= 0
+            total += pool_size + max_overflow
+    assert total <= 100 // 4
+
+
+def test_pool_limits_without_budget(monkeypatch):
+    monkeypatch.setattr(settings, "DB_CONNECTION_BUDGET", None)
+    options = settings.WORKLOADS["oltp"]
+    assert pool_limits("oltp") == (options["pool_size"], options["max_overflow"])
+
+
+def test_pool_timeout_is_service_unavailable():
+    response = ErrorHandlingMiddleware.error_response(PoolTimeoutError("exhausted"))
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(settings.DB_RETRY_AFTER)
+
+
+def test_pool_stats(client):
+    client.get("/products")
+    response = client.get("/pool-stats")
+    assert response.status_code == 200
+    stats = {(item["workload"], item["read_only"]): item for item in response.json()}
+    assert stats[("oltp", True)]["checkouts"] >= 1
@@ -0,0 +1,36 @@
+import gzip
+
+from starlette.requests import Request
+
+from app.cahce import CachedResponse
+from app.routers.responses import cached_response
+
+REPORT_URL = "/reports-all?start_date=2000-01-01&end_date=2000-01-02"
+
+
+def test_report_is_served_from_cache(client):
+    response = client.get(REPORT_URL)
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+
+    cached = client.get(REPORT_URL)
+    assert cached.content == response.content
+    assert cached.headers["etag"] == etag
+
+    not_modified = client.get(REPORT_URL, headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+
+
+def test_gzipped_body_is_passed_through_or_decompressed():
+    body = b'{"items": [' + b'{"id": 1},' * 200 + b"]}"
+    entry = CachedResponse.build(body, "application/json")
+    assert entry.gzipped
+
+    def request(accept_encoding: str) -> Request:
+        headers = [(b"accept-encoding", accept_encoding.encode())]
+        return Request({"type": "http", "method": "GET", "headers": headers})
+
+    compressed = cached_response(request("gzip, deflate"), entry)
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(compressed.body) == body
+    assert cached_response(request("identity"), entry).body == body
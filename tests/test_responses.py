@@ -0,0 +1,19 @@
+from fastapi.exceptions import ResponseValidationError
+import pytest
+
+from app.routers.responses import ResponseSerializer
+from app.schemas import ProductSchema
+
+
+def test_serializes_schemas_and_validates_other_results():
+    serializer = ResponseSerializer(list[ProductSchema])
+    product = {"id": 1, "product_name": "A", "price": 1.5, "cost": 1, "stock": 2}
+    expected = b'[{"product_name":"A","price":1.5,"cost":1.0,"stock":2,"id":1,"created_at":null}]'
+
+    assert serializer.serialize([ProductSchema(**product)]) == expected
+    assert serializer.serialize([product]) == expected
+
+
+def test_rejects_results_not_matching_the_annotation():
+    with pytest.raises(ResponseValidationError):
+        ResponseSerializer(list[ProductSchema]).serialize([{"id": "x"}])